@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 
@@ -15,8 +16,13 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.TokenAuthentication',  # <-- Add this
+        'ration.authentication.CitizenTokenAuthentication',  # Signed citizen token issued by verify_otp
 
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'ration.renderers.FastJSONRenderer',  # orjson when installed, DRF's JSONRenderer otherwise
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # Media configuration for handling uploaded files
@@ -56,7 +62,9 @@ INSTALLED_APPS = [
 
 # Middleware for security and other functionalities
 MIDDLEWARE = [
+    'ration.metrics.MetricsMiddleware',  # First, so latency covers the whole stack
     'corsheaders.middleware.CorsMiddleware',
+    'ration.compression.CompressionMiddleware',  # gzip/brotli above COMPRESSION_MIN_SIZE; outside anything that reads the body
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,21 +72,109 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'ration.routers.ReplicaPinningMiddleware',  # Read-your-writes pinning for the replica router
+    'ration.sharding.ShardRoutingMiddleware',  # Pins each request to its area's database shard
+    'ration.profiling.ProfilingMiddleware',  # Admin X-Profile header or PROFILE_SAMPLE_RATE; see below
 ]
 
 # Root URL configuration
 ROOT_URLCONF = 'backend.urls'
 
 # Database configuration
+def env_bool(name, default):
+    return os.environ.get(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',  # Using PostgreSQL
-        'NAME': 'ration_db',  # Database name
-        'USER': 'postgres',  # Database user
-        'PASSWORD': '123',  # Database password
-        'HOST': 'localhost',  # Database host
-        'PORT': '5432',  # Default PostgreSQL port
+        'NAME': os.environ.get('DB_NAME', 'ration_db'),  # Database name
+        'USER': os.environ.get('DB_USER', 'postgres'),  # Database user
+        'PASSWORD': os.environ.get('DB_PASSWORD', '123'),  # Database password
+        'HOST': os.environ.get('DB_HOST', 'localhost'),  # Database host
+        'PORT': os.environ.get('DB_PORT', '5432'),  # Default PostgreSQL port
+        # Keep connections open between requests instead of reconnecting every time
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),  # Seconds; 0 closes after each request
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),  # Ping reused connections before use
+        'OPTIONS': {},
+    }
+}
+
+# Django's native connection pool (needs psycopg 3: pip install "psycopg[pool]").
+# Pooling replaces persistent connections, so CONN_MAX_AGE is forced to 0 when it is on.
+if env_bool('DB_POOL', False):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),  # Seconds to wait for a free connection
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '300')),  # Close idle pooled connections after this
     }
+    try:
+        from psycopg_pool import ConnectionPool
+    except ImportError:
+        ConnectionPool = None
+    if ConnectionPool is not None:
+        DATABASES['default']['OPTIONS']['pool']['check'] = ConnectionPool.check_connection  # Health check on checkout
+
+# Optional streaming read replica. Only views marked @read_replica read from it,
+# and clients that just wrote stay on the primary for REPLICA_PIN_SECONDS.
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},  # Tests read the replica through the primary's test database
+    }
+
+# Area shards (ration/sharding.py). Each host in DB_SHARD_HOSTS adds a database
+# alias shard_1, shard_2, ... alongside 'default'; new areas are spread over them
+# by Area pk unless AREA_SHARD_MAP (JSON, {"<area pk>": "<alias>"}) pins one, and
+# stay on that shard (Area.shard) when shards are added later. Run
+# `manage.py migrate --database=<alias>` for every shard, then
+# `manage.py rebuild_shard_keys` to fill the routing catalog.
+AREA_SHARDS = ['default']
+for number, host in enumerate(filter(None, os.environ.get('DB_SHARD_HOSTS', '').split(',')), start=1):
+    DATABASES[f'shard_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+    }
+    AREA_SHARDS.append(f'shard_{number}')
+AREA_SHARD_MAP = {int(pk): alias for pk, alias in json.loads(os.environ.get('AREA_SHARD_MAP', '{}')).items()}
+SHARD_FANOUT_WORKERS = int(os.environ.get('SHARD_FANOUT_WORKERS', '8'))  # Shared thread pool for admin queries across shards
+DATABASE_ROUTERS = ['ration.sharding.ShardRouter', 'ration.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '10'))  # Longer than the worst expected replication lag
+ORDER_PARTITION_MONTHS_AHEAD = 3  # Future monthly order partitions kept ready by manage.py order_partitions
+FORECAST_HISTORY_DAYS = 28  # Days of sales history used for stock forecasts
+FORECAST_COVER_DAYS = 14  # Restock recommendations cover this many days of demand
+FORECAST_HALF_LIFE_DAYS = 7  # Recent days weigh more; a day this old counts half
+COUNTER_LOOKUP_CACHE_TTL = 60  # Seconds a shop-counter order lookup is cached
+
+# Request metrics (ration/metrics.py), scraped from /api/metrics/
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # Bearer token for the scraper; unset allows localhost only
+METRICS_SERVER_TIMING = env_bool('METRICS_SERVER_TIMING', True)  # Add Server-Timing headers to responses
+METRICS_OVERHEAD_BUDGET_MS = 0.2  # Max per-request cost of the middleware, checked by manage.py bench_metrics
+
+# On-demand profiling (ration/profiling.py): cProfile + SQL reports written to PROFILE_DIR
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))  # Fraction of requests profiled; 0 disables sampling
+PROFILE_PATHS = ['/api/verify_otp_place_order/', '/api/download_invoice/']  # Sampling only applies under these paths
+PROFILE_DIR = os.path.join(MEDIA_ROOT, 'profiles')
+PROFILE_KEEP = 50  # Newest reports kept; older ones are deleted
+
+# Response compression (ration/compression.py)
+COMPRESSION_MIN_SIZE = 1024  # Bytes; smaller bodies are sent as they are
+COMPRESSION_BROTLI_QUALITY = 5  # 0-11; higher is smaller but slower to compress
+
+# File serving (ration/sendfile.py): media and invoices go out via the front server in production
+SENDFILE_BACKEND = os.environ.get('SENDFILE_BACKEND', '')  # 'nginx' (X-Accel-Redirect), 'xsendfile' (X-Sendfile), or '' to stream from Django (MEDIA_URL is then only routed with DEBUG on)
+INVOICE_DIR = os.path.join(BASE_DIR, 'private', 'invoices')  # Rendered invoice PDFs; outside MEDIA_ROOT so only download_invoice serves them
+SENDFILE_NGINX_LOCATIONS = {  # Directory -> nginx `internal` location aliasing it
+    MEDIA_ROOT: '/protected/media/',
+    INVOICE_DIR: '/protected/invoices/',
 }
 
 # Static files URL configuration
@@ -93,9 +189,11 @@ CORS_ALLOWED_ORIGINS = [
       "http://localhost:3000",  # React app running on this port (adjust as needed)
 ]
 CORS_ALLOW_ALL_ORIGINS = True
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')  # Order retries send an Idempotency-Key
 
 # Email settings (For sending OTP emails)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = 'ration.metrics.TimedEmailBackend'  # SMTP backend that reports send time to the metrics
 EMAIL_HOST = 'smtp.gmail.com'  # Using Gmail's SMTP server for development
 EMAIL_PORT = 587  # Gmail SMTP port
 EMAIL_USE_TLS = True  # Enable TLS for secure email transmission
@@ -103,13 +201,19 @@ EMAIL_HOST_USER = 'harimaxdp@gmail.com'  # Your Gmail address (use a real Gmail
 EMAIL_HOST_PASSWORD = 'opph bxzi dyer rhxj'  # Your Gmail password (use a proper password or app password)
 DEFAULT_FROM_EMAIL = 'harimaxdp@gmail.com'  # Sender email address
 
-# Add static and media serving routes during development
-from django.conf import settings
-from django.conf.urls.static import static
-
-# URLs configuration for serving media files during development
-urlpatterns = [
-    # Other URL patterns for your app can go here
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Identity lookups for citizens (see ration/identity.py)
+AADHAR_HASH_KEY = SECRET_KEY  # Changing this invalidates FamilyMember.aadhar_hash; re-run the backfill in migration 0020
+IDENTITY_CACHE_SIZE = 4096  # Max entries in the per-process identity LRU
+IDENTITY_CACHE_TTL = 300  # Seconds before a cached identity is re-read from the DB
+CITIZEN_TOKEN_MAX_AGE = 12 * 60 * 60  # Seconds a citizen session token from verify_otp stays valid
+CHATBOT_STOCK_CACHE_TTL = 30  # Seconds the chatbot caches per-area stock answers
+AREA_DIRECTORY_TTL = 300  # Seconds before the per-process area name <-> id map (ration/areas.py) is reloaded
+
+# Distribution-day pickup queue (see ration/queueing.py)
+DISTRIBUTION_SESSIONS = [('09:00', '13:00'), ('15:00', '19:00')]  # Shop opening hours
+PICKUP_SLOT_MINUTES = 30  # Length of one pickup slot
+SHOP_FAMILIES_PER_HOUR = 40  # Counter throughput; sets how many families fit in a slot
+DISTRIBUTION_BOOKING_DAYS = 7  # How far ahead a full day rolls orders over
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60  # Seconds an Idempotency-Key replays its first order response
 
 ALLOWED_HOSTS = ['*']
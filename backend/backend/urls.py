@@ -1,8 +1,8 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from ration import views  # Importing views from the 'ration' app
 from django.conf import settings
-from django.conf.urls.static import static
+from ration.sendfile import serve_media
 from django.http import HttpResponse
 
 def home(request):
@@ -19,6 +19,10 @@ urlpatterns = [
 
 ]
 
-# Serve media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Uploaded images: checked here, then sent by the front server (see SENDFILE_BACKEND).
+# Without a sendfile backend Django would stream every file itself, so that is
+# left to development; production then serves MEDIA_URL from the front server.
+if settings.DEBUG or settings.SENDFILE_BACKEND:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media),
+    ]
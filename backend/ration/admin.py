@@ -1,9 +1,17 @@
 from django.contrib import admin
-from .models import RationItem, Stock, Family, FamilyMember, Order, OrderItem,Payment
+from .models import Area, RationItem, StockMovement, Family, FamilyMember, Order, OrderItem,Payment
+from . import inventory
+
+@admin.register(Area)
+class AreaAdmin(admin.ModelAdmin):
+    list_display = ('name', 'shard', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = ('shard',)  # Placed on creation; changing it would strand the area's rows
 
 class FamilyAdmin(admin.ModelAdmin):
     list_display = ('family_id', 'area')
-    search_fields = ('family_id', 'area')
+    list_select_related = ('area',)
+    search_fields = ('family_id', 'area__name')
     list_filter = ('area',)
 
 from django.utils.html import format_html
@@ -30,17 +38,38 @@ class RationItemAdmin(admin.ModelAdmin):
         'price',
         'area'
     ]
-    search_fields = ('name', 'area')
+    list_select_related = ('area',)
+    search_fields = ('name', 'area__name')
     list_filter = ('area',)
-
-class StockAdmin(admin.ModelAdmin):
-    list_display = ('item', 'quantity_in_stock')
-    search_fields = ('item__name',)
-    list_filter = ('item__area',)
+    # Balance is maintained from the stock ledger; record a Stock movement instead
+    readonly_fields = ('total_quantity',)
+
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('item', 'kind', 'quantity', 'order', 'created_at')
+    search_fields = ('item__name', 'note')
+    list_filter = ('kind', 'item__area')
+    fields = ('item', 'kind', 'quantity', 'note')
+
+    def has_change_permission(self, request, obj=None):
+        return False  # append-only
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        if obj.kind == StockMovement.SALE:
+            movement = inventory.sell(obj.item_id, obj.quantity)
+        elif obj.kind == StockMovement.EXPIRY:
+            movement = inventory.expire(obj.item_id, obj.quantity, note=obj.note)
+        elif obj.kind == StockMovement.ADJUSTMENT:
+            movement = inventory.adjust(obj.item_id, obj.quantity, note=obj.note)
+        else:
+            movement = inventory.receive(obj.item_id, obj.quantity, note=obj.note)
+        obj.pk = movement.pk
 
 admin.site.register(Family, FamilyAdmin)
 admin.site.register(FamilyMember, FamilyMemberAdmin)
-admin.site.register(Stock, StockAdmin)
+admin.site.register(StockMovement, StockMovementAdmin)
 
 
 class OrderItemInline(admin.TabularInline):
@@ -54,8 +83,8 @@ class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderItemInline]
 
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ('order', 'item', 'quantity')
-    search_fields = ('order__token_number', 'item__name')
+    list_display = ('order', 'item_name', 'quantity', 'unit_price')
+    search_fields = ('order__token_number', 'item_name')
     list_filter = ('item__area',)
 
 class PaymentAdmin(admin.ModelAdmin):
@@ -73,8 +102,9 @@ from .models import Notification
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('id', 'area', 'message_summary', 'timestamp')
+    list_select_related = ('area',)
     list_filter = ('area', 'timestamp')
-    search_fields = ('message', 'area')
+    search_fields = ('message', 'area__name')
     ordering = ('-timestamp',)
 
     def message_summary(self, obj):
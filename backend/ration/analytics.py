@@ -0,0 +1,178 @@
+# ration/analytics.py
+#
+# Daily sales rollups per area and item. Order placement bumps the rollup rows
+# inside its own transaction, and `manage.py rebuild_sales_rollups` recomputes
+# days from the order tables to repair drift (e.g. orders edited by hand).
+# Rebuilds lock the rollup tables, so they wait for in-flight orders' bumps and
+# orders wait for the rebuild; neither can overwrite or double count the other.
+# Dashboards read only the rollups, from every shard when no area is given.
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .areas import area_pk
+from .models import DailyAreaSales, DailyItemSales, Order, OrderItem
+from .sharding import fan_out
+
+
+def _bump(model, keys, defaults=None, **deltas):
+    """Add `deltas` to the row identified by `keys`, creating it if needed."""
+    increments = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**keys).update(**increments):
+        return
+    try:
+        with transaction.atomic(using=router.db_for_write(model)):
+            model.objects.create(**keys, **(defaults or {}), **deltas)
+    except IntegrityError:
+        # Another order created the row first
+        model.objects.filter(**keys).update(**increments)
+
+
+def record_order(area_id, created_at, lines):
+    """Fold one paid order into the rollups. Call it inside the order's transaction.
+
+    `lines` is [(item_id, item_name, quantity, unit_price), ...]. The order counts
+    once for the day and once per item however many lines it has, as in rebuild().
+    """
+    day = timezone.localdate(created_at)
+    items = {}
+    for item_id, item_name, quantity, unit_price in lines:
+        totals = items.setdefault(item_id, {'item_name': item_name, 'units': 0, 'revenue': Decimal('0')})
+        totals['units'] += quantity
+        totals['revenue'] += unit_price * quantity
+    for item_id, totals in items.items():
+        _bump(
+            DailyItemSales, {'day': day, 'area_id': area_id, 'item_id': item_id},
+            defaults={'item_name': totals['item_name']},
+            units=totals['units'], revenue=totals['revenue'], orders=1,
+        )
+    _bump(
+        DailyAreaSales, {'day': day, 'area_id': area_id},
+        units=sum(totals['units'] for totals in items.values()),
+        revenue=sum((totals['revenue'] for totals in items.values()), Decimal('0')),
+        orders=1,
+    )
+
+
+def lock_rollups(using):
+    """Block rollup writes until the current transaction ends (PostgreSQL; SQLite
+    already serializes writers). Reads are not blocked."""
+    conn = connections[using]
+    if conn.vendor != 'postgresql':
+        return
+    qn = conn.ops.quote_name
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"LOCK TABLE {qn(DailyItemSales._meta.db_table)}, {qn(DailyAreaSales._meta.db_table)} "
+            "IN SHARE ROW EXCLUSIVE MODE"
+        )
+
+
+def rebuild(start, end):
+    """Recompute the rollups for local dates start..end (inclusive) from the order tables."""
+    tz = timezone.get_current_timezone()
+    since = timezone.make_aware(datetime.combine(start, time.min), tz)
+    until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+
+    line_total = ExpressionWrapper(
+        F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+    # One row per item even if it was renamed during the day; the rollup keeps one of its names
+    item_rows = (
+        OrderItem.objects.filter(
+            created_at__gte=since, created_at__lt=until, order__payment_status='paid',
+        )
+        .annotate(day=TruncDate('created_at'), area_id=F('order__family__area_id'))
+        .values('day', 'area_id', 'item_id')
+        .annotate(
+            item_name=Max('item_name'), units=Sum('quantity'), revenue=Sum(line_total),
+            orders=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+    area_rows = (
+        Order.objects.filter(created_at__gte=since, created_at__lt=until, payment_status='paid')
+        .annotate(day=TruncDate('created_at'), area_id=F('family__area_id'))
+        .values('day', 'area_id')
+        .annotate(orders=Count('id'))
+    )
+
+    using = router.db_for_write(DailyItemSales)
+    with transaction.atomic(using=using):
+        # Orders that already bumped the rollups have committed once the lock is
+        # held, so the reads below include them; later orders bump the new rows
+        lock_rollups(using)
+        item_sales = [
+            DailyItemSales(
+                day=row['day'], area_id=row['area_id'], item_id=row['item_id'], item_name=row['item_name'],
+                units=row['units'], revenue=row['revenue'], orders=row['orders'],
+            )
+            for row in item_rows
+        ]
+        area_sales = {}
+        for row in item_sales:
+            totals = area_sales.setdefault((row.day, row.area_id), DailyAreaSales(day=row.day, area_id=row.area_id))
+            totals.units += row.units
+            totals.revenue += row.revenue
+        for row in area_rows:
+            totals = area_sales.setdefault((row['day'], row['area_id']), DailyAreaSales(day=row['day'], area_id=row['area_id']))
+            totals.orders = row['orders']
+
+        DailyItemSales.objects.filter(day__gte=start, day__lte=end).delete()
+        DailyAreaSales.objects.filter(day__gte=start, day__lte=end).delete()
+        DailyItemSales.objects.bulk_create(item_sales)
+        DailyAreaSales.objects.bulk_create(area_sales.values())
+    return len(item_sales), len(area_sales)
+
+
+def _merge_totals(shard_rows, key):
+    """Sum orders/units/revenue of rows with the same `key` across shards."""
+    merged = {}
+    for rows in shard_rows:
+        for row in rows:
+            totals = merged.get(row[key])
+            if totals is None:
+                merged[row[key]] = dict(row)
+            else:
+                for field in ('orders', 'units', 'revenue'):
+                    totals[field] += row[field]
+    return list(merged.values())
+
+
+def area_series(start, end, area=None):
+    """Per-day totals between two dates, for one area (by name) or summed across all areas."""
+    def series(alias=None):
+        rows = DailyAreaSales.objects.filter(day__gte=start, day__lte=end)
+        if area:
+            rows = rows.filter(area_id=area_pk(area))  # an unknown name matches nothing
+        return list(
+            rows.values('day')
+            .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('day')
+        )
+
+    if area:
+        return series()  # The request is routed to the area's shard
+    return sorted(_merge_totals(fan_out(series), 'day'), key=lambda row: row['day'])
+
+
+def item_totals(start, end, area=None):
+    """Per-item totals between two dates, best sellers first."""
+    def totals(alias=None):
+        rows = DailyItemSales.objects.filter(day__gte=start, day__lte=end)
+        if area:
+            rows = rows.filter(area_id=area_pk(area))
+        return list(
+            rows.values('item_name')
+            .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-units', 'item_name')
+        )
+
+    if area:
+        return totals()
+    return sorted(_merge_totals(fan_out(totals), 'item_name'), key=lambda row: (-row['units'], row['item_name']))
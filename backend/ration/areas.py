@@ -0,0 +1,119 @@
+# ration/areas.py
+#
+# Area directory. Areas are rows of the small Area table and every area-scoped
+# model points at one with an integer foreign key; the API still speaks area
+# names. This module maps names to primary keys and back, and pks to the shard
+# each area was placed on, from an in-process copy of the whole table, reloaded
+# after AREA_DIRECTORY_TTL seconds and cleared by the Area signals. A name or pk it hasn't seen (an area created by
+# another process) is looked up on its own rather than reloading everything.
+# Areas are read from and created in the catalog database (ration/sharding.py).
+
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+
+from .sharding import CATALOG_ALIAS
+
+
+class AreaDirectory:
+    """Thread-safe name <-> pk and pk -> shard maps for the Area table."""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._by_name = {}
+        self._by_pk = {}
+        self._shards = {}
+        self._expires = 0
+        self._lock = threading.Lock()
+
+    def _fresh(self):
+        if self._expires < time.monotonic():
+            self.reload()
+
+    def reload(self):
+        from .models import Area
+
+        rows = list(Area.objects.using(CATALOG_ALIAS).values_list('pk', 'name', 'shard'))
+        with self._lock:
+            self._by_pk = {pk: name for pk, name, _ in rows}
+            self._by_name = {name: pk for pk, name, _ in rows}
+            self._shards = {pk: shard for pk, _, shard in rows if shard}
+            self._expires = time.monotonic() + self.ttl
+
+    def _remember(self, pk, name):
+        with self._lock:
+            self._by_pk[pk] = name
+            self._by_name[name] = pk
+
+    def pk(self, name, create=False):
+        from .models import Area
+
+        if not name:
+            return None
+        self._fresh()
+        pk = self._by_name.get(name)
+        if pk is None:
+            if create:
+                pk = Area.objects.using(CATALOG_ALIAS).get_or_create(name=name)[0].pk
+            else:
+                pk = Area.objects.using(CATALOG_ALIAS).filter(name=name).values_list('pk', flat=True).first()
+            if pk is not None:
+                self._remember(pk, name)
+        return pk
+
+    def name(self, pk):
+        from .models import Area
+
+        if pk is None:
+            return None
+        self._fresh()
+        name = self._by_pk.get(pk)
+        if name is None:
+            name = Area.objects.using(CATALOG_ALIAS).filter(pk=pk).values_list('name', flat=True).first()
+            if name is not None:
+                self._remember(pk, name)
+        return name
+
+    def shard(self, pk):
+        from .models import Area
+
+        if pk is None:
+            return None
+        self._fresh()
+        shard = self._shards.get(pk)
+        if shard is None:
+            shard = Area.objects.using(CATALOG_ALIAS).filter(pk=pk).values_list('shard', flat=True).first() or None
+            if shard is not None:
+                with self._lock:
+                    self._shards[pk] = shard
+        return shard
+
+    def names(self):
+        self._fresh()
+        return sorted(self._by_name)
+
+    def clear(self):
+        with self._lock:
+            self._by_name = {}
+            self._by_pk = {}
+            self._shards = {}
+            self._expires = 0
+
+
+area_directory = AreaDirectory(ttl=getattr(settings, 'AREA_DIRECTORY_TTL', 300))
+
+
+def area_pk(name, create=False) -> Optional[int]:
+    """Primary key of the named area; with create=True a new name adds the area."""
+    return area_directory.pk(name, create=create)
+
+
+def area_name(pk) -> Optional[str]:
+    return area_directory.name(pk)
+
+
+def area_names():
+    """Every area name, sorted."""
+    return area_directory.names()
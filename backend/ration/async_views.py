@@ -0,0 +1,180 @@
+# ration/async_views.py
+#
+# Async (ASGI) variants of the read-heavy citizen endpoints. Under uvicorn these
+# use Django's async ORM so a slow query doesn't hold a worker thread, and the
+# blocking SMTP and PDF work runs in sync_to_async thread pools. Responses match
+# the synchronous views in ration/views.py.
+
+import json
+import logging
+import os
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.mail import send_mail
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone, translation
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from . import conditional
+from .areas import area_name, area_pk
+from .authentication import citizen_identity_from_header
+from .identity import lookup_by_email, member_by_aadhar_and_email
+from .models import Family, FamilyMember, Notification, Order, OrderItem
+from .partitions import cycle_start
+from .views import (
+    available_stock_items,
+    generate_otp,
+    invoice_path,
+    invoice_response,
+    save_invoice,
+    stock_limit_field,
+    stock_rows,
+    stock_values,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# 4a. View Stock (async)
+@require_GET
+async def view_stock(request):
+    citizen = citizen_identity_from_header(request)
+    if citizen:
+        family_pk = citizen['family_pk']
+        area_id = citizen['area_id']
+        capped_members = citizen['family_size']
+    else:
+        family_id = request.GET.get('family_id')
+        if not family_id:
+            return JsonResponse({"error": "Missing family_id"}, status=400)
+
+        family = await Family.objects.filter(family_id=family_id).only('id', 'area_id').afirst()
+        if family is None:
+            return JsonResponse({"error": "Invalid family_id"}, status=404)
+
+        family_pk = family.pk
+        area_id = family.area_id
+        num_members = await FamilyMember.objects.filter(family_id=family_pk).acount()
+        capped_members = max(1, min(num_members, 4))
+
+    etag, last_modified = await sync_to_async(conditional.validators)(
+        'stock', area_id, family_pk, capped_members, cycle_start().date(),
+    )
+    unchanged = conditional.not_modified(request, etag, last_modified)
+    if unchanged:
+        return unchanged
+
+    limit_field = stock_limit_field(capped_members)
+    items = [item async for item in stock_values(available_stock_items(family_pk, area_id), limit_field)]
+    area = await sync_to_async(area_name)(area_id)
+    return conditional.with_validators(
+        JsonResponse({"stock": stock_rows(items, limit_field, request, area)}), etag, last_modified,
+    )
+
+
+# 12a. Get Family Members (async)
+@require_GET
+async def get_family_members(request):
+    family_id = request.GET.get('family_id')
+    if not family_id:
+        return JsonResponse({'message': 'Family ID is required.'}, status=400)
+
+    family_pk = await Family.objects.filter(family_id=family_id).values_list('pk', flat=True).afirst()
+    if family_pk is None:
+        return JsonResponse({'message': 'Family not found.'}, status=404)
+
+    data = []
+    async for member in FamilyMember.objects.filter(family_id=family_pk).only('name', 'aadhar_number', 'email', 'profile_image'):
+        data.append({
+            'name': member.name,
+            'aadhar_number': member.aadhar_number,
+            'email': member.email or 'N/A',
+            'profile_image': request.build_absolute_uri(member.profile_image.url) if member.profile_image else None,
+        })
+    return JsonResponse(data, safe=False)
+
+
+# Notifications (async)
+@require_GET
+async def get_notifications(request, area):
+    area_id = await sync_to_async(area_pk)(area)
+    notifications = (
+        Notification.objects.filter(area_id=area_id)
+        .exclude(dismissed_areas__contains=[area_id])
+        .order_by('-timestamp')
+        .values('id', 'message', 'timestamp')
+    )
+    return JsonResponse([n async for n in notifications], safe=False)
+
+
+# 14a. Send OTP (async): SMTP runs in a thread pool instead of blocking the event loop
+@csrf_exempt
+@require_POST
+async def send_otp(request):
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body.'}, status=400)
+    aadhar_number = payload.get('aadhar_number')
+    email = payload.get('email')
+
+    if not aadhar_number or not email:
+        return JsonResponse({'error': 'Aadhar number and email are required.'}, status=400)
+
+    _, family_member = await sync_to_async(member_by_aadhar_and_email)(aadhar_number, email)
+    if family_member is None:
+        return JsonResponse({'error': 'Family member not found.'}, status=404)
+
+    otp_plain = generate_otp()
+    # Password hashing is deliberately slow; keep it off the event loop too
+    family_member.otp = await sync_to_async(make_password, thread_sensitive=False)(otp_plain)
+    family_member.otp_expiry_time = timezone.now() + timedelta(minutes=5)
+    await family_member.asave(update_fields=['otp', 'otp_expiry_time'])
+
+    try:
+        await sync_to_async(send_mail, thread_sensitive=False)(
+            'Your OTP for Login',
+            f'Your OTP is: {otp_plain}',
+            settings.EMAIL_HOST_USER,
+            [email],
+            fail_silently=False,
+        )
+        return JsonResponse({'success': True, 'message': 'OTP sent to registered email.'})
+    except Exception as e:
+        logger.error(f"Failed to send OTP: {e}")
+        return JsonResponse({'error': f'Email sending failed: {e}'}, status=500)
+
+
+# 19a. Download Invoice (async): DB reads on the loop, PDF build in a thread pool
+@require_GET
+async def download_invoice(request, email):
+    lang = 'ta' if request.GET.get('lang') == 'ta' else 'en'
+
+    identity = await sync_to_async(lookup_by_email)(email)
+    if identity is None:
+        return HttpResponse("Family member not found.", status=404)
+
+    order = await Order.objects.filter(family_id=identity.family_pk).order_by('-created_at').afirst()
+    if not order:
+        return HttpResponse("No order found.", status=404)
+
+    path = invoice_path(lang, identity.family_id, order)
+    if not os.path.exists(path):
+        lines = [
+            line async for line in
+            OrderItem.objects.filter(order=order, created_at=order.created_at)
+            .values_list('item_name', 'quantity', 'unit_price')
+        ]
+
+        from .invoices import render_invoice_pdf
+
+        def build():
+            with translation.override(lang):
+                save_invoice(path, render_invoice_pdf(lang, identity.family_id, order, lines))
+
+        await sync_to_async(build, thread_sensitive=False)()
+    return invoice_response(request, path)
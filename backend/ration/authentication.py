@@ -0,0 +1,97 @@
+# ration/authentication.py
+#
+# Stateless, signed session tokens for citizens. verify_otp issues one after a
+# successful OTP check; it carries the member/family identity so views can read
+# it from request.auth without going back to the database.
+
+from django.conf import settings
+from django.core import signing
+from rest_framework import authentication, exceptions
+
+CITIZEN_TOKEN_SALT = 'ration.citizen-token'
+CITIZEN_TOKEN_KEYWORD = 'Citizen'
+
+
+class CitizenUser:
+    """Minimal user object for requests authenticated with a citizen token."""
+
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+    is_staff = False
+    is_superuser = False
+
+    def __init__(self, payload):
+        self.pk = self.id = payload['member_id']
+        self.payload = payload
+
+    def __str__(self):
+        return f"Citizen {self.pk}"
+
+
+def issue_citizen_token(identity, name, family_size):
+    """Sign the identity (see ration.identity.Identity), member name and capped family size."""
+    payload = {
+        'member_id': identity.member_id,
+        'name': name,
+        'family_pk': identity.family_pk,
+        'family_id': identity.family_id,
+        'area': identity.area,
+        'area_id': identity.area_id,
+        'family_size': family_size,
+    }
+    return signing.dumps(payload, salt=CITIZEN_TOKEN_SALT, compress=True)
+
+
+def read_citizen_token(token):
+    max_age = getattr(settings, 'CITIZEN_TOKEN_MAX_AGE', 12 * 60 * 60)
+    payload = signing.loads(token, salt=CITIZEN_TOKEN_SALT, max_age=max_age)
+    if 'area_id' not in payload:
+        # Issued before areas had ids; the citizen logs in again
+        raise signing.BadSignature('Citizen token has no area id.')
+    return payload
+
+
+class CitizenTokenAuthentication(authentication.BaseAuthentication):
+    """Authorization: Citizen <token>"""
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != CITIZEN_TOKEN_KEYWORD.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid citizen token header.')
+
+        try:
+            payload = read_citizen_token(auth[1].decode())
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('Citizen token has expired.')
+        except (signing.BadSignature, UnicodeError):
+            raise exceptions.AuthenticationFailed('Invalid citizen token.')
+
+        return CitizenUser(payload), payload
+
+    def authenticate_header(self, request):
+        return CITIZEN_TOKEN_KEYWORD
+
+
+def citizen_identity(request):
+    """Token payload for the current request, or None if it wasn't token-authenticated."""
+    user = getattr(request, 'user', None)
+    if isinstance(user, CitizenUser):
+        return user.payload
+    return None
+
+
+def citizen_identity_from_header(request):
+    """Token payload for plain (non-DRF) Django views, e.g. ration/async_views.py.
+
+    Returns None when the header is missing or the token is invalid or expired.
+    """
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2 or auth[0].lower() != CITIZEN_TOKEN_KEYWORD.lower():
+        return None
+    try:
+        return read_citizen_token(auth[1])
+    except signing.BadSignature:
+        return None
@@ -0,0 +1,151 @@
+# ration/chatbot.py
+#
+# Rule-based chatbot used by views.chatbot_response. All keyword tables are
+# compiled into a single regex at import, so a message is scanned once, and
+# per-area stock data is read from a short-TTL cache instead of per-keyword
+# queries.
+
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import RationItem
+
+ITEM_KEYWORDS = ["rice", "sugar", "wheat", "dal", "oil"]
+
+# Intent -> trigger phrases. Order of INTENT_PRIORITY decides which reply wins
+# when a message matches several intents.
+INTENT_PHRASES = {
+    'stock': ["stock", "available items", "available stock", "inventory", "what do you have"],
+    'greeting': ["hi", "hello", "hey", "hai"],
+    'timing': ["timing", "timings", "hours"],
+    'price': ["price", "prices"],
+    'order': ["order", "orders"],
+    'delivery': ["delivery", "how to get"],
+    'bye': ["bye", "thank you", "thanks", "see you"],
+}
+INTENT_PRIORITY = ['greeting', 'timing', 'price', 'order', 'delivery', 'bye']
+
+# Intents (and item keywords) whose words also match inflected forms: "stocks",
+# "ordering", "priced", "oils". Greetings and goodbyes stay exact, so "this"
+# and "his" don't say hello.
+INFLECTED_INTENTS = {'stock', 'timing', 'price', 'order', 'delivery'}
+SUFFIXES = ('ing', 'es', 'ed', 's', 'd')
+
+STOCK_CACHE_TTL = getattr(settings, 'CHATBOT_STOCK_CACHE_TTL', 30)
+
+
+def _inflected(token):
+    return token in INFLECTED_INTENTS or token.startswith('item:')
+
+
+def _build_matcher():
+    phrase_to_token = {}
+    for intent, phrases in INTENT_PHRASES.items():
+        for phrase in phrases:
+            phrase_to_token[phrase] = intent
+    for keyword in ITEM_KEYWORDS:
+        phrase_to_token[keyword] = f'item:{keyword}'
+    # Longest phrases first so "available stock" wins over "stock"; whole words
+    # only, so "price" no longer triggers "rice" and "this" no longer greets.
+    suffix = '(?:%s)?' % '|'.join(SUFFIXES)
+    pieces = [
+        re.escape(p) + (suffix if _inflected(phrase_to_token[p]) else '')
+        for p in sorted(phrase_to_token, key=len, reverse=True)
+    ]
+    return re.compile(rf'\b(?:{"|".join(pieces)})\b'), phrase_to_token
+
+
+_MATCHER, _PHRASE_TO_TOKEN = _build_matcher()
+
+
+def match_intents(message):
+    """Return the set of intent tokens ('stock', 'greeting', 'item:rice', ...) in a message."""
+    tokens = set()
+    for match in _MATCHER.finditer(message):
+        text = match.group(0)
+        token = _PHRASE_TO_TOKEN.get(text)
+        if token is None:
+            # Strip the suffix of an inflected word ("ordering" -> "order")
+            for suffix in SUFFIXES:
+                token = text.endswith(suffix) and _PHRASE_TO_TOKEN.get(text[:-len(suffix)])
+                if token and _inflected(token):
+                    break
+            else:
+                token = None
+        if token:
+            tokens.add(token)
+    return tokens
+
+
+def area_stock_snapshot(area_id):
+    """Items and stock balances for an area (by Area pk), cached for STOCK_CACHE_TTL seconds.
+
+    Returns {'items': [(name, price, qty), ...], 'stock': [(name, price, qty), ...]}
+    in primary-key order; 'stock' only holds items with a positive balance.
+    """
+    # Keyed by pk: names hold spaces (which memcached refuses) and user text
+    key = f'chatbot:stock:{area_id}'
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    items = list(
+        RationItem.objects.filter(area_id=area_id)
+        .order_by('pk')
+        .values_list('name', 'price', 'total_quantity')
+    )
+    snapshot = {
+        'items': items,
+        'stock': [row for row in items if row[2] > 0],
+    }
+    cache.set(key, snapshot, STOCK_CACHE_TTL)
+    return snapshot
+
+
+def build_reply(message, user_name=None, area_id=None):
+    message = (message or '').strip().lower()
+    tokens = match_intents(message)
+
+    if 'stock' in tokens:
+        if area_id is None:
+            return "Sorry, we couldn't identify your area from your Aadhar. Please contact support."
+        stock = area_stock_snapshot(area_id)['stock']
+        if not stock:
+            return "Sorry, stock information is not available in your area at the moment."
+        reply_lines = [f"{name.title()}: ₹{price}/kg, {qty} kg in stock" for name, price, qty in stock]
+        return "Current stock details in your area:\n" + "\n".join(reply_lines)
+
+    if area_id is not None:
+        for keyword in ITEM_KEYWORDS:
+            if f'item:{keyword}' not in tokens:
+                continue
+            for name, price, qty in area_stock_snapshot(area_id)['items']:
+                if keyword in name.lower():
+                    stock_msg = f"{qty} kg in stock"
+                    return (
+                        f"{name.title()} is available at ₹{price}/kg.\n"
+                        f"Available stock: {stock_msg}."
+                    )
+            return f"Sorry, {keyword.title()} is not available in your area."
+
+    for intent in INTENT_PRIORITY:
+        if intent not in tokens:
+            continue
+        if intent == 'greeting':
+            return f"Hello {user_name}! How can I help you today?" if user_name else "Hello! How can I help you today?"
+        if intent == 'timing':
+            return "Our shop is open from 9 AM to 1 PM and 3 PM to 7 PM."
+        if intent == 'price':
+            return "You can ask for item prices like rice, sugar, wheat, etc."
+        if intent == 'order':
+            return ("To place an order, please log in and go to the 'Place Order' section. "
+                    "You can select items and quantities there.")
+        if intent == 'delivery':
+            return ("Orders are processed within 24 hours. You can pick up your ration "
+                    "from the shop or opt for home delivery if it's available in your area.")
+        if intent == 'bye':
+            return "You're welcome! If you have more questions, feel free to ask."
+
+    return "Sorry, I didn't understand that. Could you please rephrase?"
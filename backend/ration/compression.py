@@ -0,0 +1,61 @@
+# ration/compression.py
+#
+# Response compression for the API. JSON and text bodies of at least
+# COMPRESSION_MIN_SIZE bytes are sent brotli-compressed when the client accepts
+# it and the brotli module is installed, gzip-compressed otherwise. Small
+# bodies aren't worth the CPU, and PDFs and images are already compressed.
+# Works like Django's GZipMiddleware (Vary, weak ETags, BREACH padding for gzip).
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+
+re_accepts_br = _lazy_re_compile(r'\bbr\b')
+re_accepts_gzip = _lazy_re_compile(r'\bgzip\b')
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepts = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and re_accepts_br.search(accepts):
+            encoding = 'br'
+            compressed = brotli.compress(response.content, quality=self.brotli_quality)
+        elif re_accepts_gzip.search(accepts):
+            encoding = 'gzip'
+            compressed = compress_string(response.content, max_random_bytes=100)
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+
+        # The body differs byte-for-byte from the uncompressed one
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
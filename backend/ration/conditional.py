@@ -0,0 +1,67 @@
+# ration/conditional.py
+#
+# Conditional GET for the stock listings. Every change to an area's items
+# (stock movements through ration/inventory.py, item saves and deletes) bumps
+# a per-area version row in the same transaction, so a listing's ETag and
+# Last-Modified come from one indexed row instead of re-reading the items.
+# A client revalidating an unchanged listing gets a 304 without an item scan.
+
+import hashlib
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Subquery
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import AreaVersion, RationItem
+
+
+def bump_area(area_id):
+    changes = {'version': F('version') + 1, 'changed_at': timezone.now()}
+    if AreaVersion.objects.filter(area_id=area_id).update(**changes):
+        return
+    try:
+        with transaction.atomic(using=router.db_for_write(AreaVersion)):
+            AreaVersion.objects.create(area_id=area_id, version=1)
+    except IntegrityError:
+        # Another request created the row first
+        AreaVersion.objects.filter(area_id=area_id).update(**changes)
+
+
+def bump_item(item_id):
+    """Bump the version of the item's area in one UPDATE (the row usually exists)."""
+    item_area = RationItem.objects.filter(pk=item_id).values('area_id')[:1]
+    changes = {'version': F('version') + 1, 'changed_at': timezone.now()}
+    if not AreaVersion.objects.filter(area_id=Subquery(item_area)).update(**changes):
+        area_id = RationItem.objects.filter(pk=item_id).values_list('area_id', flat=True).first()
+        if area_id is not None:
+            bump_area(area_id)
+
+
+def validators(scope, area_id, *parts):
+    """(weak ETag, Last-Modified timestamp or None) for a listing of an area.
+
+    `parts` are whatever else the response depends on (family, family size, ...).
+    """
+    version, changed_at = (
+        AreaVersion.objects.filter(area_id=area_id).values_list('version', 'changed_at').first() or (0, None)
+    )
+    key = '\x1f'.join(str(part) for part in (scope, area_id, version, *parts))
+    etag = 'W/"%s"' % hashlib.sha1(key.encode()).hexdigest()[:24]
+    return etag, int(changed_at.timestamp()) if changed_at else None
+
+
+def not_modified(request, etag, last_modified):
+    """A 304 response if the client's copy is current, else None."""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return response and with_validators(response, etag, last_modified)
+
+
+def with_validators(response, etag, last_modified):
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    # Let clients keep the body but always check back with the validators
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
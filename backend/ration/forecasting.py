@@ -0,0 +1,168 @@
+# ration/forecasting.py
+#
+# Stock depletion forecasts per area and item. Recent daily consumption comes
+# from the sales rollups (ration/analytics.py), demand is capped by what each
+# area's families are still entitled to this cycle, and all the arithmetic runs
+# on NumPy arrays so every area and item of a shard is forecast in one pass.
+
+import heapq
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .areas import area_name, area_pk
+from .models import DailyItemSales, Family, FamilyMember, RationItem
+from .partitions import add_months, cycle_start
+from .sharding import fan_out
+
+HISTORY_DAYS = getattr(settings, 'FORECAST_HISTORY_DAYS', 28)
+COVER_DAYS = getattr(settings, 'FORECAST_COVER_DAYS', 14)
+HALF_LIFE_DAYS = getattr(settings, 'FORECAST_HALF_LIFE_DAYS', 7)
+SERVICE_Z = 1.65  # safety stock covers ~95% of days
+LIMIT_FIELDS = ('limit_1_member', 'limit_2_members', 'limit_3_members', 'limit_4_members')
+
+
+def item_key(area_id, name):
+    # Restocks create new RationItem rows, so history is tracked by area and name
+    return area_id, name.strip().lower()
+
+
+def family_size_mix(areas):
+    """{area pk: [families with 1, 2, 3, 4+ members]}; sizes are capped like view_stock."""
+    member_count = (
+        FamilyMember.objects.filter(family=OuterRef('pk'))
+        .values('family').annotate(n=Count('pk')).values('n')
+    )
+    size = Greatest(Value(1), Least(Coalesce(Subquery(member_count), Value(0)), Value(4)), output_field=IntegerField())
+    rows = (
+        Family.objects.filter(area__in=areas)
+        .annotate(size=size)
+        .values('area', 'size')
+        .annotate(families=Count('pk'))
+        .values_list('area', 'size', 'families')
+    )
+    mix = {}
+    for area, family_size, families in rows:
+        mix.setdefault(area, [0, 0, 0, 0])[family_size - 1] += families
+    return mix
+
+
+def depletion_order(row):
+    """Sort key of forecast rows: soonest to run out first, then by area name."""
+    days = row['days_to_depletion']
+    return days is None, days or 0, row['area']
+
+
+def forecast(area=None, cover_days=COVER_DAYS, today=None):
+    """Depletion estimate and restock recommendation for every item in stock listings,
+    soonest to run out first."""
+    today = today or timezone.localdate()
+    if area:
+        return shard_forecast(area, cover_days, today)  # The request is routed to the area's shard
+    # Areas are forecast independently, so each shard's sorted list is merged
+    return list(heapq.merge(*fan_out(lambda alias: shard_forecast(None, cover_days, today)), key=depletion_order))
+
+
+def shard_forecast(area, cover_days, today):
+    """forecast() over the current shard's areas."""
+    # Current stock and entitlements, one row per (area, item name)
+    items = RationItem.objects.all()
+    if area:
+        items = items.filter(area_id=area_pk(area))
+    keys, index, stock, limits = [], {}, [], []
+    for item_area, name, quantity, *item_limits in items.values_list('area', 'name', 'total_quantity', *LIMIT_FIELDS):
+        key = item_key(item_area, name)
+        k = index.get(key)
+        if k is None:
+            k = index[key] = len(keys)
+            keys.append((item_area, name.strip()))
+            stock.append(0)
+            limits.append([0, 0, 0, 0])
+        stock[k] += max(quantity, 0)
+        limits[k] = [max(a, b) for a, b in zip(limits[k], item_limits)]
+    if not keys:
+        return []
+
+    n = len(keys)
+    stock = np.array(stock, dtype=float)
+    limits = np.array(limits, dtype=float)
+    areas = sorted({key[0] for key in keys})
+
+    # Daily units for the last HISTORY_DAYS full days (today is still in progress)
+    first_day = today - timedelta(days=HISTORY_DAYS)
+    usage = np.zeros((n, HISTORY_DAYS))
+    rows = DailyItemSales.objects.filter(area__in=areas, day__gte=first_day, day__lt=today)
+    ks, ds, us = [], [], []
+    for item_area, name, day, units in rows.values_list('area', 'item_name', 'day', 'units'):
+        k = index.get(item_key(item_area, name))
+        if k is not None:
+            ks.append(k)
+            ds.append((day - first_day).days)
+            us.append(units)
+    np.add.at(usage, (np.array(ks, dtype=int), np.array(ds, dtype=int)), np.array(us, dtype=float))
+
+    # Exponentially weighted mean and spread, ignoring days before an item was first sold
+    age = np.arange(HISTORY_DAYS - 1, -1, -1)
+    weights = 0.5 ** (age / HALF_LIFE_DAYS) * (np.cumsum(usage > 0, axis=1) > 0)
+    weight_sum = weights.sum(axis=1)
+    has_history = weight_sum > 0
+    safe_sum = np.where(has_history, weight_sum, 1)
+    observed_rate = (usage * weights).sum(axis=1) / safe_sum
+    spread = np.sqrt(((usage - observed_rate[:, None]) ** 2 * weights).sum(axis=1) / safe_sum)
+
+    # What the area's families may still take this cycle, and in a full cycle
+    mix = family_size_mix(areas)
+    area_mix = np.array([mix.get(key[0], [0, 0, 0, 0]) for key in keys], dtype=float)
+    entitlement = (area_mix * limits).sum(axis=1)
+
+    start = cycle_start()
+    next_cycle = add_months(start, 1)
+    cycle_days = (next_cycle.date() - start.date()).days
+    days_left = (next_cycle.date() - today).days
+    sold = np.zeros(n)
+    sold_rows = (
+        DailyItemSales.objects.filter(area__in=areas, day__gte=start.date())
+        .values('area', 'item_name').annotate(units=Sum('units'))
+        .values_list('area', 'item_name', 'units')
+    )
+    for item_area, name, units in sold_rows:
+        k = index.get(item_key(item_area, name))
+        if k is not None:
+            sold[k] += units
+    outstanding = np.maximum(entitlement - sold, 0)
+
+    # New items have no history: assume families draw their entitlement evenly
+    rate = np.where(has_history, observed_rate, entitlement / cycle_days)
+
+    # Demand over the cover window, capped by entitlements where limits are set
+    spill = max(cover_days - days_left, 0)  # days of the window that fall in later cycles
+    this_cycle = rate * min(cover_days, days_left)
+    next_cycles = rate * spill
+    capped = np.minimum(this_cycle, outstanding) + np.minimum(next_cycles, entitlement * np.ceil(spill / cycle_days))
+    demand = np.where(entitlement > 0, capped, this_cycle + next_cycles)
+
+    safety = SERVICE_Z * spread * np.sqrt(cover_days)
+    restock = np.ceil(np.maximum(demand + safety - stock, 0))
+    with np.errstate(divide='ignore'):
+        days_to_depletion = np.where(rate > 0, stock / np.where(rate > 0, rate, 1), np.inf)
+
+    results = []
+    names = [area_name(key[0]) for key in keys]
+    for k in np.lexsort((np.array(names), days_to_depletion)):
+        depletes = bool(np.isfinite(days_to_depletion[k]))
+        results.append({
+            'area': names[k],
+            'item': keys[k][1],
+            'stock': int(stock[k]),
+            'daily_rate': round(float(rate[k]), 2),
+            'cycle_entitlement': int(entitlement[k]),
+            'sold_this_cycle': int(sold[k]),
+            'days_to_depletion': round(float(days_to_depletion[k]), 1) if depletes else None,
+            'depletion_date': today + timedelta(days=int(days_to_depletion[k])) if depletes else None,
+            'recommended_restock': int(restock[k]),
+        })
+    return results
@@ -0,0 +1,97 @@
+# ration/idempotency.py
+#
+# Client-supplied Idempotency-Key support for write endpoints. The first
+# successful response for a key is stored (unique index + cache) in the same
+# transaction as the write, and retries with the same key replay it instead of
+# running the write again.
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+class KeyInUse(Exception):
+    """A concurrent request with the same key stored its response first."""
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def request_key(request, scope):
+    """Scoped key from the request header, or None if the client didn't send one."""
+    value = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+    if not value:
+        return None
+    return f"{scope}:{value}"[:255]
+
+
+def fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder).encode()).hexdigest()
+
+
+def _cache_key(key):
+    return 'idem:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def load(key):
+    """Stored (fingerprint, status, body) for a key, or None."""
+    stored = cache.get(_cache_key(key))
+    if stored is not None:
+        return stored
+    row = (
+        IdempotencyKey.objects.filter(key=key, created_at__gte=timezone.now() - key_ttl())
+        .values_list('fingerprint', 'response_status', 'response_body')
+        .first()
+    )
+    if row is not None:
+        cache.set(_cache_key(key), row, int(key_ttl().total_seconds()))
+    return row
+
+
+def store(key, request_fingerprint, response_status, body):
+    """Record the response for a key. Call inside the write's transaction.
+
+    Raises KeyInUse if a concurrent request with the same key committed first.
+    """
+    body = json.loads(json.dumps(body, cls=DjangoJSONEncoder))
+    IdempotencyKey.objects.filter(key=key, created_at__lt=timezone.now() - key_ttl()).delete()
+    try:
+        # Savepoint, so only a clash on this key's unique index means "in use"
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                key=key,
+                fingerprint=request_fingerprint,
+                response_status=response_status,
+                response_body=body,
+            )
+    except IntegrityError as exc:
+        raise KeyInUse(key) from exc
+    stored = (request_fingerprint, response_status, body)
+    transaction.on_commit(lambda: cache.set(_cache_key(key), stored, int(key_ttl().total_seconds())))
+
+
+def replay(stored, request_fingerprint):
+    stored_fingerprint, response_status, body = stored
+    if stored_fingerprint != request_fingerprint:
+        return Response(
+            {'success': False, 'error': f'{IDEMPOTENCY_HEADER} was already used for a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(body, status=response_status, headers={'Idempotent-Replayed': 'true'})
+
+
+def purge_expired():
+    return IdempotencyKey.objects.filter(created_at__lt=timezone.now() - key_ttl()).delete()[0]
@@ -0,0 +1,193 @@
+# ration/identity.py
+#
+# Indexed identity lookups for citizens. Aadhar numbers are looked up through a
+# keyed hash column and emails through a normalised (lower-cased) unique column,
+# and resolved identities are kept in a small in-process LRU so the auth hot
+# path does not re-join FamilyMember -> Family on every request.
+
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+from .sharding import current_shard, is_sharded, key_area, shard_for_area, using_shard
+
+
+class Identity(NamedTuple):
+    member_id: int
+    family_pk: int
+    family_id: str
+    area_id: int
+
+    @property
+    def area(self):
+        from .areas import area_name
+        return area_name(self.area_id)
+
+
+def hash_aadhar(aadhar_number):
+    """Keyed SHA-256 of an Aadhar number (hex), used for the indexed lookup column."""
+    key = getattr(settings, 'AADHAR_HASH_KEY', settings.SECRET_KEY).encode()
+    value = str(aadhar_number or '').strip().encode()
+    return hmac.new(key, value, hashlib.sha256).hexdigest()
+
+
+def normalize_email(email):
+    if not email:
+        return email
+    return email.strip().lower()
+
+
+class IdentityCache:
+    """Thread-safe LRU of lookup key -> Identity with a per-entry TTL."""
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            identity, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return identity
+
+    def set(self, key, identity):
+        with self._lock:
+            self._data[key] = (identity, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_member(self, member_id):
+        with self._lock:
+            for key in [k for k, (ident, _) in self._data.items() if ident.member_id == member_id]:
+                del self._data[key]
+
+    def discard_family(self, family_pk):
+        with self._lock:
+            for key in [k for k, (ident, _) in self._data.items() if ident.family_pk == family_pk]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+identity_cache = IdentityCache(
+    maxsize=getattr(settings, 'IDENTITY_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'IDENTITY_CACHE_TTL', 300),
+)
+
+
+def _resolve(key, **filters):
+    from .models import FamilyMember
+
+    identity = identity_cache.get(key)
+    if identity is not None:
+        return identity
+
+    rows = FamilyMember.objects.filter(**filters).values_list('id', 'family_id', 'family__family_id', 'family__area_id')
+    if is_sharded() and current_shard() is None:
+        # Not routed yet (ration/sharding.py routes requests by this lookup): the
+        # catalog knows the member's area; `key` is its (kind, key) entry
+        area_id = key_area(*key)
+        if area_id is None:
+            return None
+        with using_shard(shard_for_area(area_id)):
+            row = rows.first()
+    else:
+        row = rows.first()
+    if row is None:
+        return None
+    identity = Identity(*row)
+    identity_cache.set(key, identity)
+    return identity
+
+
+def lookup_by_aadhar(aadhar_number) -> Optional[Identity]:
+    from .models import ShardKey
+
+    if not aadhar_number:
+        return None
+    digest = hash_aadhar(aadhar_number)
+    return _resolve((ShardKey.AADHAR, digest), aadhar_hash=digest)
+
+
+def lookup_by_email(email) -> Optional[Identity]:
+    from .models import ShardKey
+
+    email = normalize_email(email)
+    if not email:
+        return None
+    return _resolve((ShardKey.EMAIL, email), email=email)
+
+
+def get_member(identity, *fields, **match):
+    """Fetch the FamilyMember row behind an Identity by primary key (no join).
+
+    `match` holds the column the identity was looked up by (its Aadhar hash or
+    email). The row must still have it: another process may have changed it
+    while this one's cache entry lives. Returns None (and evicts the stale
+    cache entry) if the member has gone or no longer matches.
+    """
+    from .models import FamilyMember
+
+    if identity is None:
+        return None
+    qs = FamilyMember.objects.all()
+    if fields:
+        qs = qs.only(*fields)
+    member = qs.filter(pk=identity.member_id, **match).first()
+    if member is None:
+        identity_cache.discard_member(identity.member_id)
+    return member
+
+
+def email_in_use(email, member_id=None):
+    """Whether a member other than `member_id` already has this email (compared normalised)."""
+    from .models import FamilyMember, ShardKey
+
+    email = normalize_email(email)
+    if not email:
+        return False
+    if FamilyMember.objects.filter(email=email).exclude(pk=member_id).exists():
+        return True
+    if not is_sharded():
+        return False
+    # Members on other shards are only known to the catalog
+    area_id = key_area(ShardKey.EMAIL, email)
+    if area_id is None:
+        return False
+    with using_shard(shard_for_area(area_id)):
+        return FamilyMember.objects.filter(email=email).exclude(pk=member_id).exists()
+
+
+def member_by_aadhar(aadhar_number, *fields):
+    identity = lookup_by_aadhar(aadhar_number)
+    return identity, get_member(identity, *fields, aadhar_hash=hash_aadhar(aadhar_number))
+
+
+def member_by_email(email, *fields):
+    identity = lookup_by_email(email)
+    return identity, get_member(identity, *fields, email=normalize_email(email))
+
+
+def member_by_aadhar_and_email(aadhar_number, email, *fields):
+    """Resolve by Aadhar, then check the email matches (replaces the two-column filter)."""
+    identity = lookup_by_aadhar(aadhar_number)
+    member = get_member(identity, *fields, aadhar_hash=hash_aadhar(aadhar_number))
+    if member is None or normalize_email(member.email) != normalize_email(email):
+        return None, None
+    return identity, member
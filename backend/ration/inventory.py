@@ -0,0 +1,91 @@
+# ration/inventory.py
+#
+# Single source of truth for stock. Every change is an append-only
+# StockMovement row, and RationItem.total_quantity is kept as the materialised
+# balance with a conditional UPDATE in the same transaction, so readers only
+# ever need the RationItem row.
+
+from django.db import router, transaction
+from django.db.models import F, Sum
+
+from . import conditional
+from .models import RationItem, StockMovement
+
+
+class InsufficientStock(Exception):
+    def __init__(self, item_id, requested):
+        self.item_id = item_id
+        self.requested = requested
+        super().__init__(f"Not enough stock for item {item_id} (requested {requested})")
+
+
+def _apply(item_id, kind, delta, order=None, note=''):
+    with transaction.atomic(using=router.db_for_write(RationItem)):
+        qs = RationItem.objects.filter(pk=item_id)
+        if delta < 0:
+            # Never let the balance go negative; no SELECT ... FOR UPDATE needed
+            qs = qs.filter(total_quantity__gte=-delta)
+        if not qs.update(total_quantity=F('total_quantity') + delta):
+            if delta < 0 and RationItem.objects.filter(pk=item_id).exists():
+                raise InsufficientStock(item_id, -delta)
+            raise RationItem.DoesNotExist(f"RationItem {item_id} does not exist")
+        conditional.bump_item(item_id)  # Listing ETags for the item's area change with the balance
+        return StockMovement.objects.create(item_id=item_id, kind=kind, quantity=delta, order=order, note=note)
+
+
+def receive(item_id, quantity, note=''):
+    """Add stock (delivery to the shop)."""
+    return _apply(item_id, StockMovement.RECEIPT, abs(int(quantity)), note=note)
+
+
+def sell(item_id, quantity, order=None):
+    """Take stock for an order line. Raises InsufficientStock if the balance is too low."""
+    return _apply(item_id, StockMovement.SALE, -abs(int(quantity)), order=order)
+
+
+def expire(item_id, quantity, note=''):
+    """Write off spoiled or expired stock."""
+    return _apply(item_id, StockMovement.EXPIRY, -abs(int(quantity)), note=note)
+
+
+def write_off_unusable(note='Below the smallest family limit'):
+    """Expire the remaining stock of items that can no longer fill even a
+    one-member family's limit. Returns the number of items written off."""
+    written_off = 0
+    unusable = RationItem.objects.filter(total_quantity__gt=0, total_quantity__lt=F('limit_1_member'))
+    for item_id, quantity in unusable.values_list('id', 'total_quantity'):
+        try:
+            expire(item_id, quantity, note=note)
+        except InsufficientStock:
+            continue  # Sold in the meantime
+        written_off += 1
+    return written_off
+
+
+def adjust(item_id, delta, note=''):
+    """Signed correction after a physical count."""
+    return _apply(item_id, StockMovement.ADJUSTMENT, int(delta), note=note)
+
+
+def ledger_balances(item_ids=None):
+    """Sum of movements per item, for reconciling against total_quantity."""
+    qs = StockMovement.objects.all()
+    if item_ids is not None:
+        qs = qs.filter(item_id__in=item_ids)
+    return dict(qs.values('item_id').annotate(total=Sum('quantity')).values_list('item_id', 'total'))
+
+
+def rebuild_balances():
+    """Reset every RationItem.total_quantity from the ledger. Returns the number of items changed."""
+    balances = ledger_balances()
+    changed = []
+    with transaction.atomic(using=router.db_for_write(RationItem)):
+        for item in RationItem.objects.select_for_update().only('id', 'total_quantity', 'area'):
+            expected = balances.get(item.id, 0)
+            if item.total_quantity != expected:
+                item.total_quantity = expected
+                changed.append(item)
+        RationItem.objects.bulk_update(changed, ['total_quantity'])
+        for area_id in {item.area_id for item in changed}:
+            conditional.bump_area(area_id)
+    return len(changed)
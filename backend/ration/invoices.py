@@ -0,0 +1,162 @@
+# ration/invoices.py
+#
+# Invoice PDFs. ReportLab (platypus, TTF font machinery) is slow to import, so
+# views import this module inside the invoice views rather than at startup;
+# workers and management commands that never render a PDF don't pay for it.
+# A server that forks workers can call preload() in the master process so the
+# children share the already-imported modules instead.
+
+import os
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .metrics import timed
+from .models import OrderItem
+
+
+def preload():
+    """Import and warm up ReportLab ahead of the first invoice (e.g. before fork)."""
+    getSampleStyleSheet()
+
+
+def invoice_lines(order):
+    """(item name, quantity, unit price) for each line of an order, from the purchase-time snapshot."""
+    return list(
+        OrderItem.objects.filter(order=order, created_at=order.created_at)  # created_at prunes to one partition
+        .values_list('item_name', 'quantity', 'unit_price')
+    )
+
+
+@timed('pdf')
+def render_invoice_pdf(lang, family_id, order, lines):
+    """Build the invoice PDF and return its bytes. Does no database access, so it
+    can run in a worker thread."""
+    # Register Tamil font if Tamil language selected
+    if lang == 'ta':
+        tamil_font_path = os.path.join(settings.BASE_DIR, 'static', 'fonts', 'NotoSansTamil-Regular.ttf')
+        pdfmetrics.registerFont(TTFont('Tamil', tamil_font_path))
+        selected_font = 'Tamil'
+
+        # Tamil static labels
+        shop_name = "என் அன்னாச்சியின் கடை"
+        invoice_title = "பில்"
+        family_id_label = "குடும்ப ஐடி"
+        order_token_label = "ஆர்டர் குறியீடு"
+        order_date_label = "ஆர்டர் தேதி"
+        item_label = "பொருள்"
+        quantity_label = "அளவு"
+        price_label = "விலை (₹)"
+        total_label = "மொத்தம் (₹)"
+        total_price_label = "மொத்த விலை:"
+        thank_you_msg = "உங்கள் வாங்குதலுக்கு நன்றி!"
+
+        # Tamil translation map for item names
+        tamil_name_map = {
+            "Rice": "அரிசி",
+            "Wheat": "கோதுமை",
+            "Sugar": "சர்க்கரை",
+            "Oil": "எண்ணெய்",
+            # Add more item translations here
+        }
+    else:
+        selected_font = 'Helvetica-Bold'
+
+        # English static labels
+        shop_name = "My Ration Shop"
+        invoice_title = "INVOICE"
+        family_id_label = "Family ID"
+        order_token_label = "Order Token"
+        order_date_label = "Order Date"
+        item_label = "Item"
+        quantity_label = "Quantity"
+        price_label = "Price (₹)"
+        total_label = "Total (₹)"
+        total_price_label = "Total Price:"
+        thank_you_msg = "Thank you for your purchase!"
+
+        tamil_name_map = {}
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4,
+                            rightMargin=30, leftMargin=30,
+                            topMargin=30, bottomMargin=18)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    style_title = ParagraphStyle(name='Title', parent=styles['Title'],
+                                 fontName=selected_font, alignment=1, fontSize=18)
+
+    style_heading = ParagraphStyle(name='Heading2', parent=styles['Heading2'],
+                                   fontName=selected_font, fontSize=14)
+
+    style_normal = ParagraphStyle(name='NormalCustom', parent=styles['Normal'],
+                                  fontName=selected_font, fontSize=11)
+
+    style_bold_center = ParagraphStyle(name='BoldCenter', parent=styles['Normal'],
+                                       fontName=selected_font, alignment=1, fontSize=14)
+
+    style_footer = ParagraphStyle(name='Footer', parent=styles['Normal'],
+                                  fontName=selected_font, alignment=1, fontSize=10, textColor=colors.grey)
+
+    # Add logo if exists
+    logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png')
+    if os.path.exists(logo_path):
+        logo = Image(logo_path, width=30*mm, height=30*mm)
+        elements.append(logo)
+
+    elements.append(Paragraph(shop_name, style_bold_center))
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph(invoice_title, style_title))
+    elements.append(Spacer(1, 12))
+
+    elements.append(Paragraph(f"{family_id_label}: {family_id}", style_normal))
+    elements.append(Paragraph(f"{order_token_label}: {order.token_number}", style_normal))
+    elements.append(Paragraph(f"{order_date_label}: {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}", style_normal))
+    elements.append(Spacer(1, 12))
+
+    # Table header
+    data = [[item_label, quantity_label, price_label, total_label]]
+
+    total_price = 0
+
+    for item_name, qty, unit_price in lines:
+        if lang == 'ta':
+            name = tamil_name_map.get(item_name, item_name)  # Translate or fallback
+        else:
+            name = item_name
+        price = float(unit_price)
+        line_total = qty * price
+        total_price += line_total
+        data.append([name, str(qty), f"{price:.2f}", f"{line_total:.2f}"])
+
+    data.append(['', '', '', ''])
+    data.append(["", "", total_price_label, f"₹{total_price:.2f}"])
+
+    table = Table(data, colWidths=[200, 60, 80, 80], hAlign='LEFT')
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#003366')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, -1), selected_font),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -3), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (2, -1), (-1, -1), selected_font),
+        ('BACKGROUND', (2, -1), (-1, -1), colors.HexColor('#e0e0e0')),
+        ('ALIGN', (2, -1), (-1, -1), 'RIGHT'),
+    ]))
+
+    elements.append(table)
+    elements.append(Spacer(1, 24))
+    elements.append(Paragraph(thank_you_msg, style_footer))
+
+    doc.build(elements)
+    return buffer.getvalue()
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ration.chatbot import build_reply, match_intents
+from ration.areas import area_pk
+from ration.models import Family
+
+DEFAULT_CORPUS = [
+    "hi",
+    "Hello, what do you have today?",
+    "is rice available?",
+    "price of sugar please",
+    "any oils in stock",
+    "what are the shop timings",
+    "how to get my ration",
+    "i want to place an order",
+    "dal",
+    "show me the inventory",
+    "thank you, bye",
+    "can you tell me something random",
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmark chatbot replies/sec over a message corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', help="File with one message per line (defaults to a built-in corpus)")
+        parser.add_argument('--area', help="Area to answer stock questions for (defaults to the first family's area)")
+        parser.add_argument('--iterations', type=int, default=2000, help="Passes over the corpus")
+
+    def handle(self, *args, **options):
+        if options['corpus']:
+            with open(options['corpus'], encoding='utf-8') as fh:
+                corpus = [line.strip() for line in fh if line.strip()]
+        else:
+            corpus = DEFAULT_CORPUS
+
+        area = options['area'] or Family.objects.values_list('area__name', flat=True).first()
+        area_id = area_pk(area)
+        iterations = options['iterations']
+        total = len(corpus) * iterations
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for message in corpus:
+                match_intents(message.lower())
+        match_elapsed = time.perf_counter() - start
+
+        # Warm the per-area stock cache, then time full replies
+        for message in corpus:
+            build_reply(message, user_name="Bench", area_id=area_id)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for message in corpus:
+                build_reply(message, user_name="Bench", area_id=area_id)
+        reply_elapsed = time.perf_counter() - start
+
+        self.stdout.write(f"corpus={len(corpus)} messages, iterations={iterations}, area={area!r}")
+        self.stdout.write(f"intent matching: {total / match_elapsed:,.0f} messages/sec")
+        self.stdout.write(f"full replies:    {total / reply_elapsed:,.0f} replies/sec")
@@ -0,0 +1,64 @@
+import copy
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from ration.models import Family
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare stock-endpoint requests/sec when every request opens a new DB connection "
+        "against the configured persistent/pooled setup (DB_CONN_MAX_AGE, DB_POOL=1)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--family-id', help="Family to request stock for (defaults to the first family)")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per mode")
+        parser.add_argument('--path', default='/api/stock/', help="Endpoint to exercise")
+
+    def handle(self, *args, **options):
+        family_id = options['family_id'] or Family.objects.values_list('family_id', flat=True).first()
+        if not family_id:
+            raise CommandError("No families found; pass --family-id or load some data first.")
+        url = f"{options['path']}?family_id={family_id}"
+
+        configured = copy.deepcopy(connection.settings_dict)
+        no_reuse = copy.deepcopy(configured)
+        no_reuse['CONN_MAX_AGE'] = 0
+        no_reuse['OPTIONS'].pop('pool', None)
+
+        modes = [('connect per request', no_reuse), (self.describe(configured), configured)]
+        for label, settings_dict in modes:
+            self.use_settings(settings_dict)
+            rps, mean_ms = self.run(url, options['requests'])
+            self.stdout.write(f"{label:<36} {rps:8.1f} req/s  mean={mean_ms:6.2f}ms")
+        self.use_settings(configured)
+
+    def describe(self, settings_dict):
+        if settings_dict['OPTIONS'].get('pool'):
+            return "pooled (DB_POOL=1)"
+        if settings_dict.get('CONN_MAX_AGE'):
+            return f"persistent (CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']})"
+        return "configured (no reuse)"
+
+    def use_settings(self, settings_dict):
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+        connection.settings_dict.clear()
+        connection.settings_dict.update(copy.deepcopy(settings_dict))
+
+    def run(self, url, requests):
+        client = Client()
+        client.get(url)  # warm up imports and caches
+        start = time.perf_counter()
+        for _ in range(requests):
+            # request_finished closes the connection (or returns it to the pool) as in production
+            response = client.get(url)
+            if response.status_code >= 500:
+                raise CommandError(f"{url} returned {response.status_code}")
+        elapsed = time.perf_counter() - start
+        return requests / elapsed, elapsed / requests * 1000
@@ -0,0 +1,98 @@
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from rest_framework.renderers import JSONRenderer
+
+from ration.models import Area, Family, FamilyMember, Notification, RationItem
+from ration.renderers import FastJSONRenderer, orjson
+
+AREA = 'Bench-Area'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request CPU time and peak allocations of the listing endpoints "
+        "(view_stock, GetStockData, get_recent_items_by_area, get_notifications) at a "
+        "given number of items, and compare DRF's JSONRenderer with FastJSONRenderer on "
+        "the same payloads. Data is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"orjson {'available' if orjson else 'not installed (FastJSONRenderer falls back)'}")
+        with transaction.atomic():
+            family_id = self.seed(options['items'])
+            endpoints = [
+                ('view_stock', f'/api/stock/?family_id={family_id}'),
+                ('GetStockData', f'/api/api/stock/?family_id={family_id}'),
+                ('get_recent_items_by_area', f'/api/api/recent-items/{AREA}/'),
+            ]
+            if connection.vendor == 'postgresql':  # ArrayField lookup
+                endpoints.append(('get_notifications', f'/api/notifications/{AREA}/'))
+
+            self.stdout.write(f"{'endpoint':<26}{'cpu ms':>9}{'peak KiB':>10}{'bytes':>9}")
+            payloads = []
+            for name, url in endpoints:
+                cpu, peak, response = self.measure(Client(), url, options['iterations'])
+                self.stdout.write(f"{name:<26}{cpu:>9.2f}{peak / 1024:>10.0f}{len(response.content):>9}")
+                if hasattr(response, 'data'):
+                    payloads.append((name, response.data))
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"\n{'render only':<26}{'drf ms':>9}{'fast ms':>9}{'drf KiB':>9}{'fast KiB':>9}")
+        for name, data in payloads:
+            drf = self.render_cost(JSONRenderer(), data, options['iterations'])
+            fast = self.render_cost(FastJSONRenderer(), data, options['iterations'])
+            self.stdout.write(
+                f"{name:<26}{drf[0]:>9.2f}{fast[0]:>9.2f}{drf[1] / 1024:>9.0f}{fast[1] / 1024:>9.0f}"
+            )
+
+    def seed(self, items):
+        area = Area.objects.create(name=AREA)
+        family = Family.objects.create(family_id='BENCH-0001', area=area)
+        FamilyMember.objects.bulk_create([
+            FamilyMember(family=family, name=f'Bench {n}', aadhar_number=f'0999999999{n:02d}', email=f'bench{n}@bench.invalid')
+            for n in range(3)
+        ])
+        RationItem.objects.bulk_create([
+            RationItem(
+                name=f'Item {n}', price=Decimal('12.50'), area=area, total_quantity=1000, image=f'ration_items/item{n}.png',
+                limit_1_member=2, limit_2_members=3, limit_3_members=4, limit_4_members=5,
+            )
+            for n in range(items)
+        ], batch_size=500)
+        Notification.objects.bulk_create([Notification(message=f'Notice {n}', area=area) for n in range(items)], batch_size=500)
+        return family.family_id
+
+    def measure(self, client, url, iterations):
+        client.get(url)  # warm up
+        cpu = []
+        for _ in range(iterations):
+            started = time.process_time()
+            response = client.get(url)
+            cpu.append(time.process_time() - started)
+        tracemalloc.start()
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return statistics.median(cpu) * 1000, peak, response
+
+    def render_cost(self, renderer, data, iterations):
+        cpu = []
+        for _ in range(iterations):
+            started = time.process_time()
+            renderer.render(data)
+            cpu.append(time.process_time() - started)
+        tracemalloc.start()
+        renderer.render(data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return statistics.median(cpu) * 1000, peak
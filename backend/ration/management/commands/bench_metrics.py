@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve
+
+from ration.metrics import MetricsMiddleware, registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-request overhead of MetricsMiddleware (timing, SQL wrapper, "
+        "histograms, Server-Timing) and fail if it exceeds METRICS_OVERHEAD_BUDGET_MS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per round")
+        parser.add_argument('--rounds', type=int, default=5, help="Best of this many rounds is reported")
+        parser.add_argument('--queries', type=int, default=5, help="SQL queries per simulated request")
+        parser.add_argument('--budget-ms', type=float,
+                            default=getattr(settings, 'METRICS_OVERHEAD_BUDGET_MS', 0.2))
+
+    def handle(self, *args, **options):
+        queries = options['queries']
+
+        def view(request):
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute('SELECT 1')
+            return HttpResponse('ok')
+
+        factory = RequestFactory()
+        match = resolve('/api/stock/')
+        instrumented = MetricsMiddleware(view)
+
+        def request():
+            req = factory.get('/api/stock/')
+            req.resolver_match = match
+            return req
+
+        def run(handler):
+            best = float('inf')
+            for _ in range(options['rounds']):
+                start = time.perf_counter()
+                for _ in range(options['requests']):
+                    handler(request())
+                best = min(best, (time.perf_counter() - start) / options['requests'])
+            return best * 1000
+
+        run(instrumented)  # warm up
+        bare_ms = run(view)
+        instrumented_ms = run(instrumented)
+        overhead_ms = instrumented_ms - bare_ms
+        registry.reset()
+
+        self.stdout.write(f"bare         {bare_ms:.4f} ms/request ({queries} queries)")
+        self.stdout.write(f"instrumented {instrumented_ms:.4f} ms/request")
+        self.stdout.write(f"overhead     {overhead_ms:.4f} ms/request (budget {options['budget_ms']} ms)")
+        if overhead_ms > options['budget_ms']:
+            raise CommandError("Metrics overhead is over budget.")
+        self.stdout.write(self.style.SUCCESS("Within budget."))
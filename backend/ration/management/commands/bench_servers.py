@@ -0,0 +1,95 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent-request capacity of running servers, e.g. WSGI vs ASGI:\n"
+        "  gunicorn backend.wsgi -w 4 -b 127.0.0.1:8001\n"
+        "  uvicorn backend.asgi:application --workers 4 --port 8002\n"
+        "  python manage.py bench_servers \\\n"
+        "    --target wsgi=http://127.0.0.1:8001/api/stock/?family_id=F1 \\\n"
+        "    --target asgi=http://127.0.0.1:8002/api/async/stock/?family_id=F1"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, help="label=URL (repeatable)")
+        parser.add_argument('--concurrency', default='1,10,50,100', help="Comma-separated client counts")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per run")
+        parser.add_argument('--header', action='append', default=[], help="Extra 'Name: value' request header")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            label, sep, url = target.partition('=')
+            if not sep:
+                raise CommandError(f"--target must be label=URL, got {target!r}")
+            targets.append((label, url))
+        headers = dict(h.split(':', 1) for h in options['header'])
+        headers = {k.strip(): v.strip() for k, v in headers.items()}
+
+        results = []
+        for label, url in targets:
+            for clients in [int(c) for c in options['concurrency'].split(',')]:
+                result = self.run_load(url, clients, options['duration'], headers)
+                result.update(target=label, concurrency=clients)
+                results.append(result)
+                if not options['json']:
+                    self.stdout.write(
+                        f"{label:>8} c={clients:<4} {result['rps']:8.1f} req/s  "
+                        f"p50={result['p50_ms']:7.1f}ms  p95={result['p95_ms']:7.1f}ms  errors={result['errors']}"
+                    )
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+
+    def run_load(self, url, clients, duration, headers):
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                request = urllib.request.Request(url, headers=headers)
+                start = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        response.read()
+                    ok = True
+                except (urllib.error.URLError, OSError):
+                    ok = False
+                elapsed = time.perf_counter() - start
+                with lock:
+                    if ok:
+                        latencies.append(elapsed)
+                    else:
+                        errors += 1
+
+        threads = [threading.Thread(target=worker) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'rps': len(latencies) / wall,
+            'p50_ms': pct(0.50),
+            'p95_ms': pct(0.95),
+            'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        }
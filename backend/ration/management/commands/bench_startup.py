@@ -0,0 +1,86 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter: load the app the way a WSGI worker does and
+# serve one request (the health check, which needs no database).
+FIRST_REQUEST = '''
+import django, wsgiref.util
+django.setup()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+{preload}
+environ = {{'PATH_INFO': '/api/', 'REQUEST_METHOD': 'GET'}}
+wsgiref.util.setup_testing_defaults(environ)
+status = []
+b''.join(application(environ, lambda s, h, exc_info=None: status.append(s)))
+assert status[0].startswith('200'), status
+'''
+
+PRELOAD = 'import ration.invoices; ration.invoices.preload()'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker startup: module import time (python -X importtime) and wall time "
+        "from interpreter start to the first served request, with the invoice/PDF code "
+        "imported lazily (as deployed) and preloaded up front (as before it was split out)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per scenario; medians are reported")
+        parser.add_argument('--top', type=int, default=10, help="Heaviest top-level imports to list")
+
+    def handle(self, *args, **options):
+        scenarios = [('lazy', FIRST_REQUEST.format(preload='')), ('preloaded', FIRST_REQUEST.format(preload=PRELOAD))]
+        baseline = statistics.median(self.wall(['-c', 'pass']) for _ in range(options['runs']))
+
+        results = {}
+        for name, code in scenarios:
+            walls = [self.wall(['-c', code]) - baseline for _ in range(options['runs'])]
+            imports = self.import_times(code)
+            results[name] = (statistics.median(walls), sum(imports.values()), imports)
+
+        self.stdout.write(f"{'':<12}{'first request':>15}{'imports':>12}")
+        for name, (wall, imported, _) in results.items():
+            self.stdout.write(f"{name:<12}{wall * 1000:>12.1f} ms{imported / 1000:>9.1f} ms")
+        lazy, preloaded = results['lazy'][0], results['preloaded'][0]
+        self.stdout.write(f"lazy loading saves {(preloaded - lazy) * 1000:.1f} ms per worker start")
+
+        self.stdout.write("\nHeaviest top-level imports (lazy, cumulative):")
+        for module, micros in sorted(results['lazy'][2].items(), key=lambda row: row[1], reverse=True)[:options['top']]:
+            self.stdout.write(f"  {micros / 1000:8.1f} ms  {module}")
+        for heavy in ('reportlab', 'weasyprint'):
+            if heavy in results['lazy'][2]:
+                self.stdout.write(self.style.WARNING(f"{heavy} is still imported at startup"))
+
+    def run_python(self, args, **kwargs):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        return subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR, env=env, check=True, capture_output=True, text=True, **kwargs,
+        )
+
+    def wall(self, args):
+        started = time.perf_counter()
+        self.run_python(args)
+        return time.perf_counter() - started
+
+    def import_times(self, code):
+        """Cumulative import time in microseconds per top-level module, from -X importtime."""
+        stderr = self.run_python(['-X', 'importtime', '-c', code]).stderr
+        totals = {}
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative, module = line[len('import time:'):].split('|')
+            # Nested imports are indented under their parent; only count the outermost
+            if module.startswith('  ') or not cumulative.strip().isdigit():
+                continue
+            name = module.strip().split('.')[0]
+            totals[name] = totals.get(name, 0) + int(cumulative)
+        return totals
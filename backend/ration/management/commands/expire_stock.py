@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ration import inventory
+from ration.sharding import shard_aliases, using_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Write off stock that is below the smallest family limit, as EXPIRY movements "
+        "in the stock ledger. Items are kept so their history stays intact. Run daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--note', default='Below the smallest family limit', help="Note on each expiry movement")
+
+    def handle(self, *args, **options):
+        written_off = 0
+        for alias in shard_aliases():
+            with using_shard(alias):
+                written_off += inventory.write_off_unusable(note=options['note'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote off the remaining stock of {written_off} items."))
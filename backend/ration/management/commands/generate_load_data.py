@@ -0,0 +1,169 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from ration import analytics, conditional
+from ration.areas import area_pk
+from ration.identity import hash_aadhar, normalize_email
+from ration.models import (
+    Area, DailyAreaSales, DailyItemSales, DistributionDay, Family, FamilyMember, Notification, Order, OrderItem,
+    RationItem, StockMovement,
+)
+
+ITEMS = [
+    # name, price, limits for 1-4 members
+    ('Rice', Decimal('3.00'), (5, 10, 15, 20)),
+    ('Wheat', Decimal('2.00'), (5, 8, 12, 15)),
+    ('Sugar', Decimal('25.00'), (1, 2, 2, 3)),
+    ('Dal', Decimal('60.00'), (1, 1, 2, 2)),
+    ('Oil', Decimal('90.00'), (1, 1, 2, 2)),
+    ('Salt', Decimal('10.00'), (1, 1, 1, 2)),
+    ('Kerosene', Decimal('15.00'), (2, 2, 3, 3)),
+    ('Tea', Decimal('120.00'), (1, 1, 1, 1)),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Create synthetic areas, families, members, items and order history for load tests. "
+        "Everything is namespaced by --prefix so it can be removed again with --clear."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='LT', help="Namespace for generated ids (default LT)")
+        parser.add_argument('--areas', type=int, default=5)
+        parser.add_argument('--families', type=int, default=200, help="Families per area")
+        parser.add_argument('--max-members', type=int, default=4, help="Members per family are 1..this")
+        parser.add_argument('--items', type=int, default=5, help=f"Items per area (max {len(ITEMS)})")
+        parser.add_argument('--orders', type=int, default=2, help="Historic orders per family")
+        parser.add_argument('--history-days', type=int, default=60, help="Spread historic orders over this many days")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help="Delete previously generated data and exit")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if options['clear']:
+            self.clear(prefix)
+            return
+        if not 1 <= options['items'] <= len(ITEMS):
+            raise CommandError(f"--items must be between 1 and {len(ITEMS)}")
+        if Family.objects.filter(family_id__startswith=f'{prefix}-').exists():
+            raise CommandError(f"Data with prefix {prefix!r} already exists; run with --clear first.")
+
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        with transaction.atomic():
+            areas = [area_pk(self.area_name(prefix, index), create=True) for index in range(options['areas'])]
+            families, members = self.people(rng, prefix, options, areas)
+            items = self.stock(options, members, areas)
+            orders = self.history(rng, prefix, options, families, items, now)
+
+        # Dashboards and forecasts read the rollups, so fill them for the generated history
+        analytics.rebuild(timezone.localdate(now - timedelta(days=options['history_days'])), timezone.localdate(now))
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(families)} families, {len(members)} members, {len(items)} items "
+            f"and {orders} orders in {options['areas']} areas (prefix {prefix})."
+        ))
+
+    def area_name(self, prefix, index):
+        return f'{prefix}-Area-{index:02d}'
+
+    def people(self, rng, prefix, options, areas):
+        families = Family.objects.bulk_create([
+            Family(family_id=f'{prefix}-{index:02d}-{number:05d}', area_id=area_id)
+            for index, area_id in enumerate(areas)
+            for number in range(options['families'])
+        ])
+        members = []
+        serial = 0
+        for family in families:
+            for _ in range(rng.randint(1, options['max_members'])):
+                serial += 1
+                # 12 digits starting with 0, which real Aadhar numbers never do
+                aadhar = f'0{serial:011d}'
+                members.append(FamilyMember(
+                    family=family,
+                    name=f'{prefix} Member {serial}',
+                    aadhar_number=aadhar,
+                    aadhar_hash=hash_aadhar(aadhar),  # bulk_create skips save()
+                    email=normalize_email(f'{prefix}-{serial}@loadtest.invalid'),
+                ))
+        return families, FamilyMember.objects.bulk_create(members, batch_size=1000)
+
+    def stock(self, options, members, areas):
+        # Enough for every member's family to buy its full entitlement several times over
+        quantity = max(len(members) * 20, 1000)
+        items = RationItem.objects.bulk_create([
+            RationItem(
+                name=name, price=price, area_id=area_id, total_quantity=quantity,
+                limit_1_member=limits[0], limit_2_members=limits[1],
+                limit_3_members=limits[2], limit_4_members=limits[3],
+            )
+            for area_id in areas
+            for name, price, limits in ITEMS[:options['items']]
+        ])
+        StockMovement.objects.bulk_create([
+            StockMovement(item=item, kind=StockMovement.RECEIPT, quantity=quantity, note='Load-test opening balance')
+            for item in items
+        ])
+        # bulk_create skips the signals that invalidate cached stock listings
+        for area_id in areas:
+            conditional.bump_area(area_id)
+        return items
+
+    def history(self, rng, prefix, options, families, items, now):
+        items_by_area = {}
+        for item in items:
+            items_by_area.setdefault(item.area_id, []).append(item)
+
+        orders, baskets, times = [], [], []
+        for family in families:
+            for _ in range(options['orders']):
+                basket = rng.sample(items_by_area[family.area_id], rng.randint(1, len(items_by_area[family.area_id])))
+                basket = [(item, rng.randint(1, 3)) for item in basket]
+                created_at = now - timedelta(days=rng.uniform(1, options['history_days']))
+                orders.append(Order(
+                    family=family,
+                    token_number=f'{prefix}{len(orders):08d}',
+                    total_price=sum(item.price * quantity for item, quantity in basket),
+                    otp=f'{rng.randint(0, 999999):06d}',
+                    payment_status='paid',
+                    created_at=created_at,
+                    collected_at=created_at + timedelta(hours=2),
+                ))
+                baskets.append(basket)
+                times.append(created_at)
+
+        orders = Order.objects.bulk_create(orders, batch_size=1000)
+        # created_at is auto_now_add, which bulk_create overwrites; restore the historic times
+        for order, created_at in zip(orders, times):
+            order.created_at = created_at
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=1000)
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, item=item, quantity=quantity, created_at=order.created_at,
+                item_name=item.name, unit_price=item.price,
+            )
+            for order, basket in zip(orders, baskets)
+            for item, quantity in basket
+        ], batch_size=1000)
+        return len(orders)
+
+    def clear(self, prefix):
+        with transaction.atomic():
+            families = Family.objects.filter(family_id__startswith=f'{prefix}-')
+            orders = Order.objects.filter(family__in=families)
+            OrderItem.objects.filter(order__in=orders).delete()
+            orders.delete()
+            deleted_families = families.delete()[0]
+            areas = Area.objects.filter(name__startswith=f'{prefix}-Area-')
+            StockMovement.objects.filter(item__area__in=areas).delete()  # Ledger rows protect their items
+            for model in (RationItem, DailyItemSales, DailyAreaSales, DistributionDay, Notification):
+                model.objects.filter(area__in=areas).delete()
+            areas.delete()
+        self.stdout.write(self.style.SUCCESS(f"Removed load-test data with prefix {prefix} ({deleted_families} rows)."))
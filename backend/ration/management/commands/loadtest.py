@@ -0,0 +1,236 @@
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import django
+from django.conf import settings
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.utils import timezone
+
+from ration.models import FamilyMember
+
+STEPS = [
+    'login', 'send_otp', 'verify_otp', 'view_stock',
+    'send_otp_email', 'verify_otp_place_order', 'download_invoice',
+]
+OTP_RE = re.compile(r'\b(\d{6})\b')
+QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class StepFailed(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the citizen ordering flow (login -> send_otp -> verify_otp -> view_stock -> "
+        "send_otp_email -> verify_otp_place_order -> download_invoice) for many users at once "
+        "against an in-process server with the locmem email backend, and report p50/p95/p99 "
+        "latency, throughput and query counts per step. Load data first with generate_load_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='LT', help="Data prefix used with generate_load_data")
+        parser.add_argument('--users', type=int, default=50, help="Distinct citizens to run the flow for")
+        parser.add_argument('--concurrency', type=int, default=8, help="Flows running at the same time")
+        parser.add_argument('--port', type=int, default=0, help="Port for the local server (default: any free port)")
+        parser.add_argument('--json', metavar='PATH', help="Write the baseline as JSON to this file ('-' for stdout)")
+
+    def handle(self, *args, **options):
+        members = FamilyMember.objects.filter(
+            family__family_id__startswith=f"{options['prefix']}-", email__endswith='@loadtest.invalid',
+        ).order_by('family_id', 'pk').only('family_id', 'aadhar_number', 'email')
+        # One citizen per family: a family can only buy each item once per cycle
+        seen, citizens = set(), []
+        for member in members:
+            if member.family_id not in seen:
+                seen.add(member.family_id)
+                citizens.append((member.aadhar_number, member.email))
+        citizens = citizens[:options['users']]
+        if not citizens:
+            raise CommandError("No load-test citizens found; run generate_load_data first.")
+
+        # OTPs are read back from the outbox, so mail must stay in this process
+        settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+        mail.outbox = []
+
+        server = ThreadedWSGIServer(('127.0.0.1', options['port']), QuietHandler, allow_reuse_address=True)
+        server.set_app(get_wsgi_application())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{server.server_port}/api'
+
+        samples = {step: [] for step in STEPS}
+        errors = {step: 0 for step in STEPS}
+        failures = []
+        lock = threading.Lock()
+
+        def record(step, seconds, queries, ok):
+            with lock:
+                if ok:
+                    samples[step].append((seconds, queries))
+                else:
+                    errors[step] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for result in pool.map(lambda citizen: self.flow(citizen, record), citizens):
+                if result:
+                    failures.append(result)
+        wall = time.perf_counter() - started
+        server.shutdown()
+        server.server_close()
+
+        baseline = self.summarise(samples, errors, wall, len(citizens), options)
+        baseline['failures'] = failures[:20]
+        self.report(baseline)
+        if options['json']:
+            text = json.dumps(baseline, indent=2, default=str)
+            if options['json'] == '-':
+                self.stdout.write(text)
+            else:
+                with open(options['json'], 'w', encoding='utf-8') as out:
+                    out.write(text + '\n')
+                self.stdout.write(f"Baseline written to {options['json']}")
+
+    # One citizen's flow; returns a failure description or None
+    def flow(self, citizen, record):
+        aadhar, email = citizen
+
+        def step(name, method, path, body=None, headers=None, expect_json=True):
+            started = time.perf_counter()
+            status, payload, queries = self.request(method, path, body, headers, expect_json)
+            elapsed = time.perf_counter() - started
+            ok = status < 400 and not (isinstance(payload, dict) and payload.get('success') is False)
+            record(name, elapsed, queries, ok)
+            if not ok:
+                raise StepFailed(f"{name}: HTTP {status} {str(payload)[:200]}")
+            return payload
+
+        try:
+            login = step('login', 'POST', '/login/', {'aadhar_number': aadhar})
+            family_id = login['family_id']
+
+            step('send_otp', 'POST', '/send-otp/', {'aadhar_number': aadhar, 'email': email})
+            verified = step('verify_otp', 'POST', '/verify-otp/', {'aadhar_number': aadhar, 'otp': self.otp_for(email)})
+            citizen_auth = {'Authorization': f"Citizen {verified['token']}"} if verified.get('token') else {}
+
+            stock = step('view_stock', 'GET', f'/stock/?family_id={quote(family_id)}', headers=citizen_auth)['stock']
+            if not stock:
+                raise StepFailed("view_stock: nothing left to order")
+            item = stock[0]
+
+            step('send_otp_email', 'POST', '/send_otp_email/', {'email': email})
+            step(
+                'verify_otp_place_order', 'POST', '/verify_otp_place_order/',
+                {'email': email, 'otp': self.otp_for(email), 'family_id': family_id,
+                 'items': [{'id': item['id'], 'quantity': 1}]},
+                headers={**citizen_auth, 'Idempotency-Key': uuid.uuid4().hex},
+            )
+            step('download_invoice', 'GET', f'/download_invoice/{quote(email)}', expect_json=False)
+        except StepFailed as exc:
+            return f"{email}: {exc}"
+        except Exception as exc:
+            return f"{email}: {exc!r}"
+        return None
+
+    def request(self, method, path, body, headers, expect_json):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            request.add_header(name, value)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                status, raw, timing = response.status, response.read(), response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as exc:
+            status, raw, timing = exc.code, exc.read(), exc.headers.get('Server-Timing', '')
+        match = QUERIES_RE.search(timing or '')
+        queries = int(match.group(1)) if match else None
+        if not expect_json:
+            return status, None, queries
+        try:
+            return status, json.loads(raw or b'null'), queries
+        except ValueError:
+            return status, raw[:200], queries
+
+    def otp_for(self, email):
+        """Most recent OTP mailed to an address (mail is sent before the response returns)."""
+        for message in reversed(list(mail.outbox)):
+            if email in message.to:
+                match = OTP_RE.search(message.body)
+                if match:
+                    return match.group(1)
+        raise StepFailed(f"no OTP mail for {email}")
+
+    def summarise(self, samples, errors, wall, flows, options):
+        steps = {}
+        total_requests = 0
+        for name in STEPS:
+            latencies = sorted(seconds * 1000 for seconds, _ in samples[name])
+            queries = sorted(q for _, q in samples[name] if q is not None)
+            total_requests += len(latencies) + errors[name]
+            steps[name] = {
+                'ok': len(latencies),
+                'errors': errors[name],
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'mean_ms': sum(latencies) / len(latencies) if latencies else None,
+                'queries_p50': percentile(queries, 50),
+                'queries_max': queries[-1] if queries else None,
+            }
+        completed = steps[STEPS[-1]]['ok']
+        return {
+            'generated_at': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'users': flows,
+            'concurrency': options['concurrency'],
+            'wall_seconds': wall,
+            'flows_completed': completed,
+            'flows_per_second': completed / wall if wall else None,
+            'requests_per_second': total_requests / wall if wall else None,
+            'steps': steps,
+        }
+
+    def report(self, baseline):
+        self.stdout.write(
+            f"{baseline['users']} flows, concurrency {baseline['concurrency']}, "
+            f"{baseline['wall_seconds']:.2f}s: {baseline['flows_completed']} completed, "
+            f"{baseline['flows_per_second']:.1f} flows/s, {baseline['requests_per_second']:.1f} req/s"
+        )
+        self.stdout.write(f"{'step':<24}{'ok':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}")
+        for name, row in baseline['steps'].items():
+            fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+            queries = row['queries_p50'] if row['queries_p50'] is not None else '-'
+            self.stdout.write(
+                f"{name:<24}{row['ok']:>6}{row['errors']:>5}"
+                f"{fmt(row['p50_ms'])}{fmt(row['p95_ms'])}{fmt(row['p99_ms'])}{queries:>9}"
+            )
+        for failure in baseline['failures'][:5]:
+            self.stdout.write(self.style.WARNING(failure))
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from ration import partitions
+from ration.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain the monthly order partitions: create upcoming months and detach, "
+        "archive or drop old ones on every area shard. Run monthly from cron (PostgreSQL only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=getattr(settings, 'ORDER_PARTITION_MONTHS_AHEAD', 3),
+            help="Months of future partitions to keep ready (default: ORDER_PARTITION_MONTHS_AHEAD)",
+        )
+        parser.add_argument('--detach-before', metavar='YYYY-MM',
+                            help="Detach partitions for months before this one")
+        parser.add_argument('--archive', action='store_true',
+                            help=f"Move detached partitions to the {partitions.ARCHIVE_SCHEMA} schema")
+        parser.add_argument('--drop', action='store_true', help="Drop detached partitions (data is lost)")
+        parser.add_argument('--list', action='store_true', help="Only list the attached partitions")
+
+    def handle(self, *args, **options):
+        if options['archive'] and options['drop']:
+            raise CommandError("Use either --archive or --drop, not both.")
+        before = None
+        if options['detach_before']:
+            try:
+                year, month = (int(part) for part in options['detach_before'].split('-'))
+                before = partitions.cycle_start().replace(year=year, month=month)
+            except ValueError:
+                raise CommandError("--detach-before must be YYYY-MM")
+            if before > partitions.cycle_start():
+                raise CommandError("Refusing to detach the current month's partition.")
+
+        # Orders live on their area's shard, so every shard has its own partitions
+        for alias in shard_aliases():
+            conn = connections[alias]
+            if not partitions.is_supported(conn):
+                raise CommandError(f"Order partitioning needs PostgreSQL ({alias}).")
+            prefix = f"{alias}: " if len(shard_aliases()) > 1 else ''
+
+            if options['list']:
+                for table in partitions.PARTITIONED_TABLES:
+                    for name, bounds in partitions.list_partitions(table, conn):
+                        self.stdout.write(f"{prefix}{name}: {bounds}")
+                continue
+
+            with transaction.atomic(using=alias):
+                created = partitions.ensure_partitions(options['ahead'], conn=conn)
+                detached = []
+                if before is not None:
+                    detached = partitions.detach_partitions(
+                        before,
+                        archive_schema=partitions.ARCHIVE_SCHEMA if options['archive'] else None,
+                        drop=options['drop'],
+                        conn=conn,
+                    )
+
+            for name in created:
+                self.stdout.write(f"{prefix}Created {name}")
+            for name in detached:
+                self.stdout.write(f"{prefix}Detached {name}")
+            self.stdout.write(self.style.SUCCESS(f"{prefix}{len(created)} created, {len(detached)} detached."))
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ration import analytics
+from ration.sharding import shard_aliases, using_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily sales rollups from the order tables. Run nightly for "
+        "the last couple of days, or with --start/--end to backfill history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help="Rebuild this many days up to today (default 2)")
+        parser.add_argument('--start', metavar='YYYY-MM-DD', help="First day to rebuild")
+        parser.add_argument('--end', metavar='YYYY-MM-DD', help="Last day to rebuild (default today)")
+
+    def handle(self, *args, **options):
+        try:
+            end = parse_date(options['end']) if options['end'] else timezone.localdate()
+            start = parse_date(options['start']) if options['start'] else end - timedelta(days=options['days'] - 1)
+        except ValueError:
+            start = end = None
+        if start is None or end is None or start > end:
+            raise CommandError("Give valid dates with --start <= --end.")
+
+        # Rollups live beside their orders, on every area shard
+        items = areas = 0
+        for alias in shard_aliases():
+            with using_shard(alias):
+                shard_items, shard_areas = analytics.rebuild(start, end)
+            items += shard_items
+            areas += shard_areas
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {items} item rows and {areas} area rows for {start} to {end}."
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ration.models import Family, FamilyMember, ShardKey
+from ration.sharding import CATALOG_ALIAS, shard_aliases, using_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Refill the ShardKey catalog (family ids, Aadhar hashes and emails -> area) from "
+        "every shard. Run after turning sharding on, moving data between shards or bulk loads."
+    )
+
+    def handle(self, *args, **options):
+        keys = []
+        for alias in shard_aliases():
+            with using_shard(alias):
+                keys += [
+                    ShardKey(kind=ShardKey.FAMILY_ID, key=family_id, area_id=area_id)
+                    for family_id, area_id in Family.objects.values_list('family_id', 'area_id').iterator()
+                ]
+                for aadhar_hash, email, area_id in (
+                    FamilyMember.objects.values_list('aadhar_hash', 'email', 'family__area_id').iterator()
+                ):
+                    keys += [
+                        ShardKey(kind=kind, key=key, area_id=area_id)
+                        for kind, key in ((ShardKey.AADHAR, aadhar_hash), (ShardKey.EMAIL, email)) if key
+                    ]
+
+        with transaction.atomic(using=CATALOG_ALIAS):
+            ShardKey.objects.using(CATALOG_ALIAS).all().delete()
+            # A key on two shards keeps its first entry
+            ShardKey.objects.using(CATALOG_ALIAS).bulk_create(keys, batch_size=1000, ignore_conflicts=True)
+        self.stdout.write(self.style.SUCCESS(f"Catalogued {len(keys)} keys from {len(shard_aliases())} shards."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ration import inventory
+from ration.models import RationItem
+
+
+class Command(BaseCommand):
+    help = "Compare RationItem.total_quantity with the stock ledger, optionally rebuilding balances"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Reset balances from the ledger")
+
+    def handle(self, *args, **options):
+        balances = inventory.ledger_balances()
+        mismatched = 0
+        for item_id, name, area, qty in RationItem.objects.values_list('id', 'name', 'area__name', 'total_quantity'):
+            expected = balances.get(item_id, 0)
+            if qty != expected:
+                mismatched += 1
+                self.stdout.write(f"{name} ({area}) #{item_id}: balance {qty}, ledger {expected}")
+
+        if options['fix'] and mismatched:
+            changed = inventory.rebuild_balances()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {changed} balances from the ledger."))
+        elif not mismatched:
+            self.stdout.write(self.style.SUCCESS("All balances match the ledger."))
@@ -0,0 +1,231 @@
+# ration/metrics.py
+#
+# Request instrumentation. MetricsMiddleware times every request, counts and
+# times its SQL through connection.execute_wrapper, and collects named spans
+# (email send, PDF build) recorded with timed(). Results go into per-process
+# histograms served in Prometheus text format by metrics_view, and each
+# response gets a Server-Timing header. With several worker processes every
+# worker keeps its own totals; scrape each worker or aggregate by instance.
+
+import bisect
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.mail.backends.smtp import EmailBackend
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = '<unmatched>'  # 404s share one label so bad URLs can't blow up cardinality
+
+_current = ContextVar('ration_request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('queries', 'db_seconds', 'spans')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.spans = {}
+
+    def add_span(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+class Histogram:
+    __slots__ = ('buckets', 'total', 'count')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_label(value)}"' for name, value in labels.items())
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = {}    # (route, method, status) -> Histogram
+        self.db_queries = {}  # route -> queries
+        self.db_seconds = {}  # route -> seconds
+        self.spans = {}       # (route, span) -> Histogram
+
+    def record(self, route, method, status, seconds, timings):
+        with self._lock:
+            self.requests.setdefault((route, method, status), Histogram()).observe(seconds)
+            self.db_queries[route] = self.db_queries.get(route, 0) + timings.queries
+            self.db_seconds[route] = self.db_seconds.get(route, 0.0) + timings.db_seconds
+            for name, span_seconds in timings.spans.items():
+                self.spans.setdefault((route, name), Histogram()).observe(span_seconds)
+
+    def _histogram_lines(self, metric, series):
+        for labels, histogram in series:
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, '+Inf'), histogram.buckets):
+                cumulative += count
+                yield f'{metric}_bucket{{{_labels(**labels, le=bound)}}} {cumulative}'
+            yield f'{metric}_sum{{{_labels(**labels)}}} {histogram.total}'
+            yield f'{metric}_count{{{_labels(**labels)}}} {histogram.count}'
+
+    def render(self):
+        with self._lock:
+            requests = sorted(self.requests.items())
+            db_queries = sorted(self.db_queries.items())
+            db_seconds = sorted(self.db_seconds.items())
+            spans = sorted(self.spans.items())
+
+        lines = [
+            '# HELP ration_request_duration_seconds Request latency by route.',
+            '# TYPE ration_request_duration_seconds histogram',
+        ]
+        lines += self._histogram_lines('ration_request_duration_seconds', (
+            ({'route': route, 'method': method, 'status': status}, histogram)
+            for (route, method, status), histogram in requests
+        ))
+        lines += [
+            '# HELP ration_db_queries_total SQL queries executed, by route.',
+            '# TYPE ration_db_queries_total counter',
+        ]
+        lines += [f'ration_db_queries_total{{{_labels(route=route)}}} {count}' for route, count in db_queries]
+        lines += [
+            '# HELP ration_db_query_seconds_total Time spent in SQL, by route.',
+            '# TYPE ration_db_query_seconds_total counter',
+        ]
+        lines += [f'ration_db_query_seconds_total{{{_labels(route=route)}}} {seconds}' for route, seconds in db_seconds]
+        lines += [
+            '# HELP ration_span_duration_seconds Named sub-timings (email, pdf) by route.',
+            '# TYPE ration_span_duration_seconds histogram',
+        ]
+        lines += self._histogram_lines('ration_span_duration_seconds', (
+            ({'route': route, 'span': name}, histogram) for (route, name), histogram in spans
+        ))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+@contextmanager
+def timed(name):
+    """Record the enclosed block (or decorated function) as a named span of the current request."""
+    timings = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add_span(name, time.perf_counter() - started)
+
+
+def _count_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db_seconds += time.perf_counter() - started
+
+
+def server_timing(seconds, timings):
+    parts = [f'app;dur={seconds * 1000:.1f}', f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.queries} queries"']
+    parts += [f'{name};dur={span * 1000:.1f}' for name, span in timings.spans.items()]
+    return ', '.join(parts)
+
+
+def _wrap_queries():
+    """Count the SQL of this thread's connections until the returned stack is closed."""
+    stack = ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(_count_query))
+    return stack
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'METRICS_SERVER_TIMING', True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with _wrap_queries():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, time.perf_counter() - started, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            # The ORM runs in the request's thread-sensitive sync thread, whose
+            # connections are not this thread's, so the wrappers go on there
+            stack = await sync_to_async(_wrap_queries)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        return self.record(request, response, time.perf_counter() - started, timings)
+
+    def record(self, request, response, elapsed, timings):
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match else UNMATCHED_ROUTE
+        registry.record(route, request.method, response.status_code, elapsed, timings)
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(elapsed, timings)
+        return response
+
+
+class TimedEmailBackend(EmailBackend):
+    """SMTP backend that records sending time as the request's 'email' span."""
+
+    def send_messages(self, email_messages):
+        with timed('email'):
+            return super().send_messages(email_messages)
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return HttpResponseForbidden()
+    elif request.META.get('REMOTE_ADDR') not in ('127.0.0.1', '::1'):
+        # Without a token only a scraper on the same host may read the metrics
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
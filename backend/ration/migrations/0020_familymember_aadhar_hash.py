@@ -0,0 +1,73 @@
+# Generated by Django 5.2 on 2026-10-19 17:02
+
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import migrations, models
+
+
+# Frozen copies of ration.identity.hash_aadhar / normalize_email as of this migration
+def hash_aadhar(aadhar_number):
+    key = getattr(settings, 'AADHAR_HASH_KEY', settings.SECRET_KEY).encode()
+    value = str(aadhar_number or '').strip().encode()
+    return hmac.new(key, value, hashlib.sha256).hexdigest()
+
+
+def normalize_email(email):
+    if not email:
+        return email
+    return email.strip().lower()
+
+
+def populate_identity_columns(apps, schema_editor):
+    FamilyMember = apps.get_model('ration', 'FamilyMember')
+    db = schema_editor.connection.alias
+    members = list(FamilyMember.objects.using(db).order_by('pk').only('id', 'aadhar_number', 'email', 'family_id'))
+
+    # Members of one family often share an email, and the unique constraint
+    # needs one member per (normalised) email. Emails are how members log in,
+    # so the migration stops and lists the clashes rather than picking a
+    # winner; give each listed member their own email (or none) and re-run it.
+    owners = {}
+    for member in members:
+        email = normalize_email(member.email)
+        if email:
+            owners.setdefault(email, []).append(member)
+    clashes = {email: owned for email, owned in owners.items() if len(owned) > 1}
+    if clashes:
+        lines = [
+            f"  {email}: " + ', '.join(f"member {member.pk} (family {member.family_id})" for member in owned)
+            for email, owned in sorted(clashes.items())
+        ]
+        raise CommandError(
+            f"{len(clashes)} emails are used by more than one family member; "
+            "they must be unique (ignoring case and spaces) before this migration can run:\n" + '\n'.join(lines)
+        )
+
+    for member in members:
+        member.aadhar_number = (member.aadhar_number or '').strip()
+        member.aadhar_hash = hash_aadhar(member.aadhar_number)
+        member.email = normalize_email(member.email)
+        member.save(update_fields=['aadhar_number', 'aadhar_hash', 'email'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0019_notification_dismissed_areas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='familymember',
+            name='aadhar_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(populate_identity_columns, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='familymember',
+            constraint=models.UniqueConstraint(condition=models.Q(('email__isnull', False), models.Q(('email', ''), _negated=True)), fields=('email',), name='uniq_familymember_email'),
+        ),
+    ]
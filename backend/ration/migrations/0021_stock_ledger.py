@@ -0,0 +1,62 @@
+# Generated by Django 5.2 on 2026-10-19 17:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_ledger(apps, schema_editor):
+    # RationItem.total_quantity is what orders have been decrementing, so it is
+    # the authoritative opening balance; the old Stock rows were never updated.
+    RationItem = apps.get_model('ration', 'RationItem')
+    StockMovement = apps.get_model('ration', 'StockMovement')
+    StockMovement.objects.bulk_create([
+        StockMovement(item_id=item_id, kind='receipt', quantity=qty, note='Opening balance')
+        for item_id, qty in RationItem.objects.exclude(total_quantity=0).values_list('id', 'total_quantity')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0020_familymember_aadhar_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('receipt', 'Receipt'), ('sale', 'Sale'), ('expiry', 'Expiry'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='stock',
+            name='item',
+        ),
+        migrations.AddIndex(
+            model_name='rationitem',
+            index=models.Index(fields=['area', 'total_quantity'], name='rationitem_area_qty_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='ration.rationitem'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='ration.order'),
+        ),
+        migrations.DeleteModel(
+            name='Stock',
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['item', 'created_at'], name='stockmove_item_created_idx'),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-19 17:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0021_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='collected_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='pickup_slot',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='queue_number',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DistributionDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('last_token', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('area', 'date'), name='uniq_distributionday_area_date')],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='queue_day',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='ration.distributionday'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('queue_day', 'queue_number'), name='uniq_order_queue_number'),
+        ),
+    ]
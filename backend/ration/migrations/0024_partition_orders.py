@@ -0,0 +1,157 @@
+# Generated by Django 5.2 on 2026-10-19 17:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+PARTITIONED_TABLES = ('ration_order', 'ration_orderitem')
+PARTITION_KEY = 'created_at'
+
+
+# Frozen copy of the ration.partitions conversion as of this migration
+def month_start(value):
+    value = timezone.localtime(value)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(start, months):
+    index = start.month - 1 + months
+    return start.replace(year=start.year + index // 12, month=index % 12 + 1)
+
+
+def is_partitioned(table, conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_table(table, schema_editor, months_ahead=3):
+    """Convert an existing table into one partitioned by month on created_at, in
+    place, keeping its rows, sequence, indexes and outgoing foreign keys. The
+    primary key becomes (id, created_at)."""
+    conn = schema_editor.connection
+    if conn.vendor != 'postgresql' or is_partitioned(table, conn):
+        return
+    qn = conn.ops.quote_name
+    legacy = f"{table}_unpartitioned"
+    sequence = f"{table}_id_seq"
+
+    with conn.cursor() as cursor:
+        # Secondary indexes and foreign keys, recreated on the new parent below
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)",
+            [table, table],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT MIN({qn(PARTITION_KEY)}) FROM {qn(table)}")
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+        cursor.execute(f"ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP DEFAULT")
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {qn(sequence)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE ({qn(PARTITION_KEY)})"
+        )
+        cursor.execute(f"CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id")
+        cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)", [sequence])
+        # Safety net for rows outside every monthly range (e.g. a missed ensure_partitions run)
+        cursor.execute(f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+
+        month = month_start(oldest or timezone.now())
+        last = add_months(month_start(timezone.now()), months_ahead)
+        while month <= last:
+            cursor.execute(
+                f"CREATE TABLE {qn(f'{table}_y{month.year}m{month.month:02d}')} "
+                f"PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)",
+                [month, add_months(month, 1)],
+            )
+            month = add_months(month, 1)
+
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}")
+        cursor.execute(f"SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) FROM {qn(table)}", [sequence])
+        cursor.execute(f"DROP TABLE {qn(legacy)}")
+
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, {qn(PARTITION_KEY)})")
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+
+def copy_order_timestamps(apps, schema_editor):
+    Order = apps.get_model('ration', 'Order')
+    OrderItem = apps.get_model('ration', 'OrderItem')
+    OrderItem.objects.update(
+        created_at=Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('created_at')[:1])
+    )
+
+
+def partition_order_tables(apps, schema_editor):
+    # PostgreSQL only; rewrites both tables, so run it in a maintenance window on large data
+    for table in PARTITIONED_TABLES:
+        partition_table(table, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0023_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='order',
+            name='uniq_order_queue_number',
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='token_number',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='ration.order'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='order',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='payment_order', to='ration.order'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='order',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='ration.order'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['queue_day', 'queue_number'], name='order_queue_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['family', 'created_at'], name='order_family_created_idx'),
+        ),
+        # After the FK to ration_order is dropped, so the UPDATE queues no deferred checks
+        migrations.RunPython(copy_order_timestamps, migrations.RunPython.noop),
+        migrations.RunPython(partition_order_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 17:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0024_partition_orders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAreaSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('area', models.CharField(max_length=255)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('area', 'day'), name='uniq_area_sales_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('area', models.CharField(max_length=255)),
+                ('item_name', models.CharField(max_length=100)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_sales', to='ration.rationitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['area', 'day'], name='item_sales_area_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'area', 'item'), name='uniq_item_sales_day')],
+            },
+        ),
+    ]
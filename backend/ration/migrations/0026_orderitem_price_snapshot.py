@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-19 17:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def snapshot_item_prices(apps, schema_editor):
+    # Best available history: existing lines get the item's current name and price
+    RationItem = apps.get_model('ration', 'RationItem')
+    OrderItem = apps.get_model('ration', 'OrderItem')
+    item = RationItem.objects.filter(pk=OuterRef('item_id'))
+    OrderItem.objects.update(
+        item_name=Subquery(item.values('name')[:1]),
+        unit_price=Subquery(item.values('price')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0025_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='item_name',
+            field=models.CharField(default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.RunPython(snapshot_item_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='ration.rationitem'),
+        ),
+    ]
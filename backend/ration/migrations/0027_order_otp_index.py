@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-19 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0026_orderitem_price_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['otp', 'family'], name='order_otp_family_idx'),
+        ),
+    ]
@@ -0,0 +1,295 @@
+# Generated by Django 5.2 on 2026-10-19 18:05
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+# Models whose free-text `area` becomes a foreign key to Area
+AREA_MODELS = ['Family', 'RationItem', 'DistributionDay', 'Notification', 'DailyItemSales', 'DailyAreaSales', 'AreaVersion']
+
+
+def create_areas(apps, schema_editor):
+    Area = apps.get_model('ration', 'Area')
+    Notification = apps.get_model('ration', 'Notification')
+    db = schema_editor.connection.alias
+
+    names = set()
+    for model_name in AREA_MODELS:
+        model = apps.get_model('ration', model_name)
+        names.update(model.objects.using(db).values_list('area', flat=True).distinct())
+    dismissed = [n for n in Notification.objects.using(db).only('id', 'dismissed_areas') if n.dismissed_areas]
+    for notification in dismissed:
+        names.update(notification.dismissed_areas)
+    names.discard(None)
+    Area.objects.using(db).bulk_create([Area(name=name) for name in sorted(names)], batch_size=1000)
+
+    # One UPDATE per table, matching names in the database
+    area_pk = Area.objects.using(db).filter(name=OuterRef('area')).values('pk')[:1]
+    for model_name in AREA_MODELS:
+        apps.get_model('ration', model_name).objects.using(db).update(area_ref=Subquery(area_pk))
+
+    pks = dict(Area.objects.using(db).values_list('name', 'pk'))
+    for notification in dismissed:
+        notification.dismissed_area_ids = [pks[name] for name in notification.dismissed_areas]
+    Notification.objects.using(db).bulk_update(dismissed, ['dismissed_area_ids'], batch_size=1000)
+
+
+def restore_area_names(apps, schema_editor):
+    Area = apps.get_model('ration', 'Area')
+    Notification = apps.get_model('ration', 'Notification')
+    db = schema_editor.connection.alias
+
+    area_name = Area.objects.using(db).filter(pk=OuterRef('area_ref')).values('name')[:1]
+    for model_name in AREA_MODELS:
+        apps.get_model('ration', model_name).objects.using(db).update(area=Subquery(area_name))
+
+    names = dict(Area.objects.using(db).values_list('pk', 'name'))
+    dismissed = [n for n in Notification.objects.using(db).only('id', 'dismissed_area_ids') if n.dismissed_area_ids]
+    for notification in dismissed:
+        notification.dismissed_areas = [names[pk] for pk in notification.dismissed_area_ids]
+    Notification.objects.using(db).bulk_update(dismissed, ['dismissed_areas'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0028_area_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Area',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        # New columns beside the old ones. The old ones become nullable so the
+        # migration can be reversed on a populated database.
+        migrations.AddField(
+            model_name='family',
+            name='area_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ration.area'),
+        ),
+        migrations.AlterField(
+            model_name='family',
+            name='area',
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='rationitem',
+            name='area_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ration.area'),
+        ),
+        migrations.AlterField(
+            model_name='rationitem',
+            name='area',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='distributionday',
+            name='area_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ration.area'),
+        ),
+        migrations.AlterField(
+            model_name='distributionday',
+            name='area',
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='area_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ration.area'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='area',
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='dailyitemsales',
+            name='area_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ration.area'),
+        ),
+        migrations.AlterField(
+            model_name='dailyitemsales',
+            name='area',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='dailyareasales',
+            name='area_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ration.area'),
+        ),
+        migrations.AlterField(
+            model_name='dailyareasales',
+            name='area',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='areaversion',
+            name='area_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ration.area'),
+        ),
+        migrations.AlterField(
+            model_name='areaversion',
+            name='area',
+            field=models.CharField(max_length=255, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='dismissed_area_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.RunPython(create_areas, restore_area_names),
+        migrations.RemoveIndex(
+            model_name='rationitem',
+            name='rationitem_area_qty_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dailyitemsales',
+            name='item_sales_area_day_idx',
+        ),
+        migrations.RemoveConstraint(
+            model_name='distributionday',
+            name='uniq_distributionday_area_date',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailyitemsales',
+            name='uniq_item_sales_day',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailyareasales',
+            name='uniq_area_sales_day',
+        ),
+        migrations.RemoveField(
+            model_name='family',
+            name='area',
+        ),
+        migrations.RenameField(
+            model_name='family',
+            old_name='area_ref',
+            new_name='area',
+        ),
+        migrations.AlterField(
+            model_name='family',
+            name='area',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='families', to='ration.area'),
+        ),
+        migrations.RemoveField(
+            model_name='rationitem',
+            name='area',
+        ),
+        migrations.RenameField(
+            model_name='rationitem',
+            old_name='area_ref',
+            new_name='area',
+        ),
+        migrations.AlterField(
+            model_name='rationitem',
+            name='area',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='items', to='ration.area'),
+        ),
+        migrations.RemoveField(
+            model_name='distributionday',
+            name='area',
+        ),
+        migrations.RenameField(
+            model_name='distributionday',
+            old_name='area_ref',
+            new_name='area',
+        ),
+        migrations.AlterField(
+            model_name='distributionday',
+            name='area',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='distribution_days', to='ration.area'),
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='area',
+        ),
+        migrations.RenameField(
+            model_name='notification',
+            old_name='area_ref',
+            new_name='area',
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='area',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='notifications', to='ration.area'),
+        ),
+        migrations.RemoveField(
+            model_name='dailyitemsales',
+            name='area',
+        ),
+        migrations.RenameField(
+            model_name='dailyitemsales',
+            old_name='area_ref',
+            new_name='area',
+        ),
+        migrations.AlterField(
+            model_name='dailyitemsales',
+            name='area',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ration.area'),
+        ),
+        migrations.RemoveField(
+            model_name='dailyareasales',
+            name='area',
+        ),
+        migrations.RenameField(
+            model_name='dailyareasales',
+            old_name='area_ref',
+            new_name='area',
+        ),
+        migrations.AlterField(
+            model_name='dailyareasales',
+            name='area',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ration.area'),
+        ),
+        migrations.RemoveField(
+            model_name='areaversion',
+            name='area',
+        ),
+        migrations.RenameField(
+            model_name='areaversion',
+            old_name='area_ref',
+            new_name='area',
+        ),
+        migrations.AlterField(
+            model_name='areaversion',
+            name='area',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='listing_version', to='ration.area'),
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='dismissed_areas',
+        ),
+        migrations.RenameField(
+            model_name='notification',
+            old_name='dismissed_area_ids',
+            new_name='dismissed_areas',
+        ),
+        migrations.AddIndex(
+            model_name='rationitem',
+            index=models.Index(fields=['area', 'total_quantity'], name='rationitem_area_qty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyitemsales',
+            index=models.Index(fields=['area', 'day'], name='item_sales_area_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='distributionday',
+            constraint=models.UniqueConstraint(fields=('area', 'date'), name='uniq_distributionday_area_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyitemsales',
+            constraint=models.UniqueConstraint(fields=('day', 'area', 'item'), name='uniq_item_sales_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyareasales',
+            constraint=models.UniqueConstraint(fields=('area', 'day'), name='uniq_area_sales_day'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-19 18:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_bookings(apps, schema_editor):
+    # Slots already handed out count against their capacity
+    Order = apps.get_model('ration', 'Order')
+    PickupSlot = apps.get_model('ration', 'PickupSlot')
+    db = schema_editor.connection.alias
+    booked = (
+        Order.objects.using(db).filter(queue_day__isnull=False, pickup_slot__isnull=False)
+        .values('queue_day', 'pickup_slot').annotate(booked=Count('pk')).order_by()
+    )
+    PickupSlot.objects.using(db).bulk_create([
+        PickupSlot(day_id=row['queue_day'], start=row['pickup_slot'], booked=row['booked']) for row in booked
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0030_stockmovement_item_protect'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PickupSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='ration.distributionday')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'start'), name='uniq_pickupslot_day_start')],
+            },
+        ),
+        migrations.RunPython(count_bookings, migrations.RunPython.noop),
+    ]
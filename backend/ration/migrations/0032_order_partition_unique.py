@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0031_pickup_slots'),
+    ]
+
+    # Unique indexes on the partitioned order table have to include created_at;
+    # PostgreSQL builds one per partition, so the queue index is folded in
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_queue_number_idx',
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='token_number',
+            field=models.CharField(max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('token_number', 'created_at'), name='uniq_order_token_number'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('queue_day', 'queue_number', 'created_at'), name='uniq_order_queue_number'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-19 18:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0032_order_partition_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('family_id', 'Family ID'), ('aadhar', 'Aadhar hash'), ('email', 'Email')], max_length=10)),
+                ('key', models.CharField(max_length=255)),
+                ('area', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ration.area')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='uniq_shardkey_kind_key')],
+            },
+        ),
+    ]
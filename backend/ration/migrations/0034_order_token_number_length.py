@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0033_shard_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='token_number',
+            field=models.CharField(max_length=64),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-19 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_area_shards(apps, schema_editor):
+    # Areas stay where the shard map put them until now: AREA_SHARD_MAP, else
+    # spread over AREA_SHARDS by pk. Each database records the same placement
+    # for its copy of the Area table.
+    Area = apps.get_model('ration', 'Area')
+    db = schema_editor.connection.alias
+    aliases = list(getattr(settings, 'AREA_SHARDS', None) or ['default'])
+    pinned = getattr(settings, 'AREA_SHARD_MAP', {})
+    placement = {}
+    for pk in Area.objects.using(db).values_list('pk', flat=True):
+        placement.setdefault(pinned.get(pk) or aliases[pk % len(aliases)], []).append(pk)
+    for alias, pks in placement.items():
+        Area.objects.using(db).filter(pk__in=pks).update(shard=alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ration', '0034_order_token_number_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='area',
+            name='shard',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(record_area_shards, migrations.RunPython.noop),
+    ]
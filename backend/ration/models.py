@@ -1,11 +1,21 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
+# Area: every area-scoped row points here; names are resolved via ration/areas.py
+class Area(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    shard = models.CharField(max_length=100, blank=True)  # Database alias of its rows, fixed at creation (ration/sharding.py)
+
+    def __str__(self):
+        return self.name
+
 # Family:
 class Family(models.Model):
     family_id = models.CharField(max_length=100, unique=True)
-    area = models.CharField(max_length=100)
+    area = models.ForeignKey(Area, related_name='families', on_delete=models.PROTECT)
     def __str__(self):
         return self.family_id
 
@@ -18,6 +28,24 @@ class FamilyMember(models.Model):
     otp_expiry_time = models.DateTimeField(null=True, blank=True)
     family = models.ForeignKey(Family, related_name='members', on_delete=models.CASCADE)  # Keep only one 'family' field
     profile_image = models.ImageField(upload_to='profile_images/', null=True, blank=True)
+    aadhar_hash = models.CharField(max_length=64, unique=True, editable=False, null=True)  # keyed hash, see ration/identity.py
+
+    class Meta:
+        constraints = [
+            # Emails are stored lower-cased (see save()), so this is a unique index on the normalised email
+            models.UniqueConstraint(
+                fields=['email'],
+                condition=models.Q(email__isnull=False) & ~models.Q(email=''),
+                name='uniq_familymember_email',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        from .identity import hash_aadhar, normalize_email
+        self.aadhar_number = (self.aadhar_number or '').strip()
+        self.aadhar_hash = hash_aadhar(self.aadhar_number)
+        self.email = normalize_email(self.email)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -26,9 +54,9 @@ class FamilyMember(models.Model):
 # RationItem:
 class RationItem(models.Model):
     name = models.CharField(max_length=100) 
-    total_quantity = models.IntegerField()
+    total_quantity = models.IntegerField()  # current balance, maintained from StockMovement
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    area = models.CharField(max_length=255)
+    area = models.ForeignKey(Area, related_name='items', on_delete=models.PROTECT)
     image = models.ImageField(upload_to='ration_items/', null=True, blank=True)
 
     # Limit fields for each family size (1-4 members)
@@ -38,28 +66,135 @@ class RationItem(models.Model):
     limit_4_members = models.IntegerField(default=0)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Listing views read "items in stock for this area" in one indexed query
+            models.Index(fields=['area', 'total_quantity'], name='rationitem_area_qty_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+# Per-area, per-day pickup queue counter (see ration/queueing.py)
+class DistributionDay(models.Model):
+    area = models.ForeignKey(Area, related_name='distribution_days', on_delete=models.PROTECT)
+    date = models.DateField()
+    last_token = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['area', 'date'], name='uniq_distributionday_area_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.area_id} {self.date} (#{self.last_token})"
+
+# Families booked into one pickup slot of a distribution day (see ration/queueing.py)
+class PickupSlot(models.Model):
+    day = models.ForeignKey(DistributionDay, related_name='slots', on_delete=models.CASCADE)
+    start = models.DateTimeField()
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'start'], name='uniq_pickupslot_day_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.day_id} {self.start:%H:%M} ({self.booked} booked)"
+
 class Order(models.Model):
     family = models.ForeignKey(Family, on_delete=models.CASCADE)
-    token_number = models.CharField(max_length=20, unique=True)
+    # Unique by construction (queueing.allocate_ticket); the index below is
+    # unique per created_at, as every unique index on a partitioned table must be.
+    # Long enough for '<area pk>-<day pk>-<number>' with 64-bit pks.
+    token_number = models.CharField(max_length=64)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     otp = models.CharField(max_length=6)  # OTP for payment verification
     payment_status = models.CharField(max_length=20, default='pending')  # e.g., pending, paid, failed
     created_at = models.DateTimeField(auto_now_add=True)
+    # Pickup queue
+    queue_day = models.ForeignKey(DistributionDay, null=True, blank=True, related_name='orders', on_delete=models.SET_NULL)
+    queue_number = models.PositiveIntegerField(null=True, blank=True)
+    pickup_slot = models.DateTimeField(null=True, blank=True)
+    collected_at = models.DateTimeField(null=True, blank=True)
+
+    # Partitioned by month on created_at (ration/partitions.py)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['token_number', 'created_at'], name='uniq_order_token_number'),
+            models.UniqueConstraint(fields=['queue_day', 'queue_number', 'created_at'], name='uniq_order_queue_number'),
+        ]
+        indexes = [
+            models.Index(fields=['family', 'created_at'], name='order_family_created_idx'),
+            models.Index(fields=['otp', 'family'], name='order_otp_family_idx'),  # Counter lookup by OTP and area
+        ]
 
     def __str__(self):
         return f"Order {self.token_number}"
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, related_name='order_items', on_delete=models.CASCADE)
-    item = models.ForeignKey(RationItem, on_delete=models.CASCADE)
+    # No DB-level FK: Order is partitioned, so its id alone isn't unique in the database
+    order = models.ForeignKey(Order, related_name='order_items', on_delete=models.CASCADE, db_constraint=False)
+    # SET_NULL: deleting a stock item must not erase order history
+    item = models.ForeignKey(RationItem, null=True, blank=True, on_delete=models.SET_NULL)
     quantity = models.PositiveIntegerField()  # quantity purchased
+    # Snapshot at purchase, so history and invoices don't depend on the current item
+    item_name = models.CharField(max_length=100)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)  # Copy of order.created_at; partition key
+
+    @property
+    def line_total(self):
+        return self.unit_price * self.quantity
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            if self.order_id:
+                # Keep each line in the same monthly partition as its order
+                self.created_at = self.order.created_at
+            if self.item_id and (not self.item_name or self.unit_price is None):
+                self.item_name = self.item_name or self.item.name
+                self.unit_price = self.item.price if self.unit_price is None else self.unit_price
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.item_name} x {self.quantity}"
+
+# Catalog entry: the area whose shard holds a family id, Aadhar hash or email
+# (see ration/sharding.py). Lives on 'default' and is only kept while sharded.
+class ShardKey(models.Model):
+    FAMILY_ID = 'family_id'
+    AADHAR = 'aadhar'
+    EMAIL = 'email'
+    KIND_CHOICES = [
+        (FAMILY_ID, 'Family ID'),
+        (AADHAR, 'Aadhar hash'),
+        (EMAIL, 'Email'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=255)
+    area = models.ForeignKey(Area, related_name='+', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='uniq_shardkey_kind_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.key} -> {self.area_id}"
+
+# Stored response for a client Idempotency-Key (see ration/idempotency.py)
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64)  # sha256 of the request body
+    response_status = models.PositiveSmallIntegerField()
+    response_body = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
-        return f"{self.item.name} x {self.quantity}"
+        return self.key
 
 class OTP(models.Model):
     email = models.EmailField()
@@ -112,16 +247,87 @@ class UserProfile(models.Model):
         return f"Profile of {self.user.username}"
     
 # ration
-class Stock(models.Model):
-    item = models.ForeignKey(RationItem, on_delete=models.CASCADE)
-    quantity_in_stock = models.PositiveIntegerField()
+class StockMovement(models.Model):
+    """Append-only inventory ledger. RationItem.total_quantity is the materialised
+    running balance of these rows; change it only through ration/inventory.py."""
+
+    RECEIPT = 'receipt'
+    SALE = 'sale'
+    EXPIRY = 'expiry'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (RECEIPT, 'Receipt'),
+        (SALE, 'Sale'),
+        (EXPIRY, 'Expiry'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    item = models.ForeignKey(RationItem, related_name='movements', on_delete=models.PROTECT)  # Items with ledger rows are never deleted
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()  # signed: receipts positive, sales/expiries negative
+    order = models.ForeignKey('Order', null=True, blank=True, related_name='stock_movements', on_delete=models.SET_NULL, db_constraint=False)
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', 'created_at'], name='stockmove_item_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} {self.item.name}"
+
+
+# Daily sales rollups, maintained by ration/analytics.py
+class DailyItemSales(models.Model):
+    day = models.DateField()
+    area = models.ForeignKey(Area, related_name='+', on_delete=models.PROTECT)
+    item = models.ForeignKey(RationItem, null=True, blank=True, related_name='daily_sales', on_delete=models.SET_NULL)
+    item_name = models.CharField(max_length=100)  # kept so history survives item deletion
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'area', 'item'], name='uniq_item_sales_day'),
+        ]
+        indexes = [
+            models.Index(fields=['area', 'day'], name='item_sales_area_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.area_id} {self.item_name}: {self.units}"
+
+
+class DailyAreaSales(models.Model):
+    day = models.DateField(db_index=True)
+    area = models.ForeignKey(Area, related_name='+', on_delete=models.PROTECT)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['area', 'day'], name='uniq_area_sales_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.area_id}: {self.orders} orders"
+
+
+# Per-area change counter behind the listing ETags (see ration/conditional.py)
+class AreaVersion(models.Model):
+    area = models.OneToOneField(Area, related_name='listing_version', on_delete=models.CASCADE)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
-        return f"{self.item.name} - {self.quantity_in_stock} in stock"
+        return f"{self.area_id} v{self.version}"
 
 
 class Payment(models.Model):
-    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='payment_order')
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='payment_order', db_constraint=False)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     is_paid = models.BooleanField(default=False)
     payment_date = models.DateTimeField(auto_now_add=True)
@@ -138,6 +344,6 @@ from django.contrib.postgres.fields import ArrayField  # if using Postgres
 class Notification(models.Model):
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
-    area = models.CharField(max_length=100)  # owner area or main area
-    dismissed_areas = ArrayField(models.CharField(max_length=100), default=list, blank=True)
+    area = models.ForeignKey(Area, related_name='notifications', on_delete=models.PROTECT)  # owner area or main area
+    dismissed_areas = ArrayField(models.BigIntegerField(), default=list, blank=True)  # Area pks
     read = models.BooleanField(default=False)
@@ -0,0 +1,210 @@
+# ration/partitions.py
+#
+# Monthly RANGE partitioning of the order tables on created_at (PostgreSQL
+# only; everything here is a no-op on other backends). Partitions follow local
+# calendar months, the same as the ration cycle, so queries bounded by
+# created_at >= cycle_start() are pruned to the current partition. Used by
+# the order_partitions management command; migration 0024 has its own frozen
+# copy of the conversion.
+
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+PARTITIONED_TABLES = ('ration_order', 'ration_orderitem')
+PARTITION_KEY = 'created_at'
+ARCHIVE_SCHEMA = 'ration_archive'
+
+
+def month_start(value):
+    value = timezone.localtime(value)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def cycle_start(now=None):
+    """Start of the current ration cycle (the local calendar month)."""
+    return month_start(now or timezone.now())
+
+
+def add_months(start, months):
+    index = start.month - 1 + months
+    return start.replace(year=start.year + index // 12, month=index % 12 + 1)
+
+
+def partition_name(table, start):
+    return f"{table}_y{start.year}m{start.month:02d}"
+
+
+def partition_month(table, name):
+    """Month start encoded in a partition name, or None (e.g. the default partition)."""
+    match = re.fullmatch(rf'{re.escape(table)}_y(\d{{4}})m(\d{{2}})', name)
+    if match is None:
+        return None
+    return cycle_start().replace(year=int(match.group(1)), month=int(match.group(2)))
+
+
+def is_supported(conn=connection):
+    return conn.vendor == 'postgresql'
+
+
+def is_partitioned(table, conn=connection):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table, conn=connection):
+    """[(partition name, bound expression)] currently attached to `table`."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND pg_table_is_visible(p.oid) ORDER BY c.relname",
+            [table],
+        )
+        return cursor.fetchall()
+
+
+def default_partition(table):
+    return f"{table}_default"
+
+
+def create_partition(table, start, conn=connection):
+    """Add the month starting at `start` to `table`. Rows for that month already
+    in the default partition (written while the month had none) are moved into
+    the new partition; PostgreSQL refuses to attach it while they are there."""
+    qn = conn.ops.quote_name
+    name, default = partition_name(table, start), default_partition(table)
+    bounds = [start, add_months(start, 1)]
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+        if cursor.fetchone()[0]:
+            return
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [default])
+        stranded = False
+        if cursor.fetchone()[0]:
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {qn(default)} "
+                f"WHERE {qn(PARTITION_KEY)} >= %s AND {qn(PARTITION_KEY)} < %s)",
+                bounds,
+            )
+            stranded = cursor.fetchone()[0]
+        if stranded:
+            # Default detached for the move, so the new partition can be created
+            # and the stranded rows routed into it; locks the table until commit
+            cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(default)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)", bounds,
+        )
+        if stranded:
+            where = f"{qn(PARTITION_KEY)} >= %s AND {qn(PARTITION_KEY)} < %s"
+            cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(default)} WHERE {where}", bounds)
+            cursor.execute(f"DELETE FROM {qn(default)} WHERE {where}", bounds)
+            cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(default)} DEFAULT")
+
+
+def ensure_partitions(months_ahead=3, now=None, conn=connection):
+    """Create the current month's partition and the next `months_ahead` for every
+    order table. Returns the names of the partitions created."""
+    if not is_supported(conn):
+        return []
+    start = cycle_start(now)
+    created = []
+    for table in PARTITIONED_TABLES:
+        existing = {name for name, _ in list_partitions(table, conn)}
+        for offset in range(months_ahead + 1):
+            month = add_months(start, offset)
+            if partition_name(table, month) not in existing:
+                create_partition(table, month, conn)
+                created.append(partition_name(table, month))
+    return created
+
+
+def detach_partitions(before, archive_schema=None, drop=False, conn=connection):
+    """Detach every monthly partition that ends on or before `before` (a month
+    start). Detached tables are moved to `archive_schema` if given, or dropped if
+    `drop` is set, and otherwise left in place as ordinary tables. Returns the
+    names of the partitions detached."""
+    if not is_supported(conn):
+        return []
+    qn = conn.ops.quote_name
+    detached = []
+    with conn.cursor() as cursor:
+        if archive_schema:
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {qn(archive_schema)}")
+        for table in PARTITIONED_TABLES:
+            for name, _ in list_partitions(table, conn):
+                month = partition_month(table, name)
+                if month is None or add_months(month, 1) > before:
+                    continue
+                cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+                if drop:
+                    cursor.execute(f"DROP TABLE {qn(name)}")
+                elif archive_schema:
+                    cursor.execute(f"ALTER TABLE {qn(name)} SET SCHEMA {qn(archive_schema)}")
+                detached.append(name)
+    return detached
+
+
+def partition_table(table, schema_editor, months_ahead=3):
+    """Convert an existing table into a partitioned one in place, keeping its
+    rows, sequence, indexes and outgoing foreign keys. The primary key becomes
+    (id, created_at), since PostgreSQL needs the partition key in every unique
+    index; nothing may hold a foreign key to the table."""
+    conn = schema_editor.connection
+    if not is_supported(conn) or is_partitioned(table, conn):
+        return
+    qn = conn.ops.quote_name
+    legacy = f"{table}_unpartitioned"
+    sequence = f"{table}_id_seq"
+
+    with conn.cursor() as cursor:
+        # Secondary indexes and foreign keys, recreated on the new parent below
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)",
+            [table, table],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT MIN({qn(PARTITION_KEY)}) FROM {qn(table)}")
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+        cursor.execute(f"ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP DEFAULT")
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {qn(sequence)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE ({qn(PARTITION_KEY)})"
+        )
+        cursor.execute(f"CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id")
+        cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval(%s::regclass)", [sequence])
+        # Safety net for rows outside every monthly range (e.g. a missed ensure_partitions run)
+        cursor.execute(f"CREATE TABLE {qn(default_partition(table))} PARTITION OF {qn(table)} DEFAULT")
+
+        month = cycle_start(oldest) if oldest else cycle_start()
+        last = add_months(cycle_start(), months_ahead)
+        while month <= last:
+            create_partition(table, month, conn)
+            month = add_months(month, 1)
+
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}")
+        cursor.execute(f"SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) FROM {qn(table)}", [sequence])
+        cursor.execute(f"DROP TABLE {qn(legacy)}")
+
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, {qn(PARTITION_KEY)})")
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
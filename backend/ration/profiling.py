@@ -0,0 +1,192 @@
+# ration/profiling.py
+#
+# On-demand profiling of single requests. A request is profiled when an admin
+# sends the X-Profile header, or when it is picked by PROFILE_SAMPLE_RATE (for
+# paths under PROFILE_PATHS). The request then runs under cProfile with its SQL
+# captured (statements and timings, never parameters). A .prof dump and a text
+# report go to PROFILE_DIR under MEDIA_ROOT, keeping the newest PROFILE_KEEP.
+# All other requests only pay for a header lookup and, with sampling on, one
+# random() call.
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import secrets
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.text import slugify
+
+PROFILE_HEADER = 'X-Profile'
+
+# One profile at a time per process; concurrent triggers just run normally
+_busy = threading.Lock()
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILE_DIR', os.path.join(settings.MEDIA_ROOT, 'profiles'))
+
+
+def is_admin(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # API clients authenticate with DRF tokens, which the middleware stack doesn't see
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.exceptions import AuthenticationFailed
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return bool(result and result[0].is_staff)
+
+
+def rotate(directory, keep):
+    reports = sorted(name for name in os.listdir(directory) if name.endswith('.txt'))
+    for name in reports[:max(len(reports) - keep, 0)]:
+        base = name[:-len('.txt')]
+        for suffix in ('.txt', '.prof'):
+            try:
+                os.remove(os.path.join(directory, base + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def write_report(request, response, seconds, profiler, statements):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    # Random suffix: the directory lives under MEDIA_ROOT, so names must not be guessable
+    base = '{}-{}-{}-{}'.format(
+        timezone.now().strftime('%Y%m%dT%H%M%S'),
+        request.method.lower(),
+        slugify(request.path)[:60] or 'root',
+        secrets.token_hex(8),
+    )
+    profiler.dump_stats(os.path.join(directory, base + '.prof'))
+
+    stats_text = io.StringIO()
+    pstats.Stats(profiler, stream=stats_text).sort_stats('cumulative').print_stats(40)
+    sql_seconds = sum(duration for _, duration in statements)
+    with open(os.path.join(directory, base + '.txt'), 'w', encoding='utf-8') as report:
+        report.write(f"{request.method} {request.get_full_path()} -> {response.status_code}\n")
+        report.write(f"total {seconds * 1000:.1f} ms, {len(statements)} queries in {sql_seconds * 1000:.1f} ms\n\n")
+        report.write("SQL (slowest first)\n")
+        for sql, duration in sorted(statements, key=lambda row: row[1], reverse=True):
+            report.write(f"{duration * 1000:8.2f} ms  {sql}\n")
+        report.write("\nPython (cumulative)\n")
+        report.write(stats_text.getvalue())
+
+    rotate(directory, getattr(settings, 'PROFILE_KEEP', 50))
+    return base
+
+
+def _capture_sql(statements):
+    """Append (sql, seconds) for this thread's queries to `statements` until the
+    returned stack is closed."""
+    def capture_sql(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            statements.append((sql, time.perf_counter() - started))
+
+    stack = ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(capture_sql))
+    return stack
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+        self.sample_paths = tuple(getattr(settings, 'PROFILE_PATHS', ()))
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def sampled(self, request):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return not self.sample_paths or request.path.startswith(self.sample_paths)
+        return False
+
+    def wanted(self, request):
+        if PROFILE_HEADER in request.headers:
+            return is_admin(request)
+        return self.sampled(request)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.wanted(request) or not _busy.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self.profile(request)
+        finally:
+            _busy.release()
+
+    async def __acall__(self, request):
+        if PROFILE_HEADER in request.headers:
+            wanted = await sync_to_async(is_admin)(request)  # May read the token table
+        else:
+            wanted = self.sampled(request)
+        if not wanted or not _busy.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            return await self.aprofile(request)
+        finally:
+            _busy.release()
+
+    def profile(self, request):
+        statements = []
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with _capture_sql(statements):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        seconds = time.perf_counter() - started
+
+        response['X-Profile-Id'] = write_report(request, response, seconds, profiler, statements)
+        return response
+
+    async def aprofile(self, request):
+        # cProfile and the SQL wrappers work per thread. The profiled thread is
+        # the request's thread-sensitive sync thread, where its ORM calls and sync
+        # code run; the event loop is shared with other requests, so it is left out
+        statements = []
+        profiler = cProfile.Profile()
+
+        def start():
+            stack = _capture_sql(statements)
+            profiler.enable()
+            return stack
+
+        def stop(stack):
+            profiler.disable()
+            stack.close()
+
+        started = time.perf_counter()
+        stack = await sync_to_async(start)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stop)(stack)
+        seconds = time.perf_counter() - started
+
+        response['X-Profile-Id'] = await sync_to_async(write_report, thread_sensitive=False)(
+            request, response, seconds, profiler, statements,
+        )
+        return response
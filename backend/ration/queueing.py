@@ -0,0 +1,101 @@
+# ration/queueing.py
+#
+# Distribution-day pickup queue. Each area gets a DistributionDay row per date
+# whose counter hands out monotonic queue numbers with a single-row UPDATE (no
+# table locks). Each family is booked into the first upcoming pickup slot that
+# still has room, counted per slot, so no slot gets more families than the shop
+# can serve in it.
+
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DistributionDay, PickupSlot
+
+Ticket = namedtuple('Ticket', ['day', 'number', 'token_number', 'pickup_slot'])
+
+
+class QueueFull(Exception):
+    pass
+
+
+def slot_length():
+    return timedelta(minutes=getattr(settings, 'PICKUP_SLOT_MINUTES', 30))
+
+
+def slot_capacity():
+    """Families one counter can serve in a single pickup slot."""
+    per_hour = getattr(settings, 'SHOP_FAMILIES_PER_HOUR', 40)
+    return max(1, per_hour * getattr(settings, 'PICKUP_SLOT_MINUTES', 30) // 60)
+
+
+def day_slots(day):
+    """Start times of every pickup slot on a given date, in shop opening order."""
+    tz = timezone.get_current_timezone()
+    length = slot_length()
+    slots = []
+    for start, end in getattr(settings, 'DISTRIBUTION_SESSIONS', [('09:00', '13:00'), ('15:00', '19:00')]):
+        slot = timezone.make_aware(datetime.combine(day, time.fromisoformat(start)), tz)
+        session_end = timezone.make_aware(datetime.combine(day, time.fromisoformat(end)), tz)
+        while slot + length <= session_end:
+            slots.append(slot)
+            slot += length
+    return slots
+
+
+def _next_number(distribution_day):
+    with transaction.atomic(using=router.db_for_write(DistributionDay)):
+        # Row lock on this one counter; see allocate_ticket for how long it is held
+        DistributionDay.objects.filter(pk=distribution_day.pk).update(last_token=F('last_token') + 1)
+        return DistributionDay.objects.filter(pk=distribution_day.pk).values_list('last_token', flat=True).get()
+
+
+def _book_slot(distribution_day, upcoming):
+    """Book the first of `upcoming` slots with room left; None when they are all full."""
+    PickupSlot.objects.bulk_create(
+        [PickupSlot(day=distribution_day, start=start) for start in upcoming], ignore_conflicts=True,
+    )
+    open_slots = PickupSlot.objects.filter(day=distribution_day, start__gte=upcoming[0], booked__lt=slot_capacity())
+    while True:
+        slot = open_slots.order_by('start').values_list('pk', 'start').first()
+        if slot is None:
+            return None
+        # Conditional UPDATE: a concurrent booking that took the last place makes this a no-op
+        if open_slots.filter(pk=slot[0]).update(booked=F('booked') + 1):
+            return slot[1]
+
+
+def allocate_ticket(area_id, now=None):
+    """Reserve the next queue number and pickup slot for an area (by Area pk).
+
+    Call it inside the order's transaction, so a failed order gives both back.
+    Slots already in the past are skipped; once every slot of a day is full
+    the family is booked onto the next distribution day.
+
+    The locks taken on the day's counter row and the booked slot row last until
+    that transaction ends, so orders for the same area and day are placed one
+    at a time: a second order waits here until the first commits or rolls back.
+    That is what keeps numbers gap-free and slots within capacity; keep the
+    work done after this call in the order transaction short.
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    for offset in range(getattr(settings, 'DISTRIBUTION_BOOKING_DAYS', 7)):
+        day = today + timedelta(days=offset)
+        upcoming = [slot for slot in day_slots(day) if slot > now]
+        if not upcoming:
+            continue
+        distribution_day, _ = DistributionDay.objects.get_or_create(area_id=area_id, date=day)
+        pickup_slot = _book_slot(distribution_day, upcoming)
+        if pickup_slot is None:
+            continue
+        number = _next_number(distribution_day)
+        # Day pks are per shard; the area in front makes the token unique everywhere
+        # and tells ration/sharding.py where to route it
+        token_number = f"{area_id}-{distribution_day.pk}-{number:04d}"
+        return Ticket(distribution_day, number, token_number, pickup_slot)
+    raise QueueFull(f"No pickup slots left for area {area_id}")
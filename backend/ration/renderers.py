@@ -0,0 +1,40 @@
+# ration/renderers.py
+#
+# JSON renderer for the API. Serialises with orjson when it is installed (much
+# less CPU and allocation per response than the stdlib encoder DRF uses) and
+# falls back to DRF's JSONRenderer otherwise, or when indented output is asked
+# for. Types orjson doesn't handle natively (Decimal, lazy strings, querysets)
+# go through DRF's encoder, so the output matches JSONRenderer.
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    return _encoder.default(obj)
+
+
+def dumps(data):
+    """Compact UTF-8 JSON bytes, as FastJSONRenderer renders them."""
+    if orjson is None:
+        return JSONRenderer().render(data)
+    # Same escaping as JSONRenderer: these are valid JSON but not valid JavaScript
+    return (
+        orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        .replace(b'\xe2\x80\xa8', b'\\u2028')
+        .replace(b'\xe2\x80\xa9', b'\\u2029')
+    )
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,118 @@
+# ration/routers.py
+#
+# Primary/replica database routing. Reads go to the 'replica' alias only inside
+# views decorated with @read_replica, and never once the request (or a recent
+# request from the same client) has written, so users always read their own
+# writes. Without a 'replica' alias in DATABASES everything uses 'default'.
+
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+PIN_COOKIE = 'db_primary_pin'
+
+_state = contextvars.ContextVar('ration_db_routing', default=None)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state and state['replica_ok'] and not state['pinned'] and replica_configured():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Read-your-writes for the rest of this request
+            state['pinned'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
+
+
+def read_replica(view):
+    """Let a read-only view (or report export) read from the replica."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapped(request, *args, **kwargs):
+            with _replica_ok():
+                return await view(request, *args, **kwargs)
+        return async_wrapped
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with _replica_ok():
+            return view(request, *args, **kwargs)
+    return wrapped
+
+
+@contextmanager
+def _replica_ok():
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous = state['replica_ok']
+    state['replica_ok'] = True
+    try:
+        yield
+    finally:
+        state['replica_ok'] = previous
+
+
+class ReplicaPinningMiddleware:
+    """Tracks routing state per request and keeps a client on the primary for
+    REPLICA_PIN_SECONDS after it writes, covering replication lag."""
+
+    sync_capable = True
+    async_capable = True
+    unsafe_methods = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = {'replica_ok': False, 'pinned': PIN_COOKIE in request.COOKIES}
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, response, state)
+
+    async def __acall__(self, request):
+        state = {'replica_ok': False, 'pinned': PIN_COOKIE in request.COOKIES}
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, response, state)
+
+    def pin(self, request, response, state):
+        wrote = request.method in self.unsafe_methods and response.status_code < 400
+        if replica_configured() and (wrote or (state['pinned'] and PIN_COOKIE not in request.COOKIES)):
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,116 @@
+# ration/sendfile.py
+#
+# File responses that don't tie up a Python worker. With SENDFILE_BACKEND set,
+# the view only checks access and returns headers: 'nginx' sends
+# X-Accel-Redirect to an internal location (SENDFILE_NGINX_LOCATIONS maps each
+# served directory to one), 'xsendfile' sends X-Sendfile with the absolute
+# path (Apache mod_xsendfile, lighttpd). The front server then streams the
+# file itself. Without a backend (development), files are streamed from Django
+# with single-range Range support so media players and resumed downloads work.
+#
+# nginx, for the default SENDFILE_NGINX_LOCATIONS:
+#
+#     location /protected/media/    { internal; alias /srv/ration/backend/media/; }
+#     location /protected/invoices/ { internal; alias /srv/ration/backend/private/invoices/; }
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+
+re_range = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def nginx_location(path):
+    for directory, location in getattr(settings, 'SENDFILE_NGINX_LOCATIONS', {}).items():
+        directory = os.path.join(os.path.abspath(directory), '')
+        if path.startswith(directory):
+            return location.rstrip('/') + '/' + quote(path[len(directory):])
+    raise ImproperlyConfigured(f"No SENDFILE_NGINX_LOCATIONS entry covers {path}")
+
+
+def sendfile(request, path, content_type=None, attachment_name=None):
+    """Response for the file at `path` (already access-checked by the caller)."""
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("File not found.")
+
+    last_modified = int(stat.st_mtime)
+    unchanged = get_conditional_response(request, last_modified=last_modified)
+    if unchanged:
+        return unchanged
+
+    backend = getattr(settings, 'SENDFILE_BACKEND', '')
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response.headers['X-Accel-Redirect'] = nginx_location(path)
+    elif backend == 'xsendfile':
+        response = HttpResponse(content_type=content_type)
+        response.headers['X-Sendfile'] = path
+    elif backend:
+        raise ImproperlyConfigured(f"Unknown SENDFILE_BACKEND {backend!r}")
+    else:
+        response = serve_from_django(request, path, stat.st_size, content_type)
+
+    response.headers['Last-Modified'] = http_date(last_modified)
+    if attachment_name:
+        response.headers['Content-Disposition'] = content_disposition_header(True, attachment_name)
+    return response
+
+
+def serve_from_django(request, path, size, content_type):
+    response = None
+    match = re_range.match(request.headers.get('Range', '').strip())
+    if match and request.method in ('GET', 'HEAD'):
+        start, end = match.groups()
+        if start:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+        elif end:
+            # bytes=-N: the last N bytes
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start = None
+        if start is None or start > end:
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        response = StreamingHttpResponse(read_range(path, start, end - start + 1), status=206, content_type=content_type)
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response.headers['Content-Length'] = str(end - start + 1)
+    if response is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_media(request, path):
+    """MEDIA_URL view (replaces django.conf.urls.static), for uploaded images."""
+    full_path = safe_join(settings.MEDIA_ROOT, path)  # '..' raises SuspiciousFileOperation (400)
+    # Profiling reports live under MEDIA_ROOT but are for admins on the server only
+    profile_dir = os.path.join(os.path.abspath(getattr(settings, 'PROFILE_DIR', '')), '')
+    if full_path.startswith(profile_dir) or not os.path.isfile(full_path):
+        raise Http404("File not found.")
+    return sendfile(request, full_path)
@@ -1,10 +1,20 @@
 from rest_framework import serializers
-from .models import Stock
+from .models import Area, RationItem
+
+
+def area_field():
+    # Areas are read and written by name, like the rest of the API
+    return serializers.SlugRelatedField(slug_field='name', queryset=Area.objects.all())
+
 
 class StockSerializer(serializers.ModelSerializer):
+    # Stock is the RationItem balance (see ration/inventory.py)
+    item_name = serializers.CharField(source='name', read_only=True)
+    area = area_field()
+
     class Meta:
-        model = Stock
-        fields = ['id', 'item_name', 'quantity', 'total_quantity', 'price', 'image', 'area']
+        model = RationItem
+        fields = ['id', 'item_name', 'total_quantity', 'price', 'image', 'area']
 
 
 # serializers.py
@@ -38,6 +48,8 @@ from rest_framework import serializers
 from .models import RationItem
 
 class RationItemSerializer(serializers.ModelSerializer):
+    area = area_field()
+
     class Meta:
         model = RationItem
         fields = ['name', 'limit_1_member', 'limit_2_members', 'limit_3_members', 'limit_4_members', 'price', 'area']
@@ -50,7 +62,7 @@ from rest_framework import serializers
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
-        fields = ['item', 'quantity']
+        fields = ['item', 'item_name', 'quantity', 'unit_price']
 
 class OrderSerializer(serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True)
@@ -63,6 +75,8 @@ from rest_framework import serializers
 from .models import Notification
 
 class NotificationSerializer(serializers.ModelSerializer):
+    area = area_field()
+
     class Meta:
         model = Notification
         fields = ['id', 'message', 'area', 'timestamp']
@@ -0,0 +1,296 @@
+# ration/sharding.py
+#
+# Area-based sharding. Everything area-scoped (families and their members,
+# items and the stock ledger, orders, queues, notifications, rollups) lives on
+# the database alias recorded in its Area row. A new area is placed once, when
+# it is created: AREA_SHARD_MAP pins individual areas and the rest are spread
+# over AREA_SHARDS by Area pk. Adding a shard later only places new areas there;
+# existing ones stay put until their rows are moved and Area.shard updated.
+# Admin users, OTPs and idempotency keys stay on 'default'. The Area table
+# itself is a catalog on 'default', so pks are unique across shards, and each
+# area's row is copied to its shard so foreign keys to it hold there.
+#
+# ShardRouter sends area-scoped queries to the shard pinned for the request by
+# ShardRoutingMiddleware, which finds it from the citizen token or from an area
+# name, Aadhar number, email, family id or queue token in the URL, query string
+# or body. Queue tokens start with their area's pk; family ids, Aadhar hashes
+# and emails are looked up in the ShardKey catalog on 'default', which signals
+# keep current while sharded (`manage.py rebuild_shard_keys` refills it). Rows
+# referenced only by a shard-local pk (order or item ids) need the token or an
+# `area` parameter alongside. Views that span areas run one query per shard in
+# parallel with fan_out(). With a single shard (the default) nothing is pinned
+# and routing is left to ration/routers.py.
+
+import contextvars
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+
+CATALOG_ALIAS = DEFAULT_DB_ALIAS
+
+# ration models that are not area-scoped and live on 'default' only
+GLOBAL_MODELS = {'customadminuser', 'userprofile', 'otp', 'idempotencykey', 'shardkey'}
+
+_state = contextvars.ContextVar('ration_shard', default=None)
+
+
+def shard_aliases():
+    return list(getattr(settings, 'AREA_SHARDS', None) or [DEFAULT_DB_ALIAS])
+
+
+def is_sharded():
+    return len(shard_aliases()) > 1
+
+
+def place_area(area_id):
+    """Shard a new area goes to: AREA_SHARD_MAP, else spread over AREA_SHARDS by pk."""
+    pinned = getattr(settings, 'AREA_SHARD_MAP', {})
+    if area_id in pinned:
+        return pinned[area_id]
+    aliases = shard_aliases()
+    return aliases[area_id % len(aliases)]
+
+
+def shard_for_area(area_id):
+    """Database alias holding the rows of an area (by Area pk), or None for an
+    area the catalog doesn't have."""
+    from .areas import area_directory
+
+    return area_directory.shard(area_id)
+
+
+def current_shard():
+    state = _state.get()
+    return state['alias'] if state else None
+
+
+@contextmanager
+def using_shard(alias):
+    """Route area-scoped queries in this block to one shard."""
+    token = _state.set({'alias': alias})
+    try:
+        yield alias
+    finally:
+        _state.reset(token)
+
+
+def area_shard(area_id):
+    """using_shard() for an area's shard; a no-op with a single shard."""
+    if not is_sharded():
+        return nullcontext()
+    return using_shard(shard_for_area(area_id))
+
+
+def is_sharded_model(model):
+    return model._meta.app_label == 'ration' and model._meta.model_name not in GLOBAL_MODELS
+
+
+class ShardRouter:
+    """Area-scoped models go to the pinned shard, or to the shard an instance
+    came from; everything else falls through to the next router."""
+
+    def _db(self, model, **hints):
+        if not is_sharded() or not is_sharded_model(model):
+            return None
+        alias = current_shard()
+        if alias:
+            return alias
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in shard_aliases():
+            return instance._state.db
+        return None
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_sharded() and obj1._state.db in shard_aliases() and obj2._state.db in shard_aliases():
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every shard carries the full schema; the catalog and global tables
+        # are only written on 'default'
+        return None
+
+
+def _run_pinned(query, alias):
+    with using_shard(alias):
+        return query(alias)
+
+
+def _run_in_thread(query, alias):
+    # Workers keep their connections between calls, as request threads do
+    # between requests; ones past CONN_MAX_AGE or broken are dropped first
+    close_old_connections()
+    return _run_pinned(query, alias)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def fan_out_pool():
+    """The process-wide thread pool fan_out() runs shard queries on."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'SHARD_FANOUT_WORKERS', 8), thread_name_prefix='shard',
+            )
+        return _pool
+
+
+def fan_out(query, aliases=None):
+    """[query(alias) for each shard], run in parallel threads, in shard order.
+
+    Each call has its shard pinned, so `query` can use the ORM as usual.
+    """
+    aliases = list(aliases or shard_aliases())
+    if len(aliases) == 1 or any(connections[alias].in_atomic_block for alias in aliases):
+        # Other threads can't see this transaction's uncommitted rows
+        return [_run_pinned(query, alias) for alias in aliases]
+    return list(fan_out_pool().map(partial(_run_in_thread, query), aliases))
+
+
+def key_area(kind, key):
+    """Area pk the catalog has for a key, or None."""
+    from .models import ShardKey
+
+    return ShardKey.objects.using(CATALOG_ALIAS).filter(kind=kind, key=key).values_list('area_id', flat=True).first()
+
+
+def remember_keys(area_id, keys):
+    """Record [(kind, key), ...] as living in an area."""
+    from .models import ShardKey
+
+    for kind, key in keys:
+        ShardKey.objects.using(CATALOG_ALIAS).update_or_create(kind=kind, key=key, defaults={'area_id': area_id})
+
+
+def forget_keys(keys):
+    from .models import ShardKey
+
+    for kind, key in keys:
+        ShardKey.objects.using(CATALOG_ALIAS).filter(kind=kind, key=key).delete()
+
+
+def token_area(token_number):
+    """Area pk at the front of a queue token ('<area>-<day>-<number>'), or None."""
+    parts = token_number.split('-')
+    return int(parts[0]) if len(parts) == 3 and parts[0].isdigit() else None
+
+
+def request_params(request):
+    """Form or JSON body fields of a write request (without consuming file streams)."""
+    if request.method not in ('POST', 'PUT', 'PATCH', 'DELETE'):
+        return {}
+    if request.content_type == 'application/json':
+        try:
+            body = json.loads(request.body or b'{}')
+        except ValueError:
+            return {}
+        return body if isinstance(body, dict) else {}
+    if request.content_type in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        return request.POST.dict()
+    return {}
+
+
+def param_text(params, name):
+    """A string or integer parameter as text, else None."""
+    value = params.get(name)
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        return None
+    return str(value)
+
+
+def shard_from_params(params):
+    from .areas import area_pk
+    from .identity import lookup_by_aadhar, lookup_by_email
+    from .models import ShardKey
+
+    area = params.get('area') or params.get('area_name')
+    if isinstance(area, str):
+        area_id = area_pk(area)
+        if area_id is not None:
+            return shard_for_area(area_id)
+
+    # JSON bodies may carry numeric ids and Aadhar numbers
+    aadhar_number, email = param_text(params, 'aadhar_number'), params.get('email')
+    identity = (
+        lookup_by_aadhar(aadhar_number) if aadhar_number
+        else lookup_by_email(email) if isinstance(email, str) else None
+    )
+    if identity is not None:
+        return shard_for_area(identity.area_id)
+
+    family_id = param_text(params, 'family_id')
+    if family_id:
+        area_id = key_area(ShardKey.FAMILY_ID, family_id)
+        if area_id is not None:
+            return shard_for_area(area_id)
+
+    token_number = params.get('token_number') or params.get('token')
+    if isinstance(token_number, str):
+        area_id = token_area(token_number)
+        if area_id is not None:
+            return shard_for_area(area_id)
+    return None
+
+
+def request_shard(request, view_kwargs):
+    """Shard for a request: citizen token first, then URL, query string and body."""
+    from .authentication import citizen_identity_from_header
+
+    citizen = citizen_identity_from_header(request)
+    if citizen:
+        return shard_for_area(citizen['area_id'])
+    for params in (view_kwargs, request.GET.dict(), request_params(request)):
+        alias = shard_from_params(params)
+        if alias:
+            return alias
+    return None
+
+
+class ShardRoutingMiddleware:
+    """Pins each request to its area's shard before the view runs. A request
+    that names no area (admin listings across areas) is left unpinned."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _state.set({'alias': None})
+        try:
+            return self.get_response(request)
+        finally:
+            _state.reset(token)
+
+    async def __acall__(self, request):
+        token = _state.set({'alias': None})
+        try:
+            return await self.get_response(request)
+        finally:
+            _state.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Under ASGI Django runs this in the request's sync thread, which shares
+        # the state dict set above
+        state = _state.get()
+        if state is not None and is_sharded():
+            state['alias'] = request_shard(request, view_kwargs)
+        return None
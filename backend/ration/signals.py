@@ -0,0 +1,108 @@
+# ration/signals.py
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import conditional
+from .areas import area_directory
+from .identity import identity_cache
+from .models import Area, Family, FamilyMember, RationItem, ShardKey
+from .sharding import CATALOG_ALIAS, forget_keys, is_sharded, place_area, remember_keys
+
+
+IDENTITY_FIELDS = {'aadhar_number', 'aadhar_hash', 'email', 'family', 'family_id'}
+
+
+# Keep the in-process identity LRU honest when members or families change.
+# OTP-only saves pass update_fields and leave the cached identity alone.
+@receiver([post_save, post_delete], sender=FamilyMember)
+def invalidate_member_identity(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not IDENTITY_FIELDS.intersection(update_fields):
+        return
+    identity_cache.discard_member(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Family)
+def invalidate_family_identity(sender, instance, **kwargs):
+    identity_cache.discard_family(instance.pk)
+
+
+# A renamed or deleted area must not keep resolving from the area directory
+@receiver([post_save, post_delete], sender=Area)
+def invalidate_area_directory(sender, instance, created=False, **kwargs):
+    if not created:
+        area_directory.clear()
+
+
+# Areas are created and renamed in the catalog, where a new area is placed on a
+# shard for good; that shard keeps a copy of the row for its foreign keys
+# (ration/sharding.py)
+@receiver(post_save, sender=Area)
+def copy_area_to_shard(sender, instance, using, raw=False, **kwargs):
+    if raw or using != CATALOG_ALIAS:
+        return
+    if not instance.shard:
+        instance.shard = place_area(instance.pk)
+        Area.objects.using(CATALOG_ALIAS).filter(pk=instance.pk).update(shard=instance.shard)
+    if instance.shard == CATALOG_ALIAS:
+        return
+    Area.objects.using(instance.shard).update_or_create(
+        pk=instance.pk, defaults={'name': instance.name, 'created_at': instance.created_at, 'shard': instance.shard},
+    )
+
+
+@receiver(post_delete, sender=Area)
+def delete_area_from_shard(sender, instance, using, **kwargs):
+    if using == CATALOG_ALIAS and instance.shard and instance.shard != CATALOG_ALIAS:
+        Area.objects.using(instance.shard).filter(pk=instance.pk).delete()
+
+
+# The ShardKey catalog routes requests by family id, Aadhar number or email, so
+# it follows saves and deletes while sharded. A stale entry left by a rename
+# only points at the right shard for a row that is no longer there.
+def member_keys(member):
+    return [(kind, key) for kind, key in ((ShardKey.AADHAR, member.aadhar_hash), (ShardKey.EMAIL, member.email)) if key]
+
+
+@receiver(post_save, sender=FamilyMember)
+def remember_member_keys(sender, instance, using, raw=False, update_fields=None, **kwargs):
+    if raw or not is_sharded() or (update_fields and not IDENTITY_FIELDS.intersection(update_fields)):
+        return
+    area_id = Family.objects.using(using).filter(pk=instance.family_id).values_list('area_id', flat=True).first()
+    if area_id is not None:
+        remember_keys(area_id, member_keys(instance))
+
+
+@receiver(post_delete, sender=FamilyMember)
+def forget_member_keys(sender, instance, **kwargs):
+    if is_sharded():
+        forget_keys(member_keys(instance))
+
+
+@receiver(post_save, sender=Family)
+def remember_family_key(sender, instance, raw=False, **kwargs):
+    if not raw and is_sharded():
+        remember_keys(instance.area_id, [(ShardKey.FAMILY_ID, instance.family_id)])
+
+
+@receiver(post_delete, sender=Family)
+def forget_family_key(sender, instance, **kwargs):
+    if is_sharded():
+        forget_keys([(ShardKey.FAMILY_ID, instance.family_id)])
+
+
+# Stock listing ETags (ration/conditional.py) change whenever an area's items do.
+# Balance changes go through ration/inventory.py, which bumps the area itself.
+@receiver([post_save, post_delete], sender=RationItem)
+def bump_item_area(sender, instance, **kwargs):
+    conditional.bump_area(instance.area_id)
+
+
+@receiver(pre_save, sender=RationItem)
+def bump_previous_item_area(sender, instance, **kwargs):
+    # An item moved to another area also disappears from the old area's listing
+    if instance.pk is None:
+        return
+    previous = RationItem.objects.filter(pk=instance.pk).values_list('area_id', flat=True).first()
+    if previous is not None and previous != instance.area_id:
+        conditional.bump_area(previous)
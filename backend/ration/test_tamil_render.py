@@ -1,7 +1,8 @@
 from django.http import HttpResponse
-from weasyprint import HTML
 
 def test_tamil_pdf_weasyprint(request):
+    from weasyprint import HTML  # heavy, and only needed by this view
+
     tamil_text = "சர்க்கரை"  # Correct Tamil word
 
     html_content = f"""
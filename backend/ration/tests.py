@@ -1,3 +1,1260 @@
-from django.test import TestCase
+import gzip
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import ProtectedError
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from . import analytics, compression, conditional, idempotency, inventory, partitions, urls, views
+from .areas import area_directory, area_pk
+from .authentication import citizen_identity_from_header
+from .chatbot import build_reply as build_chatbot_reply, match_intents
+from .forecasting import forecast
+from .identity import hash_aadhar, identity_cache, member_by_aadhar, member_by_email
+from .metrics import MetricsMiddleware
+from .models import (
+    OTP, Area, DailyAreaSales, DailyItemSales, Family, FamilyMember, Notification, Order, OrderItem, RationItem,
+    ShardKey, StockMovement,
+)
+from .profiling import ProfilingMiddleware
+from .queueing import QueueFull, allocate_ticket
+from .renderers import FastJSONRenderer
+from .routers import PIN_COOKIE, REPLICA_ALIAS, PrimaryReplicaRouter, ReplicaPinningMiddleware, read_replica
+from .sendfile import serve_media
+from .serializers import RationItemSerializer
+from .sharding import (
+    CATALOG_ALIAS, ShardRoutingMiddleware, area_shard, current_shard, fan_out, place_area, shard_for_area,
+)
 
 # Create your tests here.
+
+# The suite runs on PostgreSQL only, like the app: the migrations create
+# ArrayField columns and partitioned order tables that other databases can't
+# hold. Run it against a PostgreSQL server configured in DATABASES.
+
+# A primary/replica pair of aliases; the router only looks at the names, and
+# these tests never open a connection to either
+REPLICA_DATABASES = {
+    'default': settings.DATABASES['default'],
+    REPLICA_ALIAS: {**settings.DATABASES['default'], 'TEST': {'MIRROR': 'default'}},
+}
+
+
+@override_settings(DATABASES=REPLICA_DATABASES)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def run_view(self, view, method='get', cookies=None):
+        request = getattr(self.factory, method)('/')
+        request.COOKIES.update(cookies or {})
+        seen = {}
+
+        def wrapped(req):
+            seen['response'] = view(req)
+            return seen['response']
+
+        response = ReplicaPinningMiddleware(wrapped)(request)
+        return response, seen
+
+    def test_undecorated_view_reads_primary(self):
+        def view(request):
+            return HttpResponse(self.router.db_for_read(Order))
+
+        response, _ = self.run_view(view)
+        self.assertEqual(response.content, b'default')
+
+    def test_read_replica_view_reads_replica(self):
+        @read_replica
+        def view(request):
+            return HttpResponse(self.router.db_for_read(Order))
+
+        response, _ = self.run_view(view)
+        self.assertEqual(response.content, REPLICA_ALIAS.encode())
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_rest_of_request_to_primary(self):
+        @read_replica
+        def view(request):
+            self.router.db_for_write(Order)
+            return HttpResponse(self.router.db_for_read(Order))
+
+        response, _ = self.run_view(view)
+        self.assertEqual(response.content, b'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_unsafe_method_sets_pin_cookie(self):
+        response, _ = self.run_view(lambda request: HttpResponse('ok'), method='post')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_failed_write_does_not_pin(self):
+        response, _ = self.run_view(lambda request: HttpResponse(status=400), method='post')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_client_reads_primary(self):
+        @read_replica
+        def view(request):
+            return HttpResponse(self.router.db_for_read(Order))
+
+        response, _ = self.run_view(view, cookies={PIN_COOKIE: '1'})
+        self.assertEqual(response.content, b'default')
+
+    def test_outside_request_reads_primary(self):
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+        self.assertEqual(self.router.db_for_write(Order), 'default')
+
+    def test_replica_is_never_migrated(self):
+        self.assertTrue(self.router.allow_migrate('default', 'ration'))
+        self.assertFalse(self.router.allow_migrate(REPLICA_ALIAS, 'ration'))
+
+    def test_async_stack_is_served_natively(self):
+        @read_replica
+        async def view(request):
+            self.router.db_for_write(Order)
+            return HttpResponse(self.router.db_for_read(Order))
+
+        middleware = ReplicaPinningMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(self.factory.post('/'))
+        self.assertEqual(response.content, b'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASES={'default': REPLICA_DATABASES['default']})
+    def test_no_replica_configured(self):
+        @read_replica
+        def view(request):
+            return HttpResponse(self.router.db_for_read(Order))
+
+        response, _ = self.run_view(view)
+        self.assertEqual(response.content, b'default')
+
+
+# Query budgets: every route in ration/urls.py, run against a small and a large
+# fixture. The count may not exceed the budget and must be the same at both
+# sizes, so a view that starts querying per row (N+1) fails here.
+FIXTURE_SIZES = (2, 12)
+
+GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+def image(name='item.gif'):
+    return SimpleUploadedFile(name, GIF, content_type='image/gif')
+
+
+def seed_fixtures(size):
+    """One area with `size` families of `size` members, `size` items and `size` orders per family."""
+    area = Area.objects.create(name='Budget Area')
+    admin = get_user_model().objects.create_user('budget-admin', password='secret', is_staff=True)
+    families = Family.objects.bulk_create([Family(family_id=f'BF-{n:03d}', area=area) for n in range(size)])
+    members = []
+    for family in families:
+        for _ in range(size):
+            aadhar = f'9{len(members):011d}'
+            members.append(FamilyMember(
+                family=family, name=f'Member {len(members)}', aadhar_number=aadhar,
+                aadhar_hash=hash_aadhar(aadhar), email=f'm{len(members)}@budget.test',
+            ))
+    members[0].profile_image.save('me.gif', ContentFile(GIF), save=False)
+    members = FamilyMember.objects.bulk_create(members)
+    member = members[0]
+    FamilyMember.objects.filter(pk=member.pk).update(
+        otp=make_password('123456'), otp_expiry_time=timezone.now() + timedelta(minutes=5),
+    )
+
+    items = RationItem.objects.bulk_create([
+        RationItem(
+            name=f'Item {n}', price=Decimal('10.00'), area=area, total_quantity=1000,
+            limit_1_member=5, limit_2_members=5, limit_3_members=5, limit_4_members=5,
+        )
+        for n in range(size)
+    ])
+    orders = Order.objects.bulk_create([
+        Order(family=family, token_number=f'BT-{family.pk}-{n}', total_price=Decimal('20.00'),
+              otp='000000', payment_status='paid')
+        for family in families
+        for n in range(size)
+    ])
+    ticket = allocate_ticket(area.pk)
+    queued = Order.objects.create(
+        family=families[0], token_number=ticket.token_number, total_price=Decimal('20.00'), otp='654321',
+        payment_status='paid', queue_day=ticket.day, queue_number=ticket.number, pickup_slot=ticket.pickup_slot,
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, item=item, quantity=1, created_at=order.created_at,
+                  item_name=item.name, unit_price=item.price)
+        for order in orders + [queued]
+        for item in items[:2]
+    ])
+    OTP.objects.create(email=member.email, code='111111')
+    notifications = Notification.objects.bulk_create([
+        Notification(message=f'Notice {n}', area=area) for n in range(size)
+    ])
+    conditional.bump_area(area.pk)  # The area's version row exists once anything has changed
+    today = timezone.localdate()
+    analytics.rebuild(today - timedelta(days=1), today)
+
+    return SimpleNamespace(
+        admin=admin, area=area.name, family_id=families[0].family_id,
+        other_family_id=families[-1].family_id, aadhar=member.aadhar_number, email=member.email,
+        other_aadhar=members[-1].aadhar_number, item_ids=[item.pk for item in items],
+        token=queued.token_number, notification_id=notifications[0].pk,
+    )
+
+
+# route: (method, path, body, budget); path and body take the seeded fixtures.
+# Admin-only views are called as a staff user, citizen views without a token.
+QUERY_BUDGETS = {
+    '': ('get', lambda f: '/api/', None, 0),
+    'login/': ('post', lambda f: '/api/login/', lambda f: {'aadhar_number': f.aadhar}, 2),
+    'stock/': ('get', lambda f: f'/api/stock/?family_id={f.family_id}', None, 5),
+    'add-item/': ('post', lambda f: '/api/add-item/', lambda f: {
+        'name': 'New item', 'total_quantity': 50, 'price': '4.50', 'area': f.area,
+        'limit_1': 1, 'limit_2': 2, 'limit_3': 3, 'limit_4': 4, 'image': image(),
+    }, 10),
+    'admin/stock/': ('get', lambda f: '/api/admin/stock/', None, 1),
+    'admin-login/': ('post', lambda f: '/api/admin-login/', lambda f: {'username': 'budget-admin', 'password': 'secret'}, 1),
+    'add-family/': ('post', lambda f: '/api/add-family/', lambda f: {'family_id': 'BF-NEW', 'area': f.area}, 1),
+    'family-members/': ('get', lambda f: f'/api/family-members/?family_id={f.family_id}', None, 2),
+    'add-member/': ('post', lambda f: '/api/add-member/', lambda f: {
+        'family_id': f.family_id, 'name': 'New member', 'aadhar_number': '811111111111', 'email': 'new@budget.test',
+    }, 4),
+    'place_order/': ('post', lambda f: '/api/place_order/', lambda f: {
+        'family_id': f.family_id, 'items': [{'item_id': f.item_ids[0], 'quantity': 1}],
+    }, 11),
+    'update-profile-image-by-email/<str:email>/': (
+        'put', lambda f: f'/api/update-profile-image-by-email/{f.email}/', lambda f: {'profile_image': image('me.gif')}, 3,
+    ),
+    'delete-profile-image/<str:email>/': ('delete', lambda f: f'/api/delete-profile-image/{f.email}/', None, 3),
+    'notifications/<str:area>/': ('get', lambda f: f'/api/notifications/{f.area}/', None, 1),
+    'notifications/mark_read/<str:area>/': ('post', lambda f: f'/api/notifications/mark_read/{f.area}/', None, 1),
+    'notifications/delete_all/<str:area>/': ('delete', lambda f: f'/api/notifications/delete_all/{f.area}/', None, 3),
+    'notifications/<int:notification_id>/dismiss/': (
+        'post', lambda f: f'/api/notifications/{f.notification_id}/dismiss/?area={f.area}', None, 2,
+    ),
+    'download_invoice/<str:email>': ('get', lambda f: f'/api/download_invoice/{f.email}', None, 3),
+    'admin/change-password/': ('post', lambda f: '/api/admin/change-password/', lambda f: {'username': 'budget-admin', 'password': 'changed'}, 2),
+    'validate-aadhar-email/': ('post', lambda f: '/api/validate-aadhar-email/', lambda f: {'aadhar_number': f.aadhar, 'email': f.email}, 2),
+    'send-otp/': ('post', lambda f: '/api/send-otp/', lambda f: {'aadhar_number': f.aadhar, 'email': f.email}, 3),
+    'verify-otp/': ('post', lambda f: '/api/verify-otp/', lambda f: {'aadhar_number': f.aadhar, 'otp': '123456'}, 4),
+    'api/validate-aadhar-email/': ('post', lambda f: '/api/api/validate-aadhar-email/', lambda f: {'aadhar_number': f.aadhar, 'email': f.email}, 2),
+    'api/family-members': ('get', lambda f: f'/api/api/family-members?family_id={f.family_id}', None, 2),
+    'family-members/bulk/': (
+        'get', lambda f: f'/api/family-members/bulk/?family_ids={f.family_id},{f.other_family_id}', None, 2,
+    ),
+    'api/stock/': ('get', lambda f: f'/api/api/stock/?family_id={f.family_id}', None, 3),
+    'api/recent-items/<str:area_name>/': ('get', lambda f: f'/api/api/recent-items/{f.area}/', None, 2),
+    'update-member/<str:aadhar_number>/': ('put', lambda f: f'/api/update-member/{f.aadhar}/', lambda f: {
+        'name': 'Renamed', 'aadhar_number': f.aadhar, 'email': f.email,
+    }, 4),
+    'delete-member/<str:aadhar_number>/': ('delete', lambda f: f'/api/delete-member/{f.other_aadhar}/', None, 4),
+    'api/update-family/<str:family_id>/': ('put', lambda f: f'/api/api/update-family/{f.family_id}/', lambda f: {
+        'family_id': 'BF-RENAMED', 'area': f.area,
+    }, 3),
+    'api/delete-family/<str:family_id>/': ('delete', lambda f: f'/api/api/delete-family/{f.other_family_id}/', None, 12),
+    'send_otp_email/': ('post', lambda f: '/api/send_otp_email/', lambda f: {'email': f.email}, 1),
+    'verify_otp_place_order/': ('post', lambda f: '/api/verify_otp_place_order/', lambda f: {
+        'email': f.email, 'otp': '111111', 'family_id': f.family_id,
+        'items': [{'id': item_id, 'quantity': 1} for item_id in f.item_ids[:2]],
+    }, 29),
+    'admin/view_orders/': ('get', lambda f: f'/api/admin/view_orders/?area={f.area}', None, 2),
+    'admin/dashboard/sales/': ('get', lambda f: f'/api/admin/dashboard/sales/?area={f.area}', None, 1),
+    'admin/dashboard/items/': ('get', lambda f: f'/api/admin/dashboard/items/?area={f.area}', None, 1),
+    'admin/forecast/': ('get', lambda f: f'/api/admin/forecast/?area={f.area}', None, 4),
+    'queue/<str:token_number>/': ('get', lambda f: f'/api/queue/{f.token}/', None, 4),
+    'queue/<str:token_number>/collected/': ('post', lambda f: f'/api/queue/{f.token}/collected/', None, 2),
+    'admin/orders/lookup/': ('get', lambda f: f'/api/admin/orders/lookup/?token={f.token}', None, 2),
+    'metrics/': ('get', lambda f: '/api/metrics/', None, 0),
+    'chatbot/': ('post', lambda f: '/api/chatbot/', lambda f: {'message': 'what stock is available', 'aadhar_number': f.aadhar}, 3),
+    'async/stock/': ('get', lambda f: f'/api/async/stock/?family_id={f.family_id}', None, 5),
+    'async/family-members/': ('get', lambda f: f'/api/async/family-members/?family_id={f.family_id}', None, 2),
+    'async/notifications/<str:area>/': ('get', lambda f: f'/api/async/notifications/{f.area}/', None, 1),
+    'async/send-otp/': ('post', lambda f: '/api/async/send-otp/', lambda f: {'aadhar_number': f.aadhar, 'email': f.email}, 3),
+    'async/download_invoice/<str:email>': ('get', lambda f: f'/api/async/download_invoice/{f.email}', None, 3),
+}
+
+
+class MediaTestCase(TestCase):
+    """TestCase whose uploads, invoices and profiles go to a temporary MEDIA_ROOT, removed after the class."""
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp(prefix='ration-test-media-')
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        cls.enterClassContext(override_settings(
+            MEDIA_ROOT=media_root,
+            INVOICE_DIR=os.path.join(media_root, 'invoices'),
+            PROFILE_DIR=os.path.join(media_root, 'profiles'),
+        ))
+        super().setUpClass()
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    METRICS_TOKEN='',
+    PROFILE_SAMPLE_RATE=0,
+)
+class QueryBudgetTests(MediaTestCase):
+    def count_queries(self, route, size):
+        method, path, body, _ = QUERY_BUDGETS[route]
+        with transaction.atomic():
+            fixtures = seed_fixtures(size)
+            # Start cold: cached identities and lookups would hide queries. The
+            # area directory is a whole-table copy that is always warm in a
+            # running server, so it starts warm.
+            identity_cache.clear()
+            cache.clear()
+            area_directory.reload()
+            client = APIClient()
+            client.force_authenticate(fixtures.admin)
+            kwargs = {}
+            if body is not None:
+                data = body(fixtures)
+                multipart = any(isinstance(value, SimpleUploadedFile) for value in data.values())
+                kwargs = {'data': data, 'format': 'multipart' if multipart else 'json'}
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(path(fixtures), **kwargs)
+            transaction.set_rollback(True)
+        identity_cache.clear()
+        cache.clear()
+        area_directory.clear()
+
+        # A budget only means something if the view did its real work
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        self.assertLess(response.status_code, 400, f"{route}: {response.status_code} {body[:300]!r}")
+        return len(queries), [query['sql'] for query in queries.captured_queries]
+
+    def test_every_route_has_a_budget(self):
+        routes = {str(pattern.pattern) for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)}
+        self.assertEqual(routes - set(QUERY_BUDGETS), set(), "routes without a query budget")
+        self.assertEqual(set(QUERY_BUDGETS) - routes, set(), "budgets for routes that no longer exist")
+
+    def test_query_counts(self):
+        for route, (_, _, _, budget) in QUERY_BUDGETS.items():
+            with self.subTest(route=route):
+                (small, _), (large, sql) = (self.count_queries(route, size) for size in FIXTURE_SIZES)
+                self.assertEqual(
+                    small, large,
+                    f"{route}: {small} queries with {FIXTURE_SIZES[0]} rows, {large} with {FIXTURE_SIZES[1]}",
+                )
+                self.assertLessEqual(large, budget, f"{route}: {large} queries, budget {budget}:\n" + '\n'.join(sql))
+
+
+# Area shards: two more PostgreSQL databases like the default test database,
+# created and migrated the way the test runner creates its own.
+# With sequences reset, areas 1, 2 and 3 land on shard_b, shard_c and default.
+SHARDS = ['default', 'shard_b', 'shard_c']
+
+
+@override_settings(
+    AREA_SHARDS=SHARDS,
+    AREA_SHARD_MAP={},
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class ShardingTests(TransactionTestCase):
+    reset_sequences = True
+
+    @classmethod
+    def setUpClass(cls):
+        default = connections['default'].settings_dict
+        for alias in SHARDS[1:]:
+            settings_dict = {
+                **default,
+                'TEST': {**default['TEST'], 'MIRROR': None, 'NAME': f"{default['NAME']}_{alias}"},
+            }
+            settings.DATABASES[alias] = settings_dict  # Also connections.settings: the same dict
+            old_name = settings_dict['NAME']
+            connections[alias].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            cls.addClassCleanup(cls.drop_shard, alias, old_name)
+        # Set here: the runner only creates test databases for aliases in settings
+        cls.databases = set(SHARDS)
+        super().setUpClass()
+
+    @staticmethod
+    def drop_shard(alias, old_name):
+        connections[alias].creation.destroy_test_db(old_name, verbosity=0)
+        del connections[alias]
+        del settings.DATABASES[alias]
+
+    def setUp(self):
+        identity_cache.clear()
+        area_directory.clear()
+        cache.clear()
+        self.addCleanup(identity_cache.clear)
+        self.addCleanup(area_directory.clear)
+        self.admin = get_user_model().objects.create_user('shard-admin', password='secret', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def seed_area(self, number, ordered_at):
+        area_id = area_pk(f'Area {number}', create=True)
+        with area_shard(area_id):
+            family = Family.objects.create(family_id=f'SF-{number}', area_id=area_id)
+            FamilyMember.objects.create(
+                family=family, name=f'Member {number}', aadhar_number=f'70000000000{number}',
+                email=f'm{number}@shard.test',
+            )
+            order = Order.objects.create(
+                family=family, token_number=f'{area_id}-{number}-0001', total_price=Decimal('5.00'), otp='000000',
+                payment_status='paid',
+            )
+            Order.objects.filter(pk=order.pk).update(created_at=ordered_at)
+        return area_id
+
+    def seed(self):
+        now = timezone.now()
+        return [self.seed_area(number, now - timedelta(hours=number)) for number in (1, 2, 3)]
+
+    def test_shard_map(self):
+        areas = [area_pk(f'Area {number}', create=True) for number in (1, 2, 3, 4)]
+        self.assertEqual([shard_for_area(pk) for pk in areas], ['shard_b', 'shard_c', 'default', 'shard_b'])
+        self.assertEqual(Area.objects.get(pk=2).shard, 'shard_c')
+        self.assertEqual(Area.objects.using('shard_c').get(pk=2).shard, 'shard_c')
+        self.assertIsNone(shard_for_area(99))
+        with override_settings(AREA_SHARD_MAP={5: 'default'}):
+            self.assertEqual(shard_for_area(area_pk('Area 5', create=True)), 'default')
+
+    def test_adding_a_shard_leaves_existing_areas_in_place(self):
+        areas = self.seed()
+        placed = [shard_for_area(area_id) for area_id in areas]
+        with override_settings(AREA_SHARDS=SHARDS + ['shard_d']):
+            area_directory.clear()
+            self.assertEqual([shard_for_area(area_id) for area_id in areas], placed)
+            self.assertEqual(place_area(7), 'shard_d')  # Only new areas see the extra shard
+            response = self.client.get('/api/family-members/?family_id=SF-2')
+            self.assertEqual([member['name'] for member in response.json()], ['Member 2'])
+
+    def test_rows_live_on_their_areas_shard(self):
+        areas = self.seed()
+        for area_id in areas:
+            families = fan_out(lambda alias: list(Family.objects.values_list('area_id', flat=True)))
+            self.assertEqual(
+                {alias for alias, area_ids in zip(SHARDS, families) if area_id in area_ids},
+                {shard_for_area(area_id)},
+            )
+        # The catalog has every area; each other shard only its own
+        self.assertEqual(set(Area.objects.using(CATALOG_ALIAS).values_list('pk', flat=True)), set(areas))
+        self.assertEqual(list(Area.objects.using('shard_b').values_list('name', flat=True)), ['Area 1'])
+
+    def test_requests_are_routed_to_the_areas_shard(self):
+        self.seed()
+        response = self.client.get('/api/family-members/?family_id=SF-2')
+        self.assertEqual([member['name'] for member in response.json()], ['Member 2'])
+
+        response = self.client.post('/api/login/', {'aadhar_number': '700000000001'}, format='json')
+        self.assertEqual(response.json()['area'], 'Area 1')
+
+        response = self.client.get('/api/admin/orders/lookup/?token=2-2-0001')
+        self.assertEqual([order['family_id'] for order in response.json()['orders']], ['SF-2'])
+
+        # A new area (pk 4) is created in the catalog and its family on shard_b
+        response = self.client.post('/api/add-family/', {'family_id': 'SF-4', 'area': 'Area 4'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Family.objects.using('shard_b').filter(family_id='SF-4', area_id=4).exists())
+        self.assertFalse(Family.objects.using('default').filter(family_id='SF-4').exists())
+
+    def test_admin_view_orders_merges_every_shard(self):
+        self.seed()
+        response = self.client.get('/api/admin/view_orders/')
+        self.assertEqual([order['token_number'] for order in response.json()['orders']], ['1-1-0001', '2-2-0001', '3-3-0001'])
+        self.assertEqual([order['area'] for order in response.json()['orders']], ['Area 1', 'Area 2', 'Area 3'])
+
+        response = self.client.get('/api/admin/view_orders/?area=Area 2')
+        self.assertEqual([order['token_number'] for order in response.json()['orders']], ['2-2-0001'])
+
+    def test_get_areas_lists_every_shard(self):
+        self.seed()
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, self.admin)
+        self.assertEqual(views.get_areas(request).data['areas'], ['Area 1', 'Area 2', 'Area 3'])  # Not routed
+
+    def test_catalog_routes_lookups_without_scanning_shards(self):
+        self.seed()
+        self.assertEqual(
+            ShardKey.objects.filter(kind=ShardKey.FAMILY_ID).order_by('key').values_list('key', 'area_id')[0],
+            ('SF-1', 1),
+        )
+        with CaptureQueriesContext(connections['shard_c']) as other_shard:
+            response = self.client.post('/api/login/', {'aadhar_number': '700000000001'}, format='json')
+            self.assertEqual(response.json()['area'], 'Area 1')
+            response = self.client.get('/api/family-members/?family_id=SF-1')
+            self.assertEqual([member['name'] for member in response.json()], ['Member 1'])
+        self.assertEqual(len(other_shard), 0)
+
+        with area_shard(1):
+            Family.objects.get(family_id='SF-1').delete()
+        self.assertFalse(ShardKey.objects.filter(area_id=1).exists())
+
+        ShardKey.objects.all().delete()
+        call_command('rebuild_shard_keys', stdout=StringIO())
+        self.assertEqual(ShardKey.objects.count(), 6)  # Family id, Aadhar hash and email of areas 2 and 3
+
+    def test_place_order_is_routed_by_family_id(self):
+        areas = self.seed()
+        with area_shard(areas[1]):
+            item = RationItem.objects.create(
+                name='Rice', price=Decimal('2.00'), area_id=areas[1], total_quantity=10,
+                limit_1_member=5, limit_2_members=5, limit_3_members=5, limit_4_members=5,
+            )
+        response = self.client.post('/api/place_order/', {
+            'family_id': 'SF-2', 'items': [{'item_id': item.pk, 'quantity': 2}],
+        }, format='json')
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(RationItem.objects.using('shard_c').get(pk=item.pk).total_quantity, 8)
+
+        # A numeric family id in a JSON body is routed the same way
+        with area_shard(areas[1]):
+            family = Family.objects.create(family_id='2002', area_id=areas[1])
+            FamilyMember.objects.create(family=family, name='Numeric', aadhar_number='700000000012', email='n@shard.test')
+        response = self.client.post('/api/place_order/', {
+            'family_id': 2002, 'items': [{'item_id': item.pk, 'quantity': 1}],
+        }, format='json')
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(RationItem.objects.using('shard_c').get(pk=item.pk).total_quantity, 7)
+
+    def test_admin_dashboards_merge_every_shard(self):
+        areas = self.seed()
+        for area_id in areas:
+            with area_shard(area_id):
+                item = RationItem.objects.create(
+                    name='Rice', price=Decimal('2.00'), area_id=area_id, total_quantity=10 * area_id,
+                    limit_1_member=5, limit_2_members=5, limit_3_members=5, limit_4_members=5,
+                )
+                analytics.record_order(area_id, timezone.now(), [(item.pk, 'Rice', area_id, Decimal('2.00'))])
+
+        days = self.client.get('/api/admin/dashboard/sales/').json()['days']
+        self.assertEqual([(day['orders'], day['units'], day['revenue']) for day in days], [(3, 6, 12.0)])
+        items = self.client.get('/api/admin/dashboard/items/').json()['items']
+        self.assertEqual([(item['item_name'], item['units']) for item in items], [('Rice', 6)])
+        self.assertEqual(
+            self.client.get('/api/admin/dashboard/sales/?area=Area 2').json()['days'][0]['units'], 2,
+        )
+
+        stock = self.client.get('/api/admin/stock/').json()['stock']
+        self.assertEqual(sorted((row['area'], row['total_quantity']) for row in stock), [
+            ('Area 1', 10), ('Area 2', 20), ('Area 3', 30),
+        ])
+        forecast = self.client.get('/api/admin/forecast/').json()['items']
+        self.assertEqual(sorted(row['area'] for row in forecast), ['Area 1', 'Area 2', 'Area 3'])
+
+    def test_routing_middleware_is_async_capable(self):
+        areas = self.seed()
+        seen = {}
+
+        async def view(request):
+            seen['alias'] = current_shard()
+            return HttpResponse('ok')
+
+        async def get_response(request):
+            # As Django's async handler does: view middleware runs in the request's sync thread
+            await sync_to_async(middleware.process_view)(request, view, (), {})
+            return await view(request)
+
+        middleware = ShardRoutingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        async_to_sync(middleware)(RequestFactory().get('/', {'token': f'{areas[1]}-2-0001'}))
+        self.assertEqual(seen['alias'], shard_for_area(areas[1]))
+
+
+class FamilyMemberBulkTests(TestCase):
+    def setUp(self):
+        self.area = Area.objects.create(name='Bulk Area')
+        self.client = APIClient()
+
+    def seed(self, count):
+        families = Family.objects.bulk_create([Family(family_id=f'BK-{n:03d}', area=self.area) for n in range(count)])
+        FamilyMember.objects.bulk_create([
+            FamilyMember(family=family, name=f'Member {n}', aadhar_number=f'5{n:011d}', email=f'b{n}@bulk.test')
+            for n, family in enumerate(families)
+        ])
+        return [family.family_id for family in families]
+
+    def get(self, family_ids, **params):
+        return self.client.get('/api/family-members/bulk/', {'family_ids': ','.join(family_ids), **params})
+
+    def test_cursor_walks_every_page_once(self):
+        family_ids = self.seed(5)
+        seen = []
+        response = self.get(family_ids + ['BK-MISSING'], page_size=2)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen += [family['family_id'] for family in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, family_ids)
+        self.assertEqual(response.data['results'][-1]['members'][0]['name'], 'Member 4')
+
+    def test_fields_are_an_allow_list(self):
+        family_ids = self.seed(1)
+        response = self.get(family_ids, fields='name,email')
+        self.assertEqual(response.data['results'][0]['members'], [{'name': 'Member 0', 'email': 'b0@bulk.test'}])
+
+        response = self.get(family_ids, fields='name,otp')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Unknown fields: otp')
+
+    def test_page_size_is_capped(self):
+        cap = views.FamilyCursorPagination.max_page_size
+        family_ids = [f'BK-{n:03d}' for n in range(cap + 1)]
+        Family.objects.bulk_create([Family(family_id=family_id, area=self.area) for family_id in family_ids])
+        response = self.get(family_ids, page_size=cap * 2)
+        self.assertEqual(len(response.data['results']), cap)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_family_ids_are_required(self):
+        self.assertEqual(self.client.get('/api/family-members/bulk/').status_code, 400)
+
+
+class MemberIdentityTests(TestCase):
+    def setUp(self):
+        identity_cache.clear()
+        self.addCleanup(identity_cache.clear)
+        self.family = Family.objects.create(family_id='ID-1', area=Area.objects.create(name='Identity Area'))
+        self.member = FamilyMember.objects.create(
+            family=self.family, name='First', aadhar_number='600000000001', email='First@identity.test',
+        )
+        self.client = APIClient()
+
+    def test_emails_are_unique_ignoring_case_and_spaces(self):
+        response = self.client.post('/api/add-member/', {
+            'family_id': 'ID-1', 'name': 'Second', 'aadhar_number': '600000000002', 'email': ' FIRST@identity.test',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], 'Email already registered.')
+
+        FamilyMember.objects.create(family=self.family, name='Second', aadhar_number='600000000002', email='second@identity.test')
+        response = self.client.put('/api/update-member/600000000002/', {
+            'name': 'Second', 'aadhar_number': '600000000002', 'email': 'first@identity.test',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        # Keeping your own email is not a clash
+        response = self.client.put('/api/update-member/600000000001/', {
+            'name': 'Renamed', 'aadhar_number': '600000000001', 'email': 'FIRST@identity.test',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_cached_identity_is_checked_against_the_row(self):
+        self.assertEqual(member_by_aadhar('600000000001')[1], self.member)
+        # As another process would: the row changes and this process's cache is not told
+        FamilyMember.objects.filter(pk=self.member.pk).update(
+            aadhar_number='600000000009', aadhar_hash=hash_aadhar('600000000009'), email='moved@identity.test',
+        )
+        self.assertIsNotNone(identity_cache.get((ShardKey.AADHAR, hash_aadhar('600000000001'))))
+        self.assertIsNone(member_by_aadhar('600000000001')[1])
+        self.assertIsNone(member_by_email('first@identity.test')[1])
+        self.assertEqual(member_by_aadhar('600000000009')[1], self.member)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CitizenTokenTests(MediaTestCase):
+    def setUp(self):
+        identity_cache.clear()
+        self.addCleanup(identity_cache.clear)
+        self.f = seed_fixtures(2)
+        self.client = APIClient()
+
+    def token(self):
+        response = self.client.post('/api/verify-otp/', {'aadhar_number': self.f.aadhar, 'otp': '123456'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['family_id'], response.data['family_size']), (self.f.family_id, 2))
+        return response.data['token']
+
+    def stock(self, path, token=None, **params):
+        headers = {'HTTP_AUTHORIZATION': f'Citizen {token}'} if token else {}
+        return self.client.get(path, params, **headers)
+
+    def test_verify_otp_issues_a_token_the_stock_views_accept(self):
+        token = self.token()
+        payload = citizen_identity_from_header(RequestFactory().get('/', HTTP_AUTHORIZATION=f'Citizen {token}'))
+        self.assertEqual((payload['family_id'], payload['area']), (self.f.family_id, self.f.area))
+
+        # No family_id: the family comes from the token
+        for path in ('/api/api/stock/', '/api/stock/', '/api/async/stock/'):
+            with self.subTest(path=path):
+                response = self.stock(path, token)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), self.stock(path, family_id=self.f.family_id).json())
+
+    def test_expired_or_tampered_token_is_refused(self):
+        token = self.token()
+        tampered = token[:-2] + ('AA' if token[-2:] != 'AA' else 'BB')
+        with override_settings(CITIZEN_TOKEN_MAX_AGE=-1):
+            expired = self.stock('/api/api/stock/', token)
+        for response in (expired, self.stock('/api/api/stock/', tampered), self.stock('/api/stock/', tampered)):
+            self.assertEqual(response.status_code, 403)
+        self.assertEqual(expired.data['detail'], 'Citizen token has expired.')
+
+        # Plain Django views treat a bad token as none at all
+        self.assertIsNone(citizen_identity_from_header(RequestFactory().get('/', HTTP_AUTHORIZATION=f'Citizen {tampered}')))
+        self.assertEqual(self.stock('/api/async/stock/', tampered).status_code, 400)
+
+    def test_requests_without_a_token_use_the_family_id(self):
+        self.assertIsNone(citizen_identity_from_header(RequestFactory().get('/')))
+        response = self.stock('/api/api/stock/', family_id=self.f.family_id)
+        self.assertEqual((len(response.data['stock']), response.data['family_size']), (2, 2))
+        for path in ('/api/stock/', '/api/async/stock/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.stock(path, family_id=self.f.family_id).status_code, 200)
+                self.assertEqual(self.stock(path).status_code, 400)
+                self.assertEqual(self.stock(path, family_id='BF-NONE').status_code, 404)
+
+
+class RendererTests(SimpleTestCase):
+    def test_fast_renderer_matches_drf(self):
+        data = {
+            'price': Decimal('10.50'),
+            'aware': timezone.now(),
+            'local': timezone.localtime(timezone.now(), timezone.get_fixed_timezone(330)),
+            'naive': datetime(2026, 1, 2, 3, 4, 5, 123456),
+            'date': date(2026, 1, 2),
+            'time': time(3, 4, 5, 678901),
+            'uuid': uuid.uuid4(),
+            'lazy': gettext_lazy('Hello'),
+            'separators': 'a\u2028b\u2029c',
+            'tamil': 'அரிசி',
+            7: 'int key',
+            'nested': [{'none': None, 'float': 1.5, 'bool': True}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        # Indented output (the browsable API) is left to DRF
+        context = {'indent': 2}
+        self.assertEqual(FastJSONRenderer().render(data, renderer_context=context), JSONRenderer().render(data, renderer_context=context))
+
+
+class ListingShapeTests(MediaTestCase):
+    # The listings read .values() rows; their responses must keep the keys and
+    # values the model-instance versions produced
+    def setUp(self):
+        # Area names come from the directory, which outlives other tests' rolled-back areas
+        area_directory.clear()
+        self.addCleanup(area_directory.clear)
+        self.area = Area.objects.create(name='Listing Area')
+        self.family = Family.objects.create(family_id='LS-1', area=self.area)
+        FamilyMember.objects.create(family=self.family, name='Only', aadhar_number='400000000001', email='o@listing.test')
+        self.item = RationItem.objects.create(
+            name='Rice', price=Decimal('2.50'), total_quantity=40, area=self.area, image=image(),
+            limit_1_member=3, limit_2_members=6,
+        )
+        self.notification = Notification.objects.create(message='Shop closed Friday', area=self.area)
+        self.client = APIClient()
+
+    def test_stock_listings(self):
+        item = self.item
+        self.assertEqual(self.client.get('/api/api/stock/', {'family_id': 'LS-1'}).json()['stock'], [
+            {**RationItemSerializer(item).data, 'price': '2.50', 'limit': 3},
+        ])
+        row = {
+            'id': item.pk, 'name': 'Rice', 'total_quantity': 40, 'price': 2.5, 'area': 'Listing Area', 'limit': 3,
+            'image': f'http://testserver{item.image.url}', 'created_at': item.created_at.isoformat(),
+        }
+        for path in ('/api/stock/', '/api/async/stock/'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path, {'family_id': 'LS-1'}).json()['stock'], [row])
+
+    def test_admin_and_recent_listings(self):
+        item = self.item
+        self.client.force_authenticate(get_user_model().objects.create_user('lister', password='x', is_staff=True))
+        self.assertEqual(self.client.get('/api/admin/stock/').json()['stock'], [{
+            'id': item.pk, 'item_name': 'Rice', 'total_quantity': 40, 'price': 2.5, 'area': 'Listing Area',
+            'image': f'http://testserver{item.image.url}',
+        }])
+        self.assertEqual(self.client.get('/api/api/recent-items/Listing Area/').json()['items'], [{
+            'name': 'Rice', 'price': '2.50', 'image': item.image.url,
+            'created_at': DjangoJSONEncoder().default(item.created_at),  # A plain JsonResponse
+        }])
+
+    def test_notification_listings(self):
+        notification = self.notification
+        # DRF renders the sync view's timestamp, Django's encoder the async one's
+        timestamps = {
+            '/api/notifications/Listing Area/': JSONRenderer().render(notification.timestamp).decode().strip('"'),
+            '/api/async/notifications/Listing Area/': DjangoJSONEncoder().default(notification.timestamp),
+        }
+        for path, timestamp in timestamps.items():
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).json(), [
+                    {'id': notification.pk, 'message': 'Shop closed Friday', 'timestamp': timestamp},
+                ])
+
+
+class ChatbotTests(TestCase):
+    def test_whole_words_and_inflections(self):
+        cases = {
+            'any stocks left?': {'stock'},
+            'how does ordering work': {'order'},
+            'is it priced per kg': {'price'},
+            'shop timings': {'timing'},
+            'price of oils': {'price', 'item:oil'},
+            'this is his card': set(),  # no greeting inside other words
+            'hi there': {'greeting'},
+        }
+        for message, tokens in cases.items():
+            with self.subTest(message=message):
+                self.assertEqual(match_intents(message), tokens)
+
+    def test_stock_reply_reads_the_area(self):
+        area = Area.objects.create(name='Chat Area')
+        RationItem.objects.create(name='rice', price=Decimal('3.00'), total_quantity=40, area=area)
+        RationItem.objects.create(name='sugar', price=Decimal('5.00'), total_quantity=0, area=area)
+        self.addCleanup(cache.clear)
+
+        reply = build_chatbot_reply('What stocks do you have?', area_id=area.pk)
+        self.assertIn('Rice: ₹3.00/kg, 40 kg in stock', reply)
+        self.assertNotIn('Sugar', reply)
+        self.assertEqual(
+            build_chatbot_reply('sugar price', area_id=area.pk),
+            'Sugar is available at ₹5.00/kg.\nAvailable stock: 0 kg in stock.',
+        )
+        # Cached under the area's pk, not its (spaced, user-visible) name
+        self.assertIsNotNone(cache.get(f'chatbot:stock:{area.pk}'))
+
+
+class StockExpiryTests(TestCase):
+    def test_unusable_stock_is_written_off_through_the_ledger(self):
+        area = Area.objects.create(name='Expiry Area')
+        item = RationItem.objects.create(name='dal', price=Decimal('2.00'), total_quantity=0, area=area, limit_1_member=5)
+        inventory.receive(item.pk, 3)
+
+        self.assertEqual(inventory.write_off_unusable(), 1)
+        item.refresh_from_db()
+        self.assertEqual(item.total_quantity, 0)
+        self.assertEqual(
+            list(item.movements.order_by('pk').values_list('kind', 'quantity')),
+            [(StockMovement.RECEIPT, 3), (StockMovement.EXPIRY, -3)],
+        )
+        # The item and its history stay
+        with self.assertRaises(ProtectedError):
+            item.delete()
+
+
+@override_settings(
+    DISTRIBUTION_SESSIONS=[('09:00', '10:00')], PICKUP_SLOT_MINUTES=30, SHOP_FAMILIES_PER_HOUR=4,
+    DISTRIBUTION_BOOKING_DAYS=2,
+)
+class QueueAllocationTests(TestCase):
+    # Two 30-minute slots a day, two families per slot
+    def setUp(self):
+        self.area = Area.objects.create(name='Queue Area')
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def at(self, hour, minute=0, day=None):
+        return timezone.make_aware(datetime.combine(day or self.day, time(hour, minute)))
+
+    def slots(self, count, now):
+        return [allocate_ticket(self.area.pk, now=now) for _ in range(count)]
+
+    def test_slots_fill_in_order_then_the_next_day(self):
+        tickets = self.slots(5, self.at(8))
+        self.assertEqual(
+            [ticket.pickup_slot for ticket in tickets],
+            [self.at(9), self.at(9), self.at(9, 30), self.at(9, 30), self.at(9, day=self.day + timedelta(days=1))],
+        )
+        self.assertEqual([ticket.number for ticket in tickets], [1, 2, 3, 4, 1])
+
+    def test_late_in_the_day_only_the_remaining_slot_is_filled_to_capacity(self):
+        tickets = self.slots(3, self.at(9, 15))
+        self.assertEqual(
+            [ticket.pickup_slot for ticket in tickets],
+            [self.at(9, 30), self.at(9, 30), self.at(9, day=self.day + timedelta(days=1))],
+        )
+
+    def test_full_booking_window_raises(self):
+        self.slots(8, self.at(8))
+        with self.assertRaises(QueueFull):
+            allocate_ticket(self.area.pk, now=self.at(8))
+
+    def test_token_fits_the_order_column_for_large_pks(self):
+        area = Area.objects.create(pk=2 ** 62, name='Large Area')
+        ticket = allocate_ticket(area.pk, now=self.at(8))
+        self.assertEqual(ticket.token_number, f'{2 ** 62}-{ticket.day.pk}-0001')
+        self.assertLessEqual(len(f'{2 ** 63 - 1}-{2 ** 63 - 1}-{2 ** 31}'), Order._meta.get_field('token_number').max_length)
+
+    def test_rolled_back_order_gives_the_ticket_back(self):
+        with transaction.atomic():
+            allocate_ticket(self.area.pk, now=self.at(8))
+            transaction.set_rollback(True)
+        ticket = allocate_ticket(self.area.pk, now=self.at(8))
+        self.assertEqual((ticket.number, ticket.pickup_slot), (1, self.at(9)))
+
+
+class PlaceOrderTests(MediaTestCase):
+    def setUp(self):
+        cache.clear()
+        self.f = seed_fixtures(2)
+        self.client = APIClient()
+
+    def place(self, quantity=1, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/api/verify_otp_place_order/', {
+            'email': self.f.email, 'otp': '111111', 'family_id': self.f.family_id,
+            'items': [{'id': self.f.item_ids[0], 'quantity': quantity}],
+        }, format='json', **headers)
+
+    def test_retry_with_the_same_key_replays_the_order(self):
+        first = self.place(key='retry-1')
+        second = self.place(key='retry-1')
+        self.assertTrue(first.data['success'])
+        self.assertEqual(second.data['token_number'], first.data['token_number'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.filter(token_number=first.data['token_number']).count(), 1)
+
+    def test_same_key_for_a_different_order_is_refused(self):
+        self.place(key='retry-2')
+        self.assertEqual(self.place(quantity=2, key='retry-2').status_code, 422)
+
+    def test_bad_quantities_are_rejected_before_the_otp_is_used(self):
+        for quantity in (0, -3, 'two'):
+            response = self.place(quantity=quantity)
+            self.assertEqual(response.status_code, 400, quantity)
+        self.assertFalse(OTP.objects.get(code='111111').is_verified)
+        self.assertTrue(self.place().data['success'])
+
+    def test_key_clash_raises_key_in_use_and_keeps_the_transaction(self):
+        with transaction.atomic():
+            idempotency.store('place-order:clash', 'f', 201, {'success': True})
+            with self.assertRaises(idempotency.KeyInUse):
+                idempotency.store('place-order:clash', 'f', 201, {'success': True})
+            self.assertTrue(OTP.objects.exists())
+
+
+@skipUnless(partitions.is_supported(), "Order partitioning needs PostgreSQL")
+class OrderPartitionTests(TestCase):
+    def partitions(self, table):
+        return {name for name, _ in partitions.list_partitions(table)}
+
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+            return cursor.fetchone()[0]
+
+    def test_command_creates_the_coming_months(self):
+        ahead = settings.ORDER_PARTITION_MONTHS_AHEAD + 2
+        out = StringIO()
+        call_command('order_partitions', '--ahead', str(ahead), stdout=out)
+        months = [partitions.add_months(partitions.cycle_start(), offset) for offset in range(ahead + 1)]
+        for table in partitions.PARTITIONED_TABLES:
+            with self.subTest(table=table):
+                self.assertLessEqual({partitions.partition_name(table, month) for month in months}, self.partitions(table))
+        self.assertIn(f"Created {partitions.partition_name('ration_order', months[-1])}", out.getvalue())
+
+        # Nothing left to do on a second run
+        out = StringIO()
+        call_command('order_partitions', '--ahead', str(ahead), stdout=out)
+        self.assertIn('0 created', out.getvalue())
+
+    def test_rows_in_the_default_partition_move_into_a_new_month(self):
+        month = partitions.add_months(partitions.cycle_start(), 12)  # Past every partition made so far
+        name = partitions.partition_name('ration_order', month)
+        self.assertNotIn(name, self.partitions('ration_order'))
+        family = Family.objects.create(family_id='PT-1', area=Area.objects.create(name='Partition Area'))
+        order = Order.objects.create(family=family, token_number='PT-1', total_price=Decimal('1.00'), otp='000000')
+        Order.objects.filter(pk=order.pk).update(created_at=month + timedelta(days=3))
+        self.assertEqual(self.count(partitions.default_partition('ration_order')), 1)
+
+        partitions.create_partition('ration_order', month)
+        self.assertIn(name, self.partitions('ration_order'))
+        self.assertIn(partitions.default_partition('ration_order'), self.partitions('ration_order'))
+        self.assertEqual(self.count(partitions.default_partition('ration_order')), 0)
+        self.assertEqual(self.count(name), 1)
+        self.assertEqual(Order.objects.get(pk=order.pk).token_number, 'PT-1')
+
+
+class SalesRollupTests(MediaTestCase):
+    def setUp(self):
+        cache.clear()
+        self.f = seed_fixtures(2)
+        self.client = APIClient()
+
+    def rollups(self):
+        today = timezone.localdate()
+        return (
+            sorted(DailyItemSales.objects.filter(day=today).values_list('item_id', 'item_name', 'units', 'revenue', 'orders')),
+            list(DailyAreaSales.objects.filter(day=today).values_list('units', 'revenue', 'orders')),
+        )
+
+    def test_orders_bump_the_rollups_the_rebuild_would_produce(self):
+        # Several lines, two of them for the same item: still one order each
+        response = self.client.post('/api/verify_otp_place_order/', {
+            'email': self.f.email, 'otp': '111111', 'family_id': self.f.family_id,
+            'items': [
+                {'id': self.f.item_ids[0], 'quantity': 3}, {'id': self.f.item_ids[1], 'quantity': 1},
+                {'id': self.f.item_ids[0], 'quantity': 1},
+            ],
+        }, format='json')
+        self.assertTrue(response.data['success'])
+        bumped = self.rollups()
+        today = timezone.localdate()
+        analytics.rebuild(today, today)
+        self.assertEqual(self.rollups(), bumped)
+
+    def test_rebuild_groups_a_renamed_item_into_one_row(self):
+        OrderItem.objects.filter(item_id=self.f.item_ids[0], order__token_number__startswith='BT-').update(item_name='Old name')
+        today = timezone.localdate()
+        analytics.rebuild(today, today)
+        items, _ = self.rollups()
+        self.assertEqual([row[0] for row in items], sorted(self.f.item_ids[:2]))
+        self.assertEqual(dict((row[0], row[4]) for row in items)[self.f.item_ids[0]], 5)
+
+
+class ForecastTests(TestCase):
+    def test_depletion_and_restock_from_a_steady_week(self):
+        area = Area.objects.create(name='Forecast Area')
+        rice = RationItem.objects.create(name='Rice', price=Decimal('2.00'), total_quantity=22, area=area)
+        RationItem.objects.create(name='Salt', price=Decimal('1.00'), total_quantity=5, area=area)
+        today = timezone.localdate()
+        # 4 a day for the last week; today's sales are still coming in and don't count
+        DailyItemSales.objects.bulk_create([
+            DailyItemSales(day=today - timedelta(days=n), area=area, item=rice, item_name='Rice',
+                           units=100 if n == 0 else 4, revenue=Decimal('8.00'), orders=4)
+            for n in range(8)
+        ])
+
+        rows = forecast('Forecast Area', cover_days=14, today=today)
+        self.assertEqual([row['item'] for row in rows], ['Rice', 'Salt'])
+        rice_row, salt_row = rows
+        # Days before the first sale carry no weight, so the rate is 4/day, not 4 * 7 / 28.
+        # 22 in stock lasts 5.5 days; 14 days need 56, so 34 more (no entitlements, no spread).
+        self.assertEqual(rice_row['daily_rate'], 4.0)
+        self.assertEqual(rice_row['days_to_depletion'], 5.5)
+        self.assertEqual(rice_row['depletion_date'], today + timedelta(days=5))
+        self.assertEqual(rice_row['recommended_restock'], 34)
+        # Never sold and no families entitled to it: nothing to forecast
+        self.assertEqual(
+            (salt_row['daily_rate'], salt_row['days_to_depletion'], salt_row['recommended_restock']), (0.0, None, 0),
+        )
+
+
+class CounterLookupTests(MediaTestCase):
+    def setUp(self):
+        cache.clear()
+        self.f = seed_fixtures(2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.f.admin)
+
+    def lookup(self):
+        response = self.client.get('/api/admin/orders/lookup/', {'otp': '000000', 'area': self.f.area})
+        return [order['token_number'] for order in response.data['orders']]
+
+    def test_new_order_shows_up_in_a_cached_lookup(self):
+        before = self.lookup()
+        OTP.objects.create(email=self.f.email, code='000000')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/verify_otp_place_order/', {
+                'email': self.f.email, 'otp': '000000', 'family_id': self.f.family_id,
+                'items': [{'id': self.f.item_ids[0], 'quantity': 1}],
+            }, format='json')
+        self.assertEqual(self.lookup(), [response.data['token_number']] + before)
+
+
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_sync_view_queries_are_counted(self):
+        def view(request):
+            Order.objects.count()
+            return HttpResponse('ok')
+
+        response = MetricsMiddleware(view)(self.factory.get('/'))
+        self.assertIn('"1 queries"', response['Server-Timing'])
+
+    def test_async_view_queries_are_counted(self):
+        async def view(request):
+            await Order.objects.acount()
+            await sync_to_async(Order.objects.count)()
+            return HttpResponse('ok')
+
+        middleware = MetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(self.factory.get('/'))
+        self.assertIn('"2 queries"', response['Server-Timing'])
+
+
+@override_settings(PROFILE_SAMPLE_RATE=0)
+class ProfilingMiddlewareTests(MediaTestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/profiled/', HTTP_X_PROFILE='1')
+        self.request.user = get_user_model().objects.create_user('profiler', password='secret', is_staff=True)
+
+    def report(self, response):
+        with open(os.path.join(settings.PROFILE_DIR, response['X-Profile-Id'] + '.txt'), encoding='utf-8') as report:
+            return report.read()
+
+    def test_async_view_is_profiled_with_its_sql(self):
+        async def view(request):
+            await Order.objects.acount()
+            return HttpResponse('ok')
+
+        middleware = ProfilingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(self.request)
+        self.assertIn('1 queries', self.report(response))
+
+    def test_non_admin_is_not_profiled(self):
+        self.request.user = AnonymousUser()
+
+        async def view(request):
+            return HttpResponse('ok')
+
+        response = async_to_sync(ProfilingMiddleware(view))(self.request)
+        self.assertNotIn('X-Profile-Id', response)
+
+
+class ConditionalGetTests(MediaTestCase):
+    def setUp(self):
+        cache.clear()
+        self.f = seed_fixtures(2)
+        self.client = APIClient()
+
+    def check_revalidation(self, path):
+        first = self.client.get(path, {'family_id': self.f.family_id})
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        unchanged = self.client.get(path, {'family_id': self.f.family_id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged['ETag'], etag)
+        self.assertEqual(unchanged.content, b'')
+
+        inventory.receive(self.f.item_ids[0], 5, note='Delivery')
+        changed = self.client.get(path, {'family_id': self.f.family_id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_stock_listing_revalidates(self):
+        self.check_revalidation('/api/stock/')
+
+    def test_async_stock_listing_revalidates(self):
+        self.check_revalidation('/api/async/stock/')
+
+
+class SendfileTests(SimpleTestCase):
+    def setUp(self):
+        self.media_root = self.enterContext(tempfile.TemporaryDirectory(prefix='ration-test-media-'))
+        self.enterContext(override_settings(
+            MEDIA_ROOT=self.media_root, PROFILE_DIR=os.path.join(self.media_root, 'profiles'), SENDFILE_BACKEND='',
+            SENDFILE_NGINX_LOCATIONS={self.media_root: '/protected/media/'},
+        ))
+        os.makedirs(os.path.join(self.media_root, 'profile_images'))
+        self.body = bytes(range(256)) * 4
+        with open(os.path.join(self.media_root, 'profile_images', 'me one.gif'), 'wb') as f:
+            f.write(self.body)
+
+    def get(self, range_header=None):
+        headers = {'HTTP_RANGE': range_header} if range_header else {}
+        return serve_media(RequestFactory().get('/media/', **headers), 'profile_images/me one.gif')
+
+    def test_whole_file_from_django(self):
+        response = self.get()
+        self.assertEqual((response.status_code, b''.join(response.streaming_content)), (200, self.body))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        response.close()
+
+    def test_ranges(self):
+        for range_header, start, end in (('bytes=10-19', 10, 19), ('bytes=1000-', 1000, 1023), ('bytes=-4', 1020, 1023),
+                                         ('bytes=1020-5000', 1020, 1023)):
+            with self.subTest(range=range_header):
+                response = self.get(range_header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content), self.body[start:end + 1])
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/1024')
+                self.assertEqual(response['Content-Length'], str(end - start + 1))
+
+    def test_unsatisfiable_range(self):
+        for range_header in ('bytes=2000-', 'bytes=20-10', 'bytes=-'):
+            with self.subTest(range=range_header):
+                response = self.get(range_header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_front_server_backends(self):
+        headers = {
+            'nginx': ('X-Accel-Redirect', '/protected/media/profile_images/me%20one.gif'),
+            'xsendfile': ('X-Sendfile', os.path.join(self.media_root, 'profile_images', 'me one.gif')),
+        }
+        for backend, (header, value) in headers.items():
+            with self.subTest(backend=backend), override_settings(SENDFILE_BACKEND=backend):
+                response = self.get('bytes=10-19')  # Ranges are the front server's job too
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response[header], value)
+                self.assertEqual(response.content, b'')
+                self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_profiles_and_missing_files_are_not_served(self):
+        os.makedirs(os.path.join(self.media_root, 'profiles'))
+        with open(os.path.join(self.media_root, 'profiles', 'report.txt'), 'w') as f:
+            f.write('secret')
+        request = RequestFactory().get('/media/')
+        for path in ('profiles/report.txt', 'profile_images/missing.gif'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                serve_media(request, path)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionTests(SimpleTestCase):
+    body = b'{"items": [%s]}' % b', '.join(b'{"name": "Rice", "qty": 10}' for _ in range(20))
+
+    def respond(self, accept_encoding=None, body=None, content_type='application/json'):
+        def view(request):
+            response = HttpResponse(body or self.body, content_type=content_type)
+            response['ETag'] = '"listing"'
+            return response
+
+        headers = {'HTTP_ACCEPT_ENCODING': accept_encoding} if accept_encoding is not None else {}
+        return compression.CompressionMiddleware(view)(RequestFactory().get('/', **headers))
+
+    def test_gzip_when_accepted(self):
+        response = self.respond('gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"listing"')
+
+    def test_brotli_preferred_when_installed(self):
+        response = self.respond('gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br' if compression.brotli else 'gzip')
+
+    def test_identity_without_a_supported_encoding(self):
+        for accept_encoding in (None, 'identity', 'deflate'):
+            response = self.respond(accept_encoding)
+            self.assertFalse(response.has_header('Content-Encoding'), accept_encoding)
+            self.assertEqual(response.content, self.body)
+
+    def test_small_and_binary_bodies_are_left_alone(self):
+        self.assertFalse(self.respond('gzip', body=b'{"ok": true}').has_header('Content-Encoding'))
+        self.assertFalse(self.respond('gzip', content_type='application/pdf').has_header('Content-Encoding'))
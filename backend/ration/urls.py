@@ -1,6 +1,8 @@
 from django.urls import path
 from . import views
-from .views import FamilyMemberListView,GetStockData
+from . import async_views
+from .metrics import metrics_view
+from .views import FamilyMemberListView,GetStockData,FamilyMemberBulkView
 from .views import update_member,delete_family, update_family,download_invoice
 from .views import send_otp_email, verify_otp_place_order,admin_view_orders,upload_profile_image,get_notifications,chatbot_response
 from django.http import JsonResponse
@@ -32,6 +34,7 @@ path("download_invoice/<str:email>", download_invoice),
     path('verify-otp/', views.verify_otp, name='verify-otp'),
     path('api/validate-aadhar-email/', views.validate_aadhar_email, name='validate_aadhar_email'),
     path('api/family-members', FamilyMemberListView.as_view(), name='family_member_list'),
+    path('family-members/bulk/', FamilyMemberBulkView.as_view(), name='family-members-bulk'),
     path('api/stock/', GetStockData.as_view(), name='get-stock-data'),
     path('api/recent-items/<str:area_name>/', views.get_recent_items_by_area),
     path('update-member/<str:aadhar_number>/', views.update_member, name='update-member'),
@@ -41,8 +44,22 @@ path("download_invoice/<str:email>", download_invoice),
     path('send_otp_email/', views.send_otp_email, name='send_otp_email'),
     path('verify_otp_place_order/', views.verify_otp_place_order, name='verify_otp_place_order'),
     path('admin/view_orders/', admin_view_orders, name='admin-view-orders'),
+    path('admin/dashboard/sales/', views.sales_dashboard, name='sales-dashboard'),
+    path('admin/dashboard/items/', views.item_sales_dashboard, name='item-sales-dashboard'),
+    path('admin/forecast/', views.stock_forecast, name='stock-forecast'),
+    path('queue/<str:token_number>/', views.queue_position, name='queue-position'),
+    path('queue/<str:token_number>/collected/', views.mark_order_collected, name='queue-mark-collected'),
+    path('admin/orders/lookup/', views.admin_view_orders_by_otp_and_area, name='counter-order-lookup'),
+    path('metrics/', metrics_view, name='metrics'),
     path('chatbot/', chatbot_response),
 
+    # Async variants for ASGI deployments (see ration/async_views.py)
+    path('async/stock/', async_views.view_stock, name='async-view-stock'),
+    path('async/family-members/', async_views.get_family_members, name='async-family-members'),
+    path('async/notifications/<str:area>/', async_views.get_notifications, name='async-notifications'),
+    path('async/send-otp/', async_views.send_otp, name='async-send-otp'),
+    path('async/download_invoice/<str:email>', async_views.download_invoice, name='async-download-invoice'),
+
 ]
 
 
@@ -2,6 +2,7 @@ import random
 import string
 import logging
 import json
+import heapq
 from datetime import timedelta
 from io import BytesIO
 
@@ -9,7 +10,7 @@ from django.conf import settings
 from django.core.mail import send_mail
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.hashers import check_password, make_password
-from django.db import transaction
+from django.db import router, transaction
 from django.shortcuts import get_object_or_404, render
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
@@ -21,9 +22,6 @@ from rest_framework.views import APIView
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-
 from .models import (
     Family,
     FamilyMember,
@@ -36,6 +34,24 @@ from .serializers import (
     FamilyMemberSerializer,
     RationItemSerializer,
 )
+from .identity import (
+    email_in_use,
+    lookup_by_email,
+    member_by_aadhar,
+    member_by_aadhar_and_email,
+    member_by_email,
+    hash_aadhar,
+)
+from .authentication import citizen_identity, issue_citizen_token
+from .areas import area_name, area_names, area_pk
+from . import inventory
+from .queueing import QueueFull, allocate_ticket
+from . import idempotency
+from . import analytics
+from . import conditional
+from .routers import read_replica
+from .sharding import area_shard, fan_out, shard_for_area
+from .partitions import add_months, cycle_start
 
 
 User = get_user_model()
@@ -53,13 +69,13 @@ def login_with_aadhar(request):
     if not aadhar_number:
         return Response({"error": "No Aadhar number provided"}, status=400)
 
-    member = FamilyMember.objects.filter(aadhar_number=aadhar_number.strip()).first()
+    identity, member = member_by_aadhar(aadhar_number, 'name')
     if member:
         return Response({
             "message": "Login successful",
             "name": member.name,
-            "family_id": member.family.family_id,
-            "area": member.family.area
+            "family_id": identity.family_id,
+            "area": identity.area
         })
     else:
         return Response({"error": "Aadhar not registered"}, status=400)
@@ -127,33 +143,43 @@ def place_order(request):
     if not family_id or not items:
         return Response({"success": False, "error": "Missing family_id or items"}, status=400)
 
+    # The family's family_id, not its pk: pks repeat across shards and the
+    # request is routed to the family's shard by family_id
     try:
-        family = Family.objects.get(id=family_id)
+        family = Family.objects.get(family_id=str(family_id))
     except Family.DoesNotExist:
         return Response({"success": False, "error": "Invalid family_id"}, status=400)
 
-    with transaction.atomic():
-        order = Order.objects.create(family=family)
-
-        for item in items:
-            item_id = item.get('item_id')
-            quantity = item.get('quantity', 0)
+    # All requested items in one query instead of one per line
+    ration_items = RationItem.objects.in_bulk([item.get('item_id') for item in items if item.get('item_id')])
+    order_items = []
+    for item in items:
+        ration_item = ration_items.get(item.get('item_id'))
+        quantity = item.get('quantity', 0)
+        if ration_item is None or quantity <= 0:
+            continue
+        order_items.append((ration_item, quantity))
 
-            if not item_id or quantity <= 0:
-                continue
+    with transaction.atomic(using=router.db_for_write(Order)):
+        order = Order.objects.create(
+            family=family,
+            total_price=sum((ration_item.price * quantity for ration_item, quantity in order_items), Decimal('0.00')),
+        )
 
+        for ration_item, quantity in order_items:
             try:
-                ration_item = RationItem.objects.select_for_update().get(id=item_id)
-            except RationItem.DoesNotExist:
-                continue
-
-            if ration_item.total_quantity < quantity:
+                inventory.sell(ration_item.id, quantity, order=order)
+            except inventory.InsufficientStock:
                 transaction.set_rollback(True)
                 return Response({"success": False, "error": f"Not enough stock for {ration_item.name}"}, status=400)
 
-            OrderItem.objects.create(order=order, ration_item=ration_item, quantity=quantity)
-            ration_item.total_quantity -= quantity
-            ration_item.save()
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, item=ration_item, quantity=quantity, created_at=order.created_at,
+                item_name=ration_item.name, unit_price=ration_item.price,
+            )
+            for ration_item, quantity in order_items
+        ])
 
     return Response({"success": True, "order_id": order.id})
 
@@ -186,24 +212,30 @@ def add_item(request):
         # Handle image file and create a new RationItem object
         image = request.FILES.get('image')
 
-        ration_item = RationItem.objects.create(
-            name=name,
-            total_quantity=total_quantity,
-            price=price,
-            area=area,
-            image=image,
-            limit_1_member=limit_1,
-            limit_2_members=limit_2,
-            limit_3_members=limit_3,
-            limit_4_members=limit_4
-        )
-
-        # ✅ Create Notification for this area
-        from .models import Notification
-        Notification.objects.create(
-            message=f"🛒 New stock for {name} is available in your area!",
-            area=area
-        )
+        area_id = area_pk(area, create=True)
+        # A new area has no shard pinned for this request yet
+        with area_shard(area_id):
+            with transaction.atomic(using=router.db_for_write(RationItem)):
+                ration_item = RationItem.objects.create(
+                    name=name,
+                    total_quantity=0,
+                    price=price,
+                    area_id=area_id,
+                    image=image,
+                    limit_1_member=limit_1,
+                    limit_2_members=limit_2,
+                    limit_3_members=limit_3,
+                    limit_4_members=limit_4
+                )
+                # Opening stock goes through the ledger so the balance and movements agree
+                inventory.receive(ration_item.id, total_quantity, note='Initial stock')
+
+            # ✅ Create Notification for this area
+            from .models import Notification
+            Notification.objects.create(
+                message=f"🛒 New stock for {name} is available in your area!",
+                area_id=area_id
+            )
 
         # Return response
         return Response({
@@ -215,22 +247,31 @@ def add_item(request):
  
 # 7. Admin Stock View
 @api_view(['GET'])
+@read_replica
 def admin_stock_view(request):
-    # Assuming you are using a similar setup for your stock view
-    items = RationItem.objects.filter(total_quantity__gt=0)  # Fetch items that have stock available
-    
+    # Plain rows, not model instances: only the listed columns are fetched.
+    # Every area: one query per shard in parallel
+    items = [
+        item
+        for rows in fan_out(lambda alias: list(RationItem.objects.filter(total_quantity__gt=0).values(
+            'id', 'name', 'total_quantity', 'price', 'area', 'image',
+        )))
+        for item in rows
+    ]
+
+    image_url = item_image_urls(request)
     stock = [
         {
-            "id": item.id,
-            "item_name": item.name,
-            "total_quantity": item.total_quantity,  # Use total_quantity instead of quantity
-            "price": item.price,
-            "area": item.area,
-            "image": request.build_absolute_uri(item.image.url) if item.image else None,
+            "id": item['id'],
+            "item_name": item['name'],
+            "total_quantity": item['total_quantity'],  # Use total_quantity instead of quantity
+            "price": item['price'],
+            "area": area_name(item['area']),
+            "image": image_url(item['image']),
         }
         for item in items
     ]
-    
+
     return Response({"stock": stock})
 
 
@@ -271,7 +312,9 @@ def add_family(request):
     if not family_id or not area:
         return Response({'message': 'Family ID and Area are required.'}, status=400)
 
-    Family.objects.create(family_id=family_id, area=area)
+    area_id = area_pk(area, create=True)
+    with area_shard(area_id):
+        Family.objects.create(family_id=family_id, area_id=area_id)
     return Response({'message': 'Family added successfully.'})
 
 # 11. Add Member to Family
@@ -290,9 +333,12 @@ def add_member(request):
     except Family.DoesNotExist:
         return Response({'message': 'Family ID not found.'}, status=404)
 
-    if FamilyMember.objects.filter(aadhar_number=aadhar_number).exists():
+    if FamilyMember.objects.filter(aadhar_hash=hash_aadhar(aadhar_number)).exists():
         return Response({'message': 'Aadhar number already registered.'}, status=400)
 
+    if email_in_use(email):
+        return Response({'message': 'Email already registered.'}, status=400)
+
     FamilyMember.objects.create(
         family=family,
         name=name,
@@ -347,16 +393,15 @@ def validate_aadhar_email(request):
         return Response({'success': False, 'error': 'Aadhar number and email are required.'}, status=400)
 
     # Logic to validate Aadhar and Email, e.g., querying the database:
-    try:
-        member = FamilyMember.objects.get(aadhar_number=aadhar_number, email=email)
-        return Response({
-            'success': True,
-            'message': 'Aadhar and email validated successfully.',
-            'member_name': member.name,
-            'family_id': member.family.family_id,
-        })
-    except FamilyMember.DoesNotExist:
+    identity, member = member_by_aadhar_and_email(aadhar_number, email)
+    if member is None:
         return Response({'success': False, 'error': 'No member found with this Aadhar and email.'}, status=404)
+    return Response({
+        'success': True,
+        'message': 'Aadhar and email validated successfully.',
+        'member_name': member.name,
+        'family_id': identity.family_id,
+    })
 
 
     
@@ -370,10 +415,9 @@ def verify_otp(request):
     if not aadhar_number or not otp_input:
         return Response({'error': 'Aadhar number and OTP are required.'}, status=400)
 
-    try:
-        # Retrieve member by aadhar_number
-        member = FamilyMember.objects.get(aadhar_number=aadhar_number)
-    except FamilyMember.DoesNotExist:
+    # Retrieve member by hashed Aadhar (cached identity, primary-key row fetch)
+    identity, member = member_by_aadhar(aadhar_number)
+    if member is None:
         return Response({'error': 'Invalid Aadhar number.'}, status=404)
 
     # Ensure otp_expiry_time is timezone-aware
@@ -389,14 +433,19 @@ def verify_otp(request):
         # Clear OTP after verification
         member.otp = ''  
         member.otp_expiry_time = None  # Clear expiry time after OTP verification
-        member.save()
+        member.save(update_fields=['otp', 'otp_expiry_time'])
+
+        # Signed session token so later requests don't re-resolve the family
+        family_size = max(1, min(FamilyMember.objects.filter(family_id=identity.family_pk).count(), 4))
 
         return Response({
             'message': 'OTP verified successfully.',
             'name': member.name,
-            'family_id': member.family.family_id,
-            'area': member.family.area,
+            'family_id': identity.family_id,
+            'area': identity.area,
             'email': member.email,
+            'family_size': family_size,
+            'token': issue_citizen_token(identity, member.name, family_size),
         })
     else:
         return Response({'error': 'Invalid OTP.'}, status=400)
@@ -414,9 +463,8 @@ def send_otp(request):
     if not aadhar_number or not email:
         return Response({'error': 'Aadhar number and email are required.'}, status=400)
 
-    try:
-        family_member = FamilyMember.objects.get(aadhar_number=aadhar_number, email=email)
-    except FamilyMember.DoesNotExist:
+    _, family_member = member_by_aadhar_and_email(aadhar_number, email)
+    if family_member is None:
         return Response({'error': 'Family member not found.'}, status=404)
 
     otp_plain = generate_otp()
@@ -425,7 +473,7 @@ def send_otp(request):
 
     family_member.otp = hashed_otp
     family_member.otp_expiry_time = expiry_time
-    family_member.save()
+    family_member.save(update_fields=['otp', 'otp_expiry_time'])
 
     try:
         send_mail(
@@ -446,66 +494,130 @@ from .serializers import FamilyMemberSerializer
 # 15. Get Stock Data
 class GetStockData(APIView):
     def get(self, request):
-        family_id = request.query_params.get('family_id')
-
-        try:
-            family = Family.objects.get(family_id=family_id)
-        except Family.DoesNotExist:
-            return Response({'error': 'Family not found'}, status=404)
-
-        # Get family size (number of members)
-        family_size = family.members.count()
-        family_size = min(family_size, 4)  # Cap at 4
-
-        # Get all ration items for the family's area
-        ration_items = RationItem.objects.filter(area=family.area)
+        citizen = citizen_identity(request)
+        if citizen:
+            family_size = citizen['family_size']
+            area_id = citizen['area_id']
+        else:
+            family_id = request.query_params.get('family_id')
+
+            # Family and its size (number of members) in one query
+            family = (
+                Family.objects.filter(family_id=family_id)
+                .annotate(family_size=Count('members'))
+                .values_list('area_id', 'family_size')
+                .first()
+            )
+            if family is None:
+                return Response({'error': 'Family not found'}, status=404)
+
+            area_id, family_size = family
+            family_size = min(family_size, 4)  # Cap at 4
+
+        etag, last_modified = conditional.validators('stock-data', area_id, family_size)
+        unchanged = conditional.not_modified(request, etag, last_modified)
+        if unchanged:
+            return unchanged
+
+        # Get all ration items for the family's area, as RationItemSerializer fields
+        fields = RationItemSerializer.Meta.fields
+        ration_items = RationItem.objects.filter(area_id=area_id).values(*fields)
+        # Determine correct limit field
+        limit_field = stock_limit_field(family_size) if family_size >= 1 else None
 
         data = []
         for item in ration_items:
-            item_data = RationItemSerializer(item).data
-            # Determine correct limit field
-            limit_field = f"limit_{family_size}_member" if family_size == 1 else f"limit_{family_size}_members"
-            item_data['limit'] = getattr(item, limit_field, 0)
+            item_data = {field: item[field] for field in fields}
+            item_data['price'] = str(item['price'])  # DecimalField renders as a string
+            item_data['area'] = area_name(item['area'])
+            item_data['limit'] = item[limit_field] if limit_field else 0
             data.append(item_data)
 
-        return Response({
+        return conditional.with_validators(Response({
             'stock': data,
             'family_size': family_size
-        })
+        }), etag, last_modified)
     
 
-# 16. Admin View Orders by OTP and Area
-@api_view(['GET'])
-def admin_view_orders_by_otp_and_area(request):
-    otp = request.GET.get('otp')
-    area = request.GET.get('area')
+# 16. Admin View Orders by OTP and Area (shop counter lookup, also by token number)
+import hashlib
+from django.core.cache import cache
+from django.db.models import Prefetch
+from rest_framework.decorators import permission_classes
+from rest_framework.permissions import IsAdminUser
+
+COUNTER_LOOKUP_CACHE_TTL = getattr(settings, 'COUNTER_LOOKUP_CACHE_TTL', 60)
 
-    if not otp or not area:
-        return Response({'error': 'OTP and area are required'}, status=400)
 
-    orders = Order.objects.filter(otp=otp, family__area=area, is_paid=True)
+def counter_lookup_key(*parts):
+    # Scoped to today's distribution day so a reused OTP never serves an old order
+    digest = hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+    return f"counter-lookup:{timezone.localdate().isoformat()}:{digest}"
 
-    if not orders.exists():
-        return Response({'message': 'No orders found for this OTP and area'}, status=404)
 
-    data = []
-    for order in orders:
-        items = OrderItem.objects.filter(order=order)
-        item_list = [{
-            'name': item.item.name,
+def forget_counter_lookup(token_number, otp, area):
+    cache.delete_many([counter_lookup_key('token', token_number), counter_lookup_key('otp', area, otp)])
+
+
+def counter_orders(otp=None, area=None, token_number=None):
+    """Paid orders a counter can hand out today, with their lines, in two queries."""
+    # Orders are booked at most DISTRIBUTION_BOOKING_DAYS ahead, which also keeps
+    # the scan on the latest order partitions
+    booking_days = getattr(settings, 'DISTRIBUTION_BOOKING_DAYS', 7)
+    since = timezone.now() - timedelta(days=booking_days + 1)
+    orders = Order.objects.filter(payment_status='paid', created_at__gte=since)
+    if token_number:
+        orders = orders.filter(token_number=token_number)
+    else:
+        orders = orders.filter(otp=otp, family__area_id=area_pk(area))
+    orders = (
+        orders.select_related('family')
+        .only('id', 'token_number', 'total_price', 'otp', 'queue_number', 'pickup_slot', 'collected_at',
+              'family__family_id')
+        .prefetch_related(Prefetch(
+            'order_items', queryset=OrderItem.objects.only('order_id', 'item_name', 'quantity', 'unit_price'),
+        ))
+        .order_by('-created_at')
+    )
+    return [{
+        'order_id': order.id,
+        'family_id': order.family.family_id,
+        'token_number': order.token_number,
+        'total_price': order.total_price,
+        'otp': order.otp,
+        'queue_number': order.queue_number,
+        'pickup_slot': order.pickup_slot,
+        'collected_at': order.collected_at,
+        'items': [{
+            'name': item.item_name,
             'quantity': item.quantity,
-            'price': item.item.price,
-            'total_price': item.quantity * item.item.price
-        } for item in items]
+            'price': item.unit_price,
+            'total_price': item.line_total,
+        } for item in order.order_items.all()],
+    } for order in orders]
 
-        data.append({
-            'order_id': order.id,
-            'family_id': order.family.family_id,
-            'token_number': order.token_number,
-            'total_price': order.total_price,
-            'otp': order.otp,
-            'items': item_list,
-        })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_view_orders_by_otp_and_area(request):
+    otp = request.GET.get('otp')
+    area = request.GET.get('area')
+    token_number = request.GET.get('token')
+
+    if token_number:
+        key = counter_lookup_key('token', token_number)
+    elif otp and area:
+        key = counter_lookup_key('otp', area, otp)
+    else:
+        return Response({'error': 'OTP and area, or a token, are required'}, status=400)
+
+    data = cache.get(key)
+    if data is None:
+        data = counter_orders(otp=otp, area=area, token_number=token_number)
+        if not data:
+            # Not cached: the family may be placing the order right now
+            return Response({'message': 'No orders found for this OTP and area'}, status=404)
+        cache.set(key, data, COUNTER_LOOKUP_CACHE_TTL)
 
     return Response({'orders': data}, status=200)
 
@@ -540,183 +652,93 @@ def send_otp_email(request):
         return Response({'success': False, 'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-# 19. Generate PDF Bill
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase import pdfmetrics
-from io import BytesIO
+# 19. Generate PDF Bill (ReportLab lives in ration/invoices.py, imported on first use)
+# Each order's invoice is rendered once into INVOICE_DIR and then handed to the
+# front server by ration/sendfile.py instead of being streamed by a worker.
 from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
-from .models import FamilyMember, Order, OrderItem
-from django.conf import settings
 from django.utils import translation
+import hashlib
 import os
 import time
+from .sendfile import sendfile
 
-def download_invoice(request, email):
-    lang = request.GET.get('lang', 'en')
-    translation.activate(lang)
-
-    # Register Tamil font if Tamil language selected
-    if lang == 'ta':
-        tamil_font_path = os.path.join(settings.BASE_DIR, 'static', 'fonts', 'NotoSansTamil-Regular.ttf')
-        pdfmetrics.registerFont(TTFont('Tamil', tamil_font_path))
-        selected_font = 'Tamil'
-
-        # Tamil static labels
-        shop_name = "என் அன்னாச்சியின் கடை"
-        invoice_title = "பில்"
-        family_id_label = "குடும்ப ஐடி"
-        order_token_label = "ஆர்டர் குறியீடு"
-        order_date_label = "ஆர்டர் தேதி"
-        item_label = "பொருள்"
-        quantity_label = "அளவு"
-        price_label = "விலை (₹)"
-        total_label = "மொத்தம் (₹)"
-        total_price_label = "மொத்த விலை:"
-        thank_you_msg = "உங்கள் வாங்குதலுக்கு நன்றி!"
-
-        # Tamil translation map for item names
-        tamil_name_map = {
-            "Rice": "அரிசி",
-            "Wheat": "கோதுமை",
-            "Sugar": "சர்க்கரை",
-            "Oil": "எண்ணெய்",
-            # Add more item translations here
-        }
-    else:
-        selected_font = 'Helvetica-Bold'
-
-        # English static labels
-        shop_name = "My Ration Shop"
-        invoice_title = "INVOICE"
-        family_id_label = "Family ID"
-        order_token_label = "Order Token"
-        order_date_label = "Order Date"
-        item_label = "Item"
-        quantity_label = "Quantity"
-        price_label = "Price (₹)"
-        total_label = "Total (₹)"
-        total_price_label = "Total Price:"
-        thank_you_msg = "Thank you for your purchase!"
-
-        tamil_name_map = {}
-
-    family_member = get_object_or_404(FamilyMember, email=email)
-    family = family_member.family
-    order = Order.objects.filter(family=family).order_by('-created_at').first()
-
-    if not order:
-        return HttpResponse("No order found.", status=404)
-
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4,
-                            rightMargin=30, leftMargin=30,
-                            topMargin=30, bottomMargin=18)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    style_title = ParagraphStyle(name='Title', parent=styles['Title'],
-                                 fontName=selected_font, alignment=1, fontSize=18)
+def latest_order_for_email(email):
+    identity = lookup_by_email(email)
+    if identity is None:
+        return None, None
+    return identity, Order.objects.filter(family_id=identity.family_pk).order_by('-created_at').first()
 
-    style_heading = ParagraphStyle(name='Heading2', parent=styles['Heading2'],
-                                   fontName=selected_font, fontSize=14)
 
-    style_normal = ParagraphStyle(name='NormalCustom', parent=styles['Normal'],
-                                  fontName=selected_font, fontSize=11)
+def invoice_path(lang, family_id, order):
+    """Where the rendered invoice for this order and language is kept. The name
+    covers everything printed on it besides the snapshot lines, which never change."""
+    key = f"{family_id}|{order.token_number}|{order.created_at.isoformat()}"
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return os.path.join(settings.INVOICE_DIR, f"{order.pk}-{lang}-{digest}.pdf")
 
-    style_bold_center = ParagraphStyle(name='BoldCenter', parent=styles['Normal'],
-                                       fontName=selected_font, alignment=1, fontSize=14)
 
-    style_footer = ParagraphStyle(name='Footer', parent=styles['Normal'],
-                                  fontName=selected_font, alignment=1, fontSize=10, textColor=colors.grey)
+def save_invoice(path, pdf):
+    # Write beside the target and rename, so a concurrent download never sees half a file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
 
-    # Add logo if exists
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png')
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=30*mm, height=30*mm)
-        elements.append(logo)
 
-    elements.append(Paragraph(shop_name, style_bold_center))
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph(invoice_title, style_title))
-    elements.append(Spacer(1, 12))
-
-    elements.append(Paragraph(f"{family_id_label}: {family.family_id}", style_normal))
-    elements.append(Paragraph(f"{order_token_label}: {order.token_number}", style_normal))
-    elements.append(Paragraph(f"{order_date_label}: {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}", style_normal))
-    elements.append(Spacer(1, 12))
+def invoice_response(request, path):
+    timestamp = int(time.time())
+    filename = f"invoice_{timestamp}.pdf"
 
-    # Table header
-    data = [[item_label, quantity_label, price_label, total_label]]
+    return sendfile(request, path, content_type='application/pdf', attachment_name=filename)
 
-    total_price = 0
-    order_items = OrderItem.objects.filter(order=order)
 
-    for item in order_items:
-        if lang == 'ta':
-            name = tamil_name_map.get(item.item.name, item.item.name)  # Translate or fallback
-        else:
-            name = item.item.name
-        qty = item.quantity
-        price = float(item.item.price)
-        line_total = qty * price
-        total_price += line_total
-        data.append([name, str(qty), f"{price:.2f}", f"{line_total:.2f}"])
-
-    data.append(['', '', '', ''])
-    data.append(["", "", total_price_label, f"₹{total_price:.2f}"])
-
-    table = Table(data, colWidths=[200, 60, 80, 80], hAlign='LEFT')
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#003366')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, 0), (-1, -1), selected_font),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -3), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (2, -1), (-1, -1), selected_font),
-        ('BACKGROUND', (2, -1), (-1, -1), colors.HexColor('#e0e0e0')),
-        ('ALIGN', (2, -1), (-1, -1), 'RIGHT'),
-    ]))
-
-    elements.append(table)
-    elements.append(Spacer(1, 24))
-    elements.append(Paragraph(thank_you_msg, style_footer))
-
-    doc.build(elements)
-
-    buffer.seek(0)
+@read_replica
+def download_invoice(request, email):
+    lang = 'ta' if request.GET.get('lang') == 'ta' else 'en'
+    translation.activate(lang)
 
-    timestamp = int(time.time())
-    filename = f"invoice_{timestamp}.pdf"
+    identity, order = latest_order_for_email(email)
+    if identity is None:
+        return HttpResponse("Family member not found.", status=404)
+    if not order:
+        return HttpResponse("No order found.", status=404)
 
-    return HttpResponse(buffer, content_type='application/pdf', headers={
-        'Content-Disposition': f'attachment; filename="{filename}"',
-    })
+    path = invoice_path(lang, identity.family_id, order)
+    if not os.path.exists(path):
+        from .invoices import invoice_lines, render_invoice_pdf
+        save_invoice(path, render_invoice_pdf(lang, identity.family_id, order, invoice_lines(order)))
+    return invoice_response(request, path)
 
 
 
 
 # 20. Get Recent Items by Area
+@read_replica
 def get_recent_items_by_area(request, area_name):
-    recent_time = timezone.now() - timedelta(days=2)  # last 2 days
-    items = RationItem.objects.filter(area=area_name, created_at__gte=recent_time)
+    # last 2 days, from the start of the hour so the listing (and its ETag) only
+    # changes when the area's items do or the hour rolls over
+    recent_time = (timezone.now() - timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+    area_id = area_pk(area_name)
+    etag, last_modified = conditional.validators('recent', area_id, recent_time.isoformat())
+    unchanged = conditional.not_modified(request, etag, last_modified)
+    if unchanged:
+        return unchanged
+
+    items = RationItem.objects.filter(area_id=area_id, created_at__gte=recent_time).values(
+        'name', 'price', 'image', 'created_at',
+    )
+    image_url = item_image_urls()
     data = [
         {
-            'name': item.name,
-            'price': str(item.price),
-            'image': item.image.url if item.image else '',
-            'created_at': item.created_at,
+            'name': item['name'],
+            'price': str(item['price']),
+            'image': image_url(item['image']) or '',
+            'created_at': item['created_at'],
         }
         for item in items
     ]
-    return JsonResponse({'items': data})
+    return conditional.with_validators(JsonResponse({'items': data}), etag, last_modified)
 
 
 # 21. Family Member List View
@@ -736,6 +758,74 @@ class FamilyMemberListView(APIView):
         return Response(serializer.data)
 
 
+# 21a. Bulk Family Members (many families in one call)
+from django.db.models import Prefetch
+from rest_framework.pagination import CursorPagination
+
+
+class FamilyCursorPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class FamilyMemberBulkView(APIView):
+    member_fields = ('name', 'aadhar_number', 'email', 'profile_image')
+
+    def get(self, request):
+        # Accept ?family_ids=F1,F2,F3 and/or repeated ?family_id=F1&family_id=F2
+        family_ids = [
+            fid.strip()
+            for value in request.query_params.getlist('family_ids') + request.query_params.getlist('family_id')
+            for fid in value.split(',')
+            if fid.strip()
+        ]
+        if not family_ids:
+            return Response({"error": "family_ids is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        fields_param = request.query_params.get('fields')
+        if fields_param:
+            fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+            unknown = [f for f in fields if f not in self.member_fields]
+            if unknown:
+                return Response({"error": f"Unknown fields: {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            fields = list(self.member_fields)
+
+        # One query for the families page, one for all of their members
+        members_qs = FamilyMember.objects.only('id', 'family_id', *fields).order_by('id')
+        families = (
+            Family.objects.filter(family_id__in=set(family_ids))
+            .only('id', 'family_id', 'area_id')
+            .prefetch_related(Prefetch('members', queryset=members_qs))
+        )
+
+        paginator = FamilyCursorPagination()
+        page = paginator.paginate_queryset(families, request, view=self)
+
+        data = []
+        for family in page:
+            members = []
+            for member in family.members.all():
+                row = {}
+                for field in fields:
+                    if field == 'profile_image':
+                        row[field] = request.build_absolute_uri(member.profile_image.url) if member.profile_image else None
+                    elif field == 'email':
+                        row[field] = member.email or 'N/A'
+                    else:
+                        row[field] = getattr(member, field)
+                members.append(row)
+            data.append({
+                'family_id': family.family_id,
+                'area': area_name(family.area_id),
+                'members': members,
+            })
+
+        return paginator.get_paginated_response(data)
+
+
 # 22. Update Family
 
 @api_view(['PUT'])
@@ -755,20 +845,24 @@ def update_family(request, family_id):
     if new_family_id != family_id and Family.objects.filter(family_id=new_family_id).exists():
         return Response({'error': 'New family_id already exists'}, status=status.HTTP_400_BAD_REQUEST)
 
+    area_id = area_pk(area, create=True)
+    if shard_for_area(area_id) != shard_for_area(family.area_id):
+        # Its members, orders and ledger would have to move databases with it
+        return Response({'error': 'Cannot move a family to an area on another shard'}, status=status.HTTP_400_BAD_REQUEST)
+
     family.family_id = new_family_id
-    family.area = area
+    family.area_id = area_id
     family.save()
 
-    return Response({'family_id': family.family_id, 'area': family.area})
+    return Response({'family_id': family.family_id, 'area': area})
 # 23. Delete Family Member and Family
 @api_view(['DELETE'])
 def delete_member(request, aadhar_number):
-    try:
-        member = FamilyMember.objects.get(aadhar_number=aadhar_number)
-        member.delete()
-        return Response({'message': 'Member deleted successfully.'})
-    except FamilyMember.DoesNotExist:
+    _, member = member_by_aadhar(aadhar_number)
+    if member is None:
         return Response({'message': 'Member not found.'}, status=404)
+    member.delete()
+    return Response({'message': 'Member deleted successfully.'})
     
 # 24. Delete Family
 @api_view(['DELETE'])
@@ -789,9 +883,8 @@ from .models import FamilyMember
 # 25. Update Family Member
 @api_view(['PUT'])
 def update_member(request, aadhar_number):
-    try:
-        member = FamilyMember.objects.get(aadhar_number=aadhar_number)
-    except FamilyMember.DoesNotExist:
+    _, member = member_by_aadhar(aadhar_number)
+    if member is None:
         return Response({"error": "Member not found"}, status=status.HTTP_404_NOT_FOUND)
 
     data = request.data
@@ -804,9 +897,12 @@ def update_member(request, aadhar_number):
 
     # Check if new aadhar_number is different and already exists
     if new_aadhar != aadhar_number:
-        if FamilyMember.objects.filter(aadhar_number=new_aadhar).exists():
+        if FamilyMember.objects.filter(aadhar_hash=hash_aadhar(new_aadhar)).exists():
             return Response({"error": "Aadhar number already exists."}, status=status.HTTP_400_BAD_REQUEST)
 
+    if email_in_use(email, member_id=member.pk):
+        return Response({"error": "Email already exists."}, status=status.HTTP_400_BAD_REQUEST)
+
     member.name = name
     member.aadhar_number = new_aadhar
     member.email = email
@@ -837,16 +933,15 @@ from .models import FamilyMember
 @api_view(['PUT'])
 @parser_classes([MultiPartParser, FormParser])
 def upload_profile_image(request, email):
-    try:
-        member = FamilyMember.objects.get(email=email)
-    except FamilyMember.DoesNotExist:
+    _, member = member_by_email(email)
+    if member is None:
         return Response({'error': 'Member not found'}, status=404)
 
     if 'profile_image' not in request.FILES:
         return Response({'error': 'No image provided'}, status=400)
 
     member.profile_image = request.FILES['profile_image']
-    member.save()
+    member.save(update_fields=['profile_image'])
 
     return Response({'message': 'Profile image updated successfully'})
 
@@ -860,112 +955,264 @@ from .models import Order, OrderItem, Family
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
+@read_replica
 def admin_view_orders(request):
     area = request.query_params.get('area', None)  # Get area from query param
 
     if area:
         # Filter orders where order.family.area matches the area param
-        orders = Order.objects.filter(family__area=area).order_by('-created_at')
+        orders = Order.objects.filter(family__area_id=area_pk(area)).order_by('-created_at')
     else:
         orders = Order.objects.all().order_by('-created_at')
 
-    data = []
-    for order in orders:
-        items = OrderItem.objects.filter(order=order)
-        data.append({
+    month = request.query_params.get('month')  # YYYY-MM; only that month's partition is scanned
+    if month:
+        try:
+            year, month_number = (int(part) for part in month.split('-'))
+            start = cycle_start().replace(year=year, month=month_number)
+        except ValueError:
+            return Response({'success': False, 'error': 'month must be YYYY-MM'}, status=400)
+        orders = orders.filter(created_at__gte=start, created_at__lt=add_months(start, 1))
+
+    # Lines carry their own name and price, so no join to RationItem
+    orders = orders.select_related('family').prefetch_related(
+        Prefetch('order_items', queryset=OrderItem.objects.only('order_id', 'item_name', 'quantity', 'unit_price'))
+    )
+
+    if area:
+        data = admin_order_rows(orders)
+    else:
+        # Every area: one query per shard in parallel, merged newest first
+        data = list(heapq.merge(
+            *fan_out(lambda alias: admin_order_rows(orders.all())),
+            key=lambda row: row['created_at'], reverse=True,
+        ))
+    for row in data:
+        row['created_at'] = row['created_at'].strftime('%Y-%m-%d %H:%M')
+
+    return Response({'success': True, 'orders': data})
+
+
+def admin_order_rows(orders):
+    return [
+        {
             'order_id': order.id,
             'token_number': order.token_number,
             'family': order.family.family_id,
-            'area': order.family.area,  # include area in response
+            'area': area_name(order.family.area_id),  # include area in response
             'total_price': float(order.total_price),
             'payment_status': order.payment_status,
-            'created_at': order.created_at.strftime('%Y-%m-%d %H:%M'),
+            'created_at': order.created_at,
             'items': [
                 {
-                    'item_name': item.item.name,
+                    'item_name': item.item_name,
                     'quantity': item.quantity,
-                    'price_per_unit': float(item.item.price),
-                    'total': float(item.quantity * item.item.price)
+                    'price_per_unit': float(item.unit_price),
+                    'total': float(item.line_total)
                 }
-                for item in items
+                for item in order.order_items.all()
             ]
-        })
-
-    return Response({'success': True, 'orders': data})
+        }
+        for order in orders
+    ]
 
-# Add a new API endpoint to get distinct areas from Family
+# Every area name, from the cached area directory (ration/areas.py)
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
+@read_replica
 def get_areas(request):
-    areas = Family.objects.values_list('area', flat=True).distinct()
-    return Response({'success': True, 'areas': list(areas)})
+    return Response({'success': True, 'areas': area_names()})
+
+
+# 26a. Sales dashboards: read the daily rollups (ration/analytics.py), never OrderItem
+from django.utils.dateparse import parse_date
+
+DASHBOARD_MAX_DAYS = 366
+
+
+def dashboard_params(request):
+    """(start, end, area) from the query string; defaults to the last 30 days, all areas."""
+    end = parse_date(request.query_params.get('end', '')) or timezone.localdate()
+    start = parse_date(request.query_params.get('start', '')) or end - timedelta(days=29)
+    if start > end or (end - start).days >= DASHBOARD_MAX_DAYS:
+        raise ValueError(f'start must be before end and at most {DASHBOARD_MAX_DAYS} days apart')
+    return start, end, request.query_params.get('area') or None
+
+
+def dashboard_rows(rows):
+    return [{**row, 'revenue': float(row['revenue'] or 0)} for row in rows]
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@read_replica
+def sales_dashboard(request):
+    try:
+        start, end, area = dashboard_params(request)
+    except ValueError as e:
+        return Response({'success': False, 'error': str(e)}, status=400)
+    return Response({
+        'success': True,
+        'start': start,
+        'end': end,
+        'area': area,
+        'days': dashboard_rows(analytics.area_series(start, end, area)),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@read_replica
+def item_sales_dashboard(request):
+    try:
+        start, end, area = dashboard_params(request)
+    except ValueError as e:
+        return Response({'success': False, 'error': str(e)}, status=400)
+    return Response({
+        'success': True,
+        'start': start,
+        'end': end,
+        'area': area,
+        'items': dashboard_rows(analytics.item_totals(start, end, area)),
+    })
+
+
+# 26b. Stock depletion forecast and restock recommendations (ration/forecasting.py)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@read_replica
+def stock_forecast(request):
+    from .forecasting import COVER_DAYS, forecast
+
+    try:
+        cover_days = int(request.query_params.get('cover_days', COVER_DAYS))
+    except ValueError:
+        cover_days = 0
+    if not 1 <= cover_days <= 90:
+        return Response({'success': False, 'error': 'cover_days must be between 1 and 90'}, status=400)
+
+    return Response({
+        'success': True,
+        'generated_at': timezone.now(),
+        'cover_days': cover_days,
+        'items': forecast(area=request.query_params.get('area') or None, cover_days=cover_days),
+    })
 
 
 
 # 4. View Stock
 from datetime import timedelta
 from django.utils import timezone
-from django.db.models import F
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Count, F
+from django.utils.encoding import filepath_to_uri
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .models import Family, Order, OrderItem, RationItem
 
 @api_view(['GET'])
 def view_stock(request):
-    family_id = request.GET.get('family_id')
-    if not family_id:
-        return Response({"error": "Missing family_id"}, status=400)
+    citizen = citizen_identity(request)
+    if citizen:
+        family_pk = citizen['family_pk']
+        area_id = citizen['area_id']
+        capped_members = citizen['family_size']
+    else:
+        family_id = request.GET.get('family_id')
+        if not family_id:
+            return Response({"error": "Missing family_id"}, status=400)
+
+        # Family and its member count in one query
+        family = (
+            Family.objects.filter(family_id=family_id)
+            .annotate(num_members=Count('members'))
+            .values_list('pk', 'area_id', 'num_members')
+            .first()
+        )
+        if family is None:
+            return Response({"error": "Invalid family_id"}, status=404)
+
+        family_pk, area_id, num_members = family
+        # Cap members between 1 and 4
+        capped_members = max(1, min(num_members, 4))
+    limit_field = stock_limit_field(capped_members)
+
+    # Unchanged since the client's copy: 304 before touching the items
+    etag, last_modified = conditional.validators('stock', area_id, family_pk, capped_members, cycle_start().date())
+    unchanged = conditional.not_modified(request, etag, last_modified)
+    if unchanged:
+        return unchanged
+
+    items = stock_values(available_stock_items(family_pk, area_id), limit_field)
+    response = Response({"stock": stock_rows(items, limit_field, request, area_name(area_id))})
+    return conditional.with_validators(response, etag, last_modified)
+
+
+# Shared by view_stock and its async variant in ration/async_views.py
+def stock_limit_field(capped_members):
+    return f'limit_{capped_members}_member' if capped_members == 1 else f'limit_{capped_members}_members'
+
+
+def available_stock_items(family_pk, area_id):
+    # Get item IDs this family already bought in the current cycle. Bounding both
+    # tables by created_at keeps the lookup on this month's partitions only.
+    since = cycle_start()
+    paid_orders = Order.objects.filter(family_id=family_pk, payment_status='paid', created_at__gte=since)
+    purchased_item_ids = OrderItem.objects.filter(
+        order__in=paid_orders, created_at__gte=since
+    ).values_list('item_id', flat=True).distinct()
+
+    # Get available items that are in stock and not purchased yet in the family area.
+    # Stock below the smallest family limit is unusable; manage.py expire_stock
+    # writes it off through the ledger.
+    return RationItem.objects.filter(
+        area_id=area_id,
+        total_quantity__gt=0,
+        total_quantity__gte=F('limit_1_member'),
+    ).exclude(id__in=purchased_item_ids)
 
-    try:
-        family = Family.objects.get(family_id=family_id)
-    except Family.DoesNotExist:
-        return Response({"error": "Invalid family_id"}, status=404)
-
-    # Cap members between 1 and 4
-    num_members = family.members.count()
-    capped_members = max(1, min(num_members, 4))
-    limit_field = f'limit_{capped_members}_member' if capped_members == 1 else f'limit_{capped_members}_members'
-
-    # Delete old/unusable stock items
-    expiry_date = timezone.now() - timedelta(days=3)
-    items_to_delete = RationItem.objects.filter(
-        created_at__lt=expiry_date,
-        total_quantity=0
-    ) | RationItem.objects.filter(
-        total_quantity__lt=F('limit_1_member')
-    )
-    items_to_delete.delete()
 
-    # Get already purchased item IDs for this family
-    paid_orders = Order.objects.filter(family=family, payment_status='paid')
-    purchased_item_ids = OrderItem.objects.filter(order__in=paid_orders).values_list('item_id', flat=True).distinct()
+def item_image_urls(request=None):
+    """Function mapping image paths read with .values() to URLs, without model instances.
+    For local storage the (absolute) media prefix is worked out once, not per row."""
+    storage = RationItem._meta.get_field('image').storage
 
-    # Get available items that are in stock and not purchased yet in the family area
-    items = RationItem.objects.filter(
-        area=family.area,
-        total_quantity__gt=0
-    ).exclude(id__in=purchased_item_ids)
+    if isinstance(storage, FileSystemStorage):
+        base = request.build_absolute_uri(storage.base_url) if request is not None else storage.base_url
 
-    stock = []
-    for item in items:
-        limit = getattr(item, limit_field, 0)
-        if limit == 0:
-            # Skip items with zero limit for this family size
-            continue
-        
-        # Include all items regardless of quantity < limit
-        stock.append({
-            "id": item.id,
-            "name": item.name,
-            "total_quantity": item.total_quantity,
-            "price": float(item.price),
-            "area": item.area,
-            "limit": limit,
-            "image": request.build_absolute_uri(item.image.url) if item.image else None,
-            "created_at": item.created_at.isoformat(),
-        })
+        def url(name):
+            return base + filepath_to_uri(name).lstrip('/') if name else None
+    else:
+        def url(name):
+            if not name:
+                return None
+            return request.build_absolute_uri(storage.url(name)) if request is not None else storage.url(name)
+    return url
 
-    return Response({"stock": stock})
+
+def stock_values(items, limit_field):
+    # Skip items with zero limit for this family size
+    return items.exclude(**{limit_field: 0}).values(
+        'id', 'name', 'total_quantity', 'price', 'image', 'created_at', limit_field,
+    )
+
+
+def stock_rows(items, limit_field, request, area):
+    image_url = item_image_urls(request)
+    # Include all items regardless of quantity < limit
+    return [
+        {
+            "id": item['id'],
+            "name": item['name'],
+            "total_quantity": item['total_quantity'],
+            "price": float(item['price']),
+            "area": area,
+            "limit": item[limit_field],
+            "image": image_url(item['image']),
+            "created_at": item['created_at'].isoformat(),
+        }
+        for item in items
+    ]
 
 
 from rest_framework.decorators import api_view
@@ -974,18 +1221,46 @@ from rest_framework import status
 from .models import OTP, Order, OrderItem, RationItem, Family
 from django.utils import timezone
 from decimal import Decimal
-import uuid
+
+
+class OTPAlreadyUsed(Exception):
+    pass
+
 @api_view(['POST'])
 def verify_otp_place_order(request):
     email = request.data.get('email')
     otp_code = request.data.get('otp')
     items = request.data.get('items', [])
-    family_id = request.data.get('family_id')
+    citizen = citizen_identity(request)
+    family_id = citizen['family_id'] if citizen else request.data.get('family_id')
 
     if not all([email, otp_code, family_id, items]):
         return Response({'success': False, 'error': 'Missing required fields.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Verify OTP
+    # Item ids and quantities are checked here, so the order transaction below
+    # can only fail on stock, queue space or a concurrent submission
+    requested = []
+    try:
+        for item in items:
+            if item.get('id') is None or item.get('quantity') is None:
+                continue
+            item_id, quantity = int(item['id']), int(item['quantity'])
+            if quantity <= 0:
+                raise ValueError
+            requested.append((item_id, quantity))
+    except (AttributeError, TypeError, ValueError):
+        return Response({'success': False, 'error': 'Item quantities must be positive whole numbers.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    # Retried submission with the same Idempotency-Key: replay the original order response
+    idempotency_key = idempotency.request_key(request, 'place-order')
+    request_fingerprint = idempotency.fingerprint({'family_id': family_id, 'otp': otp_code, 'items': items})
+    if idempotency_key:
+        stored = idempotency.load(idempotency_key)
+        if stored is not None:
+            return idempotency.replay(stored, request_fingerprint)
+
+    # Verify OTP (it is only marked used once the order commits, below)
     try:
         otp_obj = OTP.objects.filter(email=email, code=otp_code).latest('created_at')
         if otp_obj.is_verified:
@@ -995,30 +1270,23 @@ def verify_otp_place_order(request):
     except OTP.DoesNotExist:
         return Response({'success': False, 'error': 'Invalid OTP.'})
 
-    otp_obj.is_verified = True
-    otp_obj.save()
-
-    try:
-        family = Family.objects.get(family_id=family_id)
-    except Family.DoesNotExist:
-        return Response({'success': False, 'error': 'Invalid family ID.'})
+    if citizen:
+        family_pk, area_id = citizen['family_pk'], citizen['area_id']
+    else:
+        family = Family.objects.filter(family_id=family_id).values_list('pk', 'area_id').first()
+        if family is None:
+            return Response({'success': False, 'error': 'Invalid family ID.'})
+        family_pk, area_id = family
 
     total_price = Decimal('0.00')
     order_items = []
+    ration_items = RationItem.objects.in_bulk([item_id for item_id, _ in requested])
 
-    for item in items:
-        item_id = item.get('id')
-        quantity = item.get('quantity')
-        if item_id is None or quantity is None:
-            continue
-
-        try:
-            ration_item = RationItem.objects.get(id=item_id)
-        except RationItem.DoesNotExist:
+    for item_id, quantity in requested:
+        ration_item = ration_items.get(item_id)
+        if ration_item is None:
             continue
 
-        quantity = int(quantity)
-
         if ration_item.total_quantity < quantity:
             return Response({'success': False, 'error': f'Not enough stock for {ration_item.name}.'})
 
@@ -1028,24 +1296,117 @@ def verify_otp_place_order(request):
     if not order_items:
         return Response({'success': False, 'error': 'No valid items to order.'})
 
-    token_number = str(uuid.uuid4())[:8]
-
-    order = Order.objects.create(
-        family=family,
-        token_number=token_number,
-        total_price=total_price,
-        otp=otp_code,
-        payment_status='paid'
+    try:
+        # OTPs and idempotency keys live on 'default', the order on its area's shard
+        with transaction.atomic(), transaction.atomic(using=router.db_for_write(Order), savepoint=False):
+            # Claim the OTP; a concurrent double submit loses here and rolls back
+            if not OTP.objects.filter(pk=otp_obj.pk, is_verified=False).update(is_verified=True):
+                raise OTPAlreadyUsed
+
+            # Queue number and pickup slot for the area's distribution day, given
+            # back with everything else if the order fails
+            ticket = allocate_ticket(area_id)
+
+            order = Order.objects.create(
+                family_id=family_pk,
+                token_number=ticket.token_number,
+                total_price=total_price,
+                otp=otp_code,
+                payment_status='paid',
+                queue_day=ticket.day,
+                queue_number=ticket.number,
+                pickup_slot=ticket.pickup_slot,
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, item=ration_item, quantity=quantity, created_at=order.created_at,
+                    item_name=ration_item.name, unit_price=ration_item.price,
+                )
+                for ration_item, quantity in order_items
+            ])
+
+            # Reduce stock through the ledger; a concurrent order can't drive it negative
+            for ration_item, quantity in order_items:
+                inventory.sell(ration_item.id, quantity, order=order)
+
+            # Dashboard rollups, last so their row locks are held only until commit
+            analytics.record_order(area_id, order.created_at, [
+                (ration_item.id, ration_item.name, quantity, ration_item.price)
+                for ration_item, quantity in order_items
+            ])
+
+            body = {
+                'success': True,
+                'message': 'Order placed successfully.',
+                'token_number': order.token_number,
+                'queue_number': order.queue_number,
+                'pickup_date': ticket.day.date,
+                'pickup_slot': order.pickup_slot,
+            }
+            if idempotency_key:
+                idempotency.store(idempotency_key, request_fingerprint, status.HTTP_201_CREATED, body)
+
+            # A counter lookup by this OTP cached before the order must show it
+            transaction.on_commit(
+                lambda: forget_counter_lookup(order.token_number, otp_code, area_name(area_id)),
+                using=router.db_for_write(Order),
+            )
+    except QueueFull:
+        return Response({'success': False, 'error': 'No pickup slots are left this week. Please try again later.'})
+    except inventory.InsufficientStock as exc:
+        return Response({'success': False, 'error': f'Not enough stock for {ration_items[exc.item_id].name}.'})
+    except (OTPAlreadyUsed, idempotency.KeyInUse):
+        # Lost a race with an identical submission: answer with whatever it stored
+        stored = idempotency.load(idempotency_key) if idempotency_key else None
+        if stored is not None:
+            return idempotency.replay(stored, request_fingerprint)
+        return Response({'success': False, 'error': 'OTP already used.'})
+
+    return Response(body, status=status.HTTP_201_CREATED)
+
+
+# 18a. Pickup queue position
+@api_view(['GET'])
+def queue_position(request, token_number):
+    order = (
+        Order.objects.filter(token_number=token_number)
+        .values('queue_day_id', 'queue_day__date', 'queue_number', 'pickup_slot', 'collected_at')
+        .first()
     )
+    if order is None or order['queue_day_id'] is None:
+        return Response({'error': 'No queued order found for this token.'}, status=status.HTTP_404_NOT_FOUND)
 
-    for ration_item, quantity in order_items:
-        OrderItem.objects.create(order=order, item=ration_item, quantity=quantity)
+    waiting = Order.objects.filter(queue_day_id=order['queue_day_id'], collected_at__isnull=True)
+    now_serving = waiting.order_by('queue_number').values_list('queue_number', flat=True).first()
+    collected = order['collected_at'] is not None
 
-        # Reduce stock based on purchase quantity
-        ration_item.total_quantity -= quantity
-        ration_item.save()
+    return Response({
+        'token_number': token_number,
+        'queue_number': order['queue_number'],
+        'pickup_date': order['queue_day__date'],
+        'pickup_slot': order['pickup_slot'],
+        'collected': collected,
+        'now_serving': now_serving,
+        'ahead_in_queue': 0 if collected else waiting.filter(queue_number__lt=order['queue_number']).count(),
+        'ahead_in_slot': 0 if collected else waiting.filter(
+            pickup_slot=order['pickup_slot'], queue_number__lt=order['queue_number']
+        ).count(),
+    })
 
-    return Response({'success': True, 'message': 'Order placed successfully.'}, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def mark_order_collected(request, token_number):
+    updated = Order.objects.filter(token_number=token_number, collected_at__isnull=True).update(collected_at=timezone.now())
+    if not updated:
+        if Order.objects.filter(token_number=token_number).exists():
+            return Response({'error': 'Order already collected.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'error': 'Order not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    # Counter lookups must show the order as collected straight away
+    for otp, area_id in Order.objects.filter(token_number=token_number).values_list('otp', 'family__area_id'):
+        forget_counter_lookup(token_number, otp, area_name(area_id))
+    return Response({'message': 'Order marked as collected.'})
 
 from django.utils.timezone import now, timedelta
 from rest_framework.decorators import api_view
@@ -1055,9 +1416,9 @@ from .models import Notification
 
 @api_view(['GET'])
 def get_notifications(request, area):
-    notifications = Notification.objects.filter(area=area).exclude(dismissed_areas__contains=[area]).order_by('-timestamp')
-    data = [{"id": n.id, "message": n.message, "timestamp": n.timestamp} for n in notifications]
-    return Response(data)
+    area_id = area_pk(area)
+    notifications = Notification.objects.filter(area_id=area_id).exclude(dismissed_areas__contains=[area_id]).order_by('-timestamp')
+    return Response(list(notifications.values('id', 'message', 'timestamp')))
 
 
 @api_view(['POST'])
@@ -1065,11 +1426,14 @@ def dismiss_notification(request, notification_id):
     area = request.query_params.get('area')
     if not area:
         return Response({"detail": "Area parameter required."}, status=status.HTTP_400_BAD_REQUEST)
+    area_id = area_pk(area)
+    if area_id is None:
+        return Response({"detail": "Area not found."}, status=status.HTTP_404_NOT_FOUND)
 
     try:
         notification = Notification.objects.get(id=notification_id)
-        if area not in notification.dismissed_areas:
-            notification.dismissed_areas.append(area)
+        if area_id not in notification.dismissed_areas:
+            notification.dismissed_areas.append(area_id)
             notification.save()
         return Response({"detail": "Notification dismissed for this area."})
     except Notification.DoesNotExist:
@@ -1078,12 +1442,12 @@ def dismiss_notification(request, notification_id):
 
 @api_view(['DELETE'])
 def delete_all_notifications(request, area):
-    notifications = Notification.objects.filter(area=area).exclude(dismissed_areas__contains=[area])
-    count = notifications.count()
+    area_id = area_pk(area)
+    notifications = list(Notification.objects.filter(area_id=area_id).exclude(dismissed_areas__contains=[area_id]))
+    count = len(notifications)
     for n in notifications:
-        if area not in n.dismissed_areas:
-            n.dismissed_areas.append(area)
-            n.save()
+        n.dismissed_areas.append(area_id)
+    Notification.objects.bulk_update(notifications, ['dismissed_areas'])
     if count == 0:
         return Response({"detail": "No notifications to dismiss."}, status=status.HTTP_404_NOT_FOUND)
     return Response({"detail": f"Dismissed {count} notifications for this area."})
@@ -1100,7 +1464,7 @@ def delete_old_notifications():
 
 @api_view(['POST'])
 def mark_read_notifications(request, area):
-    notifications = Notification.objects.filter(area=area, read=False)
+    notifications = Notification.objects.filter(area_id=area_pk(area), read=False)
     updated_count = notifications.update(read=True)
     return Response({"detail": f"Marked {updated_count} notifications as read."})
 
@@ -1115,8 +1479,10 @@ import os
 @require_http_methods(["DELETE"])
 def delete_profile_image(request, email):
     try:
-        member = FamilyMember.objects.get(email=email)
-        
+        _, member = member_by_email(email)
+        if member is None:
+            raise FamilyMember.DoesNotExist
+
         if member.profile_image:
             # Delete the file from storage
             if os.path.isfile(member.profile_image.path):
@@ -1124,7 +1490,7 @@ def delete_profile_image(request, email):
             
             # Remove reference in database
             member.profile_image = None
-            member.save()
+            member.save(update_fields=['profile_image'])
             
             return JsonResponse({'message': 'Profile image deleted successfully.'}, status=200)
         else:
@@ -1139,85 +1505,28 @@ def delete_profile_image(request, email):
 
     from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import RationItem, Stock, FamilyMember
+from .models import FamilyMember
+from .chatbot import build_reply as build_chatbot_reply
 
 @api_view(['POST'])
 def chatbot_response(request):
-    message = request.data.get("message", "").strip().lower()
+    message = request.data.get("message", "")
     aadhar_number = request.data.get("aadhar_number")  # Frontend should send this
 
-    reply = None
     user_name = None
-    user_area = None
-
-    # Get user info by Aadhar
-    if aadhar_number:
-        try:
-            member = FamilyMember.objects.get(aadhar_number=aadhar_number)
+    area_id = None
+
+    # Get user info from the session token, or by Aadhar
+    citizen = citizen_identity(request)
+    if citizen:
+        user_name = citizen['name']
+        area_id = citizen['area_id']
+    elif aadhar_number:
+        identity, member = member_by_aadhar(aadhar_number, 'name')
+        if member is not None:
             user_name = member.name
-            user_area = member.family.area
-        except FamilyMember.DoesNotExist:
-            user_name = None
-            user_area = None
-
-    keywords = ["rice", "sugar", "wheat", "dal", "oil"]
-
-    # If user asks about stock or available items, list all current stock in their area
-    if any(word in message for word in ["stock", "available items", "available stock", "inventory", "what do you have"]):
-        if user_area:
-            stock_entries = Stock.objects.select_related('item').filter(item__area=user_area)
-            if stock_entries.exists():
-                reply_lines = []
-                for stock in stock_entries:
-                    item = stock.item
-                    line = f"{item.name.title()}: ₹{item.price}/kg, {stock.quantity_in_stock} kg in stock"
-                    reply_lines.append(line)
-                reply = "Current stock details in your area:\n" + "\n".join(reply_lines)
-            else:
-                reply = "Sorry, stock information is not available in your area at the moment."
-        else:
-            reply = "Sorry, we couldn't identify your area from your Aadhar. Please contact support."
-
-    # Otherwise, check if user message contains specific item keywords available in their area
-    if not reply and user_area:
-        for keyword in keywords:
-            if keyword in message:
-                items = RationItem.objects.filter(name__icontains=keyword, area=user_area)
-                if items.exists():
-                    # Take first matching item for simplicity
-                    item = items.first()
-                    stock = Stock.objects.filter(item=item).first()
-                    stock_msg = f"{stock.quantity_in_stock} kg in stock" if stock else "Stock data not available"
-                    reply = (
-                        f"{item.name.title()} is available at ₹{item.price}/kg.\n"
-                        f"Available stock: {stock_msg}."
-                    )
-                else:
-                    reply = f"Sorry, {keyword.title()} is not available in your area."
-                break
-
-    # Rule-based responses with personalized greeting
-    if not reply:
-        if any(greet in message for greet in ["hi", "hello", "hey", "hai"]):
-            if user_name:
-                reply = f"Hello {user_name}! How can I help you today?"
-            else:
-                reply = "Hello! How can I help you today?"
-        elif "timing" in message or "hours" in message:
-            reply = "Our shop is open from 9 AM to 1 PM and 3 PM to 7 PM."
-        elif "price" in message:
-            reply = "You can ask for item prices like rice, sugar, wheat, etc."
-        elif "order" in message:
-            reply = ("To place an order, please log in and go to the 'Place Order' section. "
-                     "You can select items and quantities there.")
-        elif "delivery" in message or "how to get" in message:
-            reply = ("Orders are processed within 24 hours. You can pick up your ration "
-                     "from the shop or opt for home delivery if it's available in your area.")
-        elif any(bye in message for bye in ["bye", "thank you", "thanks", "see you"]):
-            reply = "You're welcome! If you have more questions, feel free to ask."
-
-    # Default fallback
-    if not reply:
-        reply = "Sorry, I didn't understand that. Could you please rephrase?"
+            area_id = identity.area_id
 
+    # Intent matching and cached per-area stock answers live in ration/chatbot.py
+    reply = build_chatbot_reply(message, user_name=user_name, area_id=area_id)
     return Response({"reply": reply})